@@ -2,43 +2,71 @@
 NeuroFlow API - FastAPI Backend
 Updated for MongoDB + Cloudinary
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+import time
+_IMPORT_STARTED = time.perf_counter()  # startup instrumentation, see /metrics/startup
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime, timedelta, timezone
-from bson import ObjectId
+from bson import ObjectId, json_util
 import uvicorn
 import os
 import logging
-import requests
-import numpy as np
+import base64
+import hashlib
+import tempfile
+import threading
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-import cloudinary
-import cloudinary.uploader
-
 from ml_service import MLService
 from chat_service import ChatService
-from database import users_collection, datasets_collection, workflows_collection, workspaces_collection
+from profiling import get_cached_profile, cache_profile, invalidate_profile
+from downloads import download_metrics
+from result_cache import result_cache_metrics
+from thread_budget import thread_budget
+from training_budget import start_cancel_server
+from estimators import preload as preload_estimators, import_metrics
+from worker_pool import pipeline_pool
+from pipeline_graph import compile_graph, run_requests
+from responses import FastJSONResponse, CompressionMiddleware, dump_json, encoding_info
+from storage import STORAGE_BACKEND, storage_key, save_dataset_file, read_dataset, delete_dataset_file
+from database import (
+    async_users_collection, async_datasets_collection, async_workflows_collection, async_workspaces_collection,
+    query_metrics, ensure_indexes,
+)
+from pymongo import ReturnDocument
 from pymongo.errors import DuplicateKeyError
+from dataset_resolver import resolve_dataset_async, PROFILE_FIELDS, PREVIEW_FIELDS
+from workspace_patch import patch_pipeline, version_filter
 from models import (
     UserCreate, UserResponse, Token,
     PipelineRequest, ChatRequest, AnalyzeRequest,
     WorkflowCreate, WorkflowResponse,
-    WorkspaceCreate, WorkspaceUpdate, WorkspaceResponse, WorkspaceDetailResponse,
-    PreviewUntilRequest,
+    WorkspaceCreate, WorkspaceUpdate, WorkspacePatch, WorkspaceResponse, WorkspaceDetailResponse,
+    PreviewUntilRequest, GraphRunRequest,
 )
 from auth import (
-    get_password_hash, 
-    verify_password, 
+    get_password_hash_async,
+    verify_password_async,
     create_access_token, 
     get_current_user,
+    get_admin_user,
+    invalidate_user,
+    check_login_rate,
+    record_login_failure,
+    record_login_success,
+    user_cache_metrics,
+    password_hashing_metrics,
+    login_rate_limit_metrics,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
@@ -46,14 +74,48 @@ from auth import (
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
+# Import sklearn's estimator modules in the background once the API is up, so the
+# first pipeline run does not pay for them (see estimators.py)
+PRELOAD_ESTIMATORS = os.getenv("PRELOAD_ESTIMATORS", "true").lower() == "true"
+STARTUP = {"import_seconds": round(time.perf_counter() - _IMPORT_STARTED, 3)}
+
+
+def _create_indexes():
+    STARTUP["indexes"] = ensure_indexes()
+
+
+def _preload_estimators():
+    STARTUP["estimator_preload_seconds"] = round(preload_estimators(), 3)
+
+
+def _start_cancel_server():
+    started = time.perf_counter()
+    try:
+        start_cancel_server()
+        STARTUP["cancel_server_seconds"] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        logger.warning(f"Could not start the training cancel server: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Slow startup work runs in background threads; requests are served meanwhile
+    threading.Thread(target=_create_indexes, name="ensure-indexes", daemon=True).start()
+    if PRELOAD_ESTIMATORS:
+        threading.Thread(target=_preload_estimators, name="preload-estimators", daemon=True).start()
+    if pipeline_pool.enabled:
+        pipeline_pool.start()
+    else:
+        # Pool workers fork their cancellable fits; the API process uses the forkserver
+        threading.Thread(target=_start_cancel_server, name="start-cancel-server", daemon=True).start()
+    STARTUP["ready_seconds"] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+    logger.info(f"API ready in {STARTUP['ready_seconds']}s (imports {STARTUP['import_seconds']}s)")
+    yield
+    await run_in_threadpool(pipeline_pool.stop)
+
 
-app = FastAPI(title="NeuroFlow API", description="ML Pipeline Builder with MongoDB + Cloudinary")
+app = FastAPI(title="NeuroFlow API", description="ML Pipeline Builder with MongoDB + Cloudinary",
+              lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Allow CORS - Load from .env only
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173").split(",")
@@ -62,13 +124,23 @@ ALLOWED_ORIGINS = [o.strip() for o in ALLOWED_ORIGINS if o.strip()]
 
 logger.info(f"CORS Allowed Origins: {ALLOWED_ORIGINS}")
 
+# Uploads are streamed to disk in fixed-size chunks instead of read into memory
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "5120")) * 1024 * 1024
+# Items per page of /datasets, /workspaces and /workflows when the client sends no limit
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "100"))
+UPLOAD_EXTENSIONS = ('.csv', '.xls', '.xlsx')
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+# Large JSON bodies (pipeline results, previews, profiles) go out brotli/gzip-compressed
+app.add_middleware(CompressionMiddleware)
 
 # Global service instances
 # ml_service = MLService() # REMOVED: Global instance causes race conditions
@@ -85,29 +157,87 @@ def serialize_doc(doc: dict) -> dict:
     return doc
 
 
-def convert_numpy_types(obj):
-    """Recursively convert numpy types to native Python types for JSON serialization."""
-    if isinstance(obj, dict):
-        return {k: convert_numpy_types(v) for k, v in obj.items()}
-    elif isinstance(obj, (list, tuple)):
-        return [convert_numpy_types(item) for item in obj]
-    elif isinstance(obj, (np.integer,)):
-        return int(obj)
-    elif isinstance(obj, (np.floating,)):
-        return float(obj)
-    elif isinstance(obj, (np.bool_,)):
-        return bool(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    return obj
+def encode_cursor(sort_value, doc_id) -> str:
+    """Opaque keyset cursor: the last item's sort value and _id."""
+    return base64.urlsafe_b64encode(json_util.dumps([sort_value, doc_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        sort_value, doc_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return sort_value, doc_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(sort_field: str, direction: int, cursor: str) -> dict:
+    """Match items strictly after the cursor in (sort_field, _id) order."""
+    sort_value, doc_id = decode_cursor(cursor)
+    op = "$gt" if direction == 1 else "$lt"
+    return {"$or": [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, "_id": {op: doc_id}},
+    ]}
+
+
+async def find_page(collection, query: dict, sort_field: str, direction: int,
+                    limit: int, cursor: Optional[str], projection=None) -> tuple:
+    """One page of ``query`` in (sort_field, _id) order; returns (docs, next_cursor)."""
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort_field, direction, cursor)]}
+    find = collection.find(query, projection).sort([(sort_field, direction), ("_id", direction)])
+    docs = await find.limit(limit + 1).to_list()
+    return page_of(docs, limit, sort_field)
+
+
+def page_of(docs: list, limit: int, sort_field: str) -> tuple:
+    """``docs`` (fetched with ``limit + 1``) cut to one page, and the next cursor if more remain."""
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1].get(sort_field), docs[-1]["_id"])
+
+
+def etag_response(request: Request, payload, next_cursor: Optional[str] = None) -> Response:
+    """JSON response with a content ETag; 304 when it matches If-None-Match."""
+    body = dump_json(payload)
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def spool_upload(file: UploadFile) -> tuple:
+    """Copy an upload to a temp file chunk by chunk, hashing as it goes.
+
+    Returns ``(path, sha256 hex digest, size in bytes)``; the caller removes the file."""
+    digest = hashlib.sha256()
+    size = 0
+    spool = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1])
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit")
+            digest.update(chunk)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        os.unlink(spool.name)
+        raise
+    spool.close()
+    return spool.name, digest.hexdigest(), size
 
 
 # ==================== Auth Endpoints ====================
 
 @app.post("/auth/register", response_model=UserResponse)
-def register(user: UserCreate):
+async def register(user: UserCreate):
     """Register a new user."""
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = {
         "email": user.email,
         "username": user.username,
@@ -115,27 +245,32 @@ def register(user: UserCreate):
         "created_at": datetime.now(timezone.utc)
     }
     try:
-        result = users_collection.insert_one(new_user)
+        result = await async_users_collection.insert_one(new_user)
     except DuplicateKeyError as e:
         key = str(e).lower()
         if "email" in key:
             raise HTTPException(status_code=400, detail="Email already registered")
         raise HTTPException(status_code=400, detail="Username already taken")
+    invalidate_user(user.email)
     new_user["id"] = str(result.inserted_id)
     return UserResponse(id=new_user["id"], email=new_user["email"], username=new_user["username"])
 
 
 @app.post("/auth/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    """Login and get access token."""
-    user = users_collection.find_one({"email": form_data.username})
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    """Login and get access token (rate limited per client IP and per account and IP)."""
+    client_ip = request.client.host if request.client else "unknown"
+    check_login_rate(client_ip, form_data.username)
+    user = await async_users_collection.find_one({"email": form_data.username})
+    if not user or not await verify_password_async(form_data.password, user["hashed_password"]):
+        record_login_failure(form_data.username, client_ip)
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    record_login_success(form_data.username, client_ip)
     access_token = create_access_token(
         data={"sub": user["email"]},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -144,7 +279,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 
 @app.get("/auth/me", response_model=UserResponse)
-def get_me(current_user: dict = Depends(get_current_user)):
+async def get_me(current_user: dict = Depends(get_current_user)):
     """Get current user info."""
     return UserResponse(
         id=current_user["id"],
@@ -157,7 +292,7 @@ def get_me(current_user: dict = Depends(get_current_user)):
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to NeuroFlow API", "status": "running", "database": "MongoDB", "storage": "Cloudinary", "version": "1.0.1"}
+    return {"message": "Welcome to NeuroFlow API", "status": "running", "database": "MongoDB", "storage": STORAGE_BACKEND, "version": "1.0.1"}
 
 
 # ==================== Protected Dataset Endpoints ====================
@@ -167,78 +302,132 @@ async def upload_file(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user)
 ):
-    """Upload a dataset file to Cloudinary and save metadata to MongoDB."""
+    """Upload a dataset file to the configured storage backend and save metadata to MongoDB.
+
+    The body is streamed to a temp file, so memory stays flat for multi-GB files."""
+    if not file.filename or not file.filename.lower().endswith(UPLOAD_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Unsupported file format")
+
+    path = None
     try:
-        content = await file.read()
-        
-        # 1. Process with ML service to get preview (in memory)
+        # 1. Stream to disk, computing the content hash incrementally
+        path, content_hash, size_bytes = await spool_upload(file)
+        if size_bytes == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
+
+        # 2. Scan the file in chunks for preview, profile and schema
         ml_service = MLService() # [FIX] New instance per request
-        data = ml_service.load_data(content, file.filename)
+        data = await run_in_threadpool(ml_service.scan_file, path, file.filename)
+        metadata = data.pop("metadata")
         
-        # 2. Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(
-            content,
-            resource_type="raw",
-            folder=f"neuroflow/{current_user['id']}",
-            public_id=file.filename.rsplit('.', 1)[0],  # filename without extension
-            overwrite=True
+        # 3. Store the file from disk, under the id the document will get
+        dataset_id = ObjectId()
+        stored = await run_in_threadpool(
+            save_dataset_file, path, storage_key(current_user['id'], dataset_id, file.filename)
         )
         
-        # 3. Save to MongoDB
+        # 4. Save to MongoDB
         dataset = {
+            "_id": dataset_id,
             "user_id": current_user["id"],
             "filename": file.filename,
-            "cloudinary_url": upload_result["secure_url"],
-            "cloudinary_public_id": upload_result["public_id"],
+            **stored,  # storage_backend, storage_key and backend-specific fields
             "columns": data.get("columns", []),
             "shape": {"rows": data.get("shape", [0, 0])[0], "cols": data.get("shape", [0, 0])[1]},
+            "content_hash": content_hash,
+            "size_bytes": size_bytes,
+            # Precomputed so /datasets, /analyze and preview_until never re-read the file
+            "profile": metadata["profile"],
+            "schema": metadata["schema"],
+            "preview_rows": metadata["preview_rows"],
             "created_at": datetime.now(timezone.utc)
         }
-        result = datasets_collection.insert_one(dataset)
+        result = await async_datasets_collection.insert_one(dataset)
+        cache_profile(str(result.inserted_id), metadata["profile"])
         
         # Return preview with dataset ID
         data["dataset_id"] = str(result.inserted_id)
         return data
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload Error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+
+DATASET_SUMMARY_FIELDS = {"filename": 1, "shape": 1, "created_at": 1, "is_sample": 1, "user_id": 1}
 
 
 @app.get("/datasets")
-def get_datasets(current_user: dict = Depends(get_current_user)):
-    """Get all datasets for the current user including samples."""
-    # Sort by filename (case-insensitive) for a unified list
-    datasets = datasets_collection.find({
-        "$or": [
-            {"user_id": current_user["id"]},
-            {"is_sample": True},
-            {"user_id": "system"}
-        ]
-    }).sort("filename", 1)  # 1 = Ascending
-    
-    return [
+async def get_datasets(
+    request: Request,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=500),
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "full",
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the datasets of the current user including samples, one page at a time.
+
+    ``limit``/``cursor`` page through them (next cursor in ``X-Next-Cursor``);
+    ``view=summary`` leaves out columns and schema (see GET /datasets/{id})."""
+    projection = DATASET_SUMMARY_FIELDS if view == "summary" else {"profile": 0, "preview_rows": 0}
+    # Sort by filename for a unified list
+    datasets, next_cursor = await find_page(
+        async_datasets_collection,
         {
-            "id": str(d["_id"]),
-            "filename": d["filename"],
-            "columns": d.get("columns", []),
-            "shape": d.get("shape", {}),
-            "created_at": d["created_at"].isoformat() if d.get("created_at") else None,
-            "is_sample": d.get("is_sample", False) or d.get("user_id") == "system"
-        }
-        for d in datasets
-    ]
+            "$or": [
+                {"user_id": current_user["id"]},
+                {"is_sample": True},
+                {"user_id": "system"}
+            ]
+        },
+        "filename", 1, limit, cursor, projection,
+    )
+    return etag_response(request, [dataset_item(d, view) for d in datasets], next_cursor)
+
+
+@app.get("/datasets/{dataset_id}")
+async def get_dataset(
+    request: Request,
+    dataset_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """One readable dataset (id or filename) with its columns and schema."""
+    dataset, _ = await resolve_dataset_async(
+        async_datasets_collection, dataset_id, current_user["id"], exclude=PROFILE_FIELDS + PREVIEW_FIELDS
+    )
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    return etag_response(request, dataset_item(dataset, "full"))
+
+
+def dataset_item(d: dict, view: str) -> dict:
+    item = {
+        "id": str(d["_id"]),
+        "filename": d["filename"],
+        "shape": d.get("shape", {}),
+        "created_at": d["created_at"].isoformat() if d.get("created_at") else None,
+        "is_sample": d.get("is_sample", False) or d.get("user_id") == "system"
+    }
+    if view == "full":
+        item["columns"] = d.get("columns", [])
+        item["schema"] = d.get("schema")
+    return item
 
 
 @app.delete("/datasets/{dataset_id}")
-def delete_dataset(
+async def delete_dataset(
     dataset_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Delete a dataset from MongoDB and Cloudinary."""
+    """Delete a dataset from MongoDB and its file from storage."""
     # Find dataset
     try:
-        dataset = datasets_collection.find_one({
+        dataset = await async_datasets_collection.find_one({
             "_id": ObjectId(dataset_id),
             "user_id": current_user["id"]
         })
@@ -249,14 +438,15 @@ def delete_dataset(
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
     
-    # Delete from Cloudinary
+    # Delete from storage
     try:
-        cloudinary.uploader.destroy(dataset["cloudinary_public_id"], resource_type="raw")
+        await run_in_threadpool(delete_dataset_file, dataset)
     except Exception as e:
-        logger.error(f"Cloudinary Delete Error: {e}")
+        logger.error(f"Storage Delete Error: {e}")
 
     # Delete from MongoDB
-    datasets_collection.delete_one({"_id": ObjectId(dataset_id)})
+    await async_datasets_collection.delete_one({"_id": ObjectId(dataset_id)})
+    invalidate_profile(dataset_id)
     return {"message": "Dataset deleted"}
 
 
@@ -270,45 +460,33 @@ async def analyze_dataset(
     """Analyze dataset for histograms and correlations."""
     try:
         # Fetch Dataset from MongoDB
-        dataset = None
-        try:
-            dataset = datasets_collection.find_one({
-                "_id": ObjectId(request.file_id),
-                "$or": [
-                    {"user_id": current_user["id"]},
-                    {"is_sample": True},
-                    {"user_id": "system"}
-                ]
-            })
-        except Exception:
-            pass
-        
-        if not dataset:
-            # Fallback: Try by filename + user_id or system
-            dataset = datasets_collection.find_one({
-                "filename": request.file_id,
-                "$or": [
-                    {"user_id": current_user["id"]},
-                    {"is_sample": True},
-                    {"user_id": "system"}
-                ]
-            })
-            
+        dataset, _ = await resolve_dataset_async(
+            async_datasets_collection, request.file_id, current_user["id"], exclude=PREVIEW_FIELDS
+        )
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset not found or unauthorized")
 
-        # Download from Cloudinary
-        try:
-            response = requests.get(dataset["cloudinary_url"])
-            file_content = response.content
-        except Exception:
-            raise HTTPException(status_code=404, detail="File not found in storage")
-
-        # Analyze
-        ml_service = MLService() # [FIX] New instance per request
-        analysis = ml_service.analyze_dataset(file_content, dataset["filename"])
-        return analysis
+        # Serve the profile cached in-process or stored with the dataset at upload
+        dataset_id = str(dataset["_id"])
+        analysis = get_cached_profile(dataset_id) or dataset.get("profile")
+        if analysis is None:
+            # Datasets uploaded before profiling existed: compute once and backfill
+            try:
+                file_content = await run_in_threadpool(read_dataset, dataset)
+            except ValueError:
+                raise HTTPException(status_code=404, detail="File not found in storage")
+
+            ml_service = MLService() # [FIX] New instance per request
+            analysis = await run_in_threadpool(ml_service.analyze_dataset, file_content, dataset["filename"])
+            await async_datasets_collection.update_one({"_id": dataset["_id"]}, {"$set": {"profile": analysis}})
+
+        cache_profile(dataset_id, analysis)
+        if dataset.get("schema"):
+            analysis = {**analysis, "schema": dataset["schema"]}
+        return FastJSONResponse(analysis)
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -319,7 +497,7 @@ async def analyze_dataset(
 # ==================== Protected Workspace Endpoints ====================
 
 @app.post("/workspaces", response_model=WorkspaceDetailResponse)
-def create_workspace(
+async def create_workspace(
     workspace: WorkspaceCreate,
     current_user: dict = Depends(get_current_user)
 ):
@@ -329,10 +507,13 @@ def create_workspace(
         "name": workspace.name,
         "nodes_json": [],
         "edges_json": [],
+        "node_count": 0,
+        "edge_count": 0,
+        "version": 0,
         "created_at": datetime.now(timezone.utc),
         "updated_at": datetime.now(timezone.utc),
     }
-    result = workspaces_collection.insert_one(new_workspace)
+    result = await async_workspaces_collection.insert_one(new_workspace)
     return WorkspaceDetailResponse(
         id=str(result.inserted_id),
         name=workspace.name,
@@ -343,31 +524,50 @@ def create_workspace(
 
 
 @app.get("/workspaces")
-def list_workspaces(current_user: dict = Depends(get_current_user)):
-    """List all workspaces for current user (summary only)."""
-    cursor = workspaces_collection.find(
-        {"user_id": current_user["id"]}
-    ).sort("updated_at", -1)
-    return [
+async def list_workspaces(
+    request: Request,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=500),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """List the current user's workspaces (summary only), most recently updated first,
+    one page at a time (next cursor in ``X-Next-Cursor``)."""
+    match = {"user_id": current_user["id"]}
+    if cursor:
+        match = {"$and": [match, keyset_filter("updated_at", -1, cursor)]}
+    # Project the stored count; workspaces saved before it existed are counted
+    # server-side so the node arrays are never sent over the wire
+    stages = [
+        {"$match": match},
+        {"$sort": {"updated_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {"$project": {
+            "name": 1, "created_at": 1, "updated_at": 1,
+            "node_count": {"$ifNull": ["$node_count", {"$size": {"$ifNull": ["$nodes_json", []]}}]},
+        }},
+    ]
+    workspaces = await (await async_workspaces_collection.aggregate(stages)).to_list()
+    workspaces, next_cursor = page_of(workspaces, limit, "updated_at")
+    return etag_response(request, [
         WorkspaceResponse(
             id=str(w["_id"]),
             name=w.get("name", "Untitled"),
-            node_count=len(w.get("nodes_json", [])),
+            node_count=w.get("node_count", 0),
             created_at=w["created_at"].isoformat() if w.get("created_at") else None,
             updated_at=w["updated_at"].isoformat() if w.get("updated_at") else None,
         )
-        for w in cursor
-    ]
+        for w in workspaces
+    ], next_cursor)
 
 
 @app.get("/workspaces/{workspace_id}", response_model=WorkspaceDetailResponse)
-def get_workspace(
+async def get_workspace(
     workspace_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Get full workspace by ID (owner only)."""
     try:
-        ws = workspaces_collection.find_one({
+        ws = await async_workspaces_collection.find_one({
             "_id": ObjectId(workspace_id),
             "user_id": current_user["id"]
         })
@@ -381,44 +581,97 @@ def get_workspace(
         nodes_json=ws.get("nodes_json", []),
         edges_json=ws.get("edges_json", []),
         updated_at=ws["updated_at"].isoformat() if ws.get("updated_at") else None,
+        version=ws.get("version", 0),
+    )
+
+
+async def raise_save_conflict(workspace_oid: ObjectId, user_id: str):
+    """Explain a versioned save that matched nothing: 404 if the workspace is gone
+    (or not the user's), else 409 with the stored version."""
+    current = await async_workspaces_collection.find_one({"_id": workspace_oid, "user_id": user_id}, {"version": 1})
+    if current is None:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    raise HTTPException(
+        status_code=409,
+        detail={"message": "Workspace was modified by another save", "version": current.get("version", 0)},
     )
 
 
 @app.put("/workspaces/{workspace_id}")
-def update_workspace(
+async def update_workspace(
     workspace_id: str,
     update: WorkspaceUpdate,
     current_user: dict = Depends(get_current_user)
 ):
-    """Auto-save workspace (debounced from frontend)."""
+    """Save the whole workspace (rename, full snapshot). Canvas autosave uses PATCH.
+    With ``base_version``, the save only applies if nobody saved in between (else 409)."""
     update_fields: dict = {"updated_at": datetime.now(timezone.utc)}
     if update.name is not None:
         update_fields["name"] = update.name
     if update.nodes_json is not None:
         update_fields["nodes_json"] = update.nodes_json
+        update_fields["node_count"] = len(update.nodes_json)
     if update.edges_json is not None:
         update_fields["edges_json"] = update.edges_json
+        update_fields["edge_count"] = len(update.edges_json)
 
     try:
-        result = workspaces_collection.update_one(
-            {"_id": ObjectId(workspace_id), "user_id": current_user["id"]},
-            {"$set": update_fields}
-        )
+        query = {"_id": ObjectId(workspace_id), "user_id": current_user["id"]}
     except Exception:
         raise HTTPException(status_code=404, detail="Workspace not found")
-    if result.matched_count == 0:
+    if update.base_version is not None:
+        query.update(version_filter(update.base_version))
+
+    ws = await async_workspaces_collection.find_one_and_update(
+        query,
+        {"$set": update_fields, "$inc": {"version": 1}},
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if ws is None:
+        await raise_save_conflict(query["_id"], current_user["id"])
+    return {"message": "Workspace saved", "version": ws["version"]}
+
+
+@app.patch("/workspaces/{workspace_id}")
+async def patch_workspace(
+    workspace_id: str,
+    patch: WorkspacePatch,
+    current_user: dict = Depends(get_current_user)
+):
+    """Auto-save canvas edits as add/update/remove operations on nodes and edges by id.
+    With ``base_version``, the patch only applies if nobody saved in between (else 409)."""
+    try:
+        query = {"_id": ObjectId(workspace_id), "user_id": current_user["id"]}
+    except Exception:
         raise HTTPException(status_code=404, detail="Workspace not found")
-    return {"message": "Workspace saved"}
+    if patch.base_version is not None:
+        query.update(version_filter(patch.base_version))
+
+    ws = await async_workspaces_collection.find_one_and_update(
+        query,
+        patch_pipeline(patch.ops, name=patch.name, now=datetime.now(timezone.utc)),
+        projection={"version": 1, "node_count": 1, "edge_count": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if ws is None:
+        await raise_save_conflict(query["_id"], current_user["id"])
+    return {
+        "message": "Workspace saved",
+        "version": ws["version"],
+        "node_count": ws["node_count"],
+        "edge_count": ws["edge_count"],
+    }
 
 
 @app.delete("/workspaces/{workspace_id}")
-def delete_workspace(
+async def delete_workspace(
     workspace_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Delete a workspace (owner only)."""
     try:
-        result = workspaces_collection.delete_one({
+        result = await async_workspaces_collection.delete_one({
             "_id": ObjectId(workspace_id),
             "user_id": current_user["id"]
         })
@@ -432,22 +685,68 @@ def delete_workspace(
 # ==================== Protected Workflow Endpoints ====================
 
 @app.get("/workflows")
-def get_workflows(current_user: dict = Depends(get_current_user)):
-    """Get all workflows for the current user."""
-    workflows = workflows_collection.find({"user_id": current_user["id"]})
-    return [
-        WorkflowResponse(
-            id=str(w["_id"]),
-            name=w["name"],
-            nodes_json=w.get("nodes_json", []),
-            edges_json=w.get("edges_json", [])
-        )
-        for w in workflows
-    ]
+async def get_workflows(
+    request: Request,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=500),
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "full",
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the current user's workflows, newest first, one page at a time (next cursor
+    in ``X-Next-Cursor``). ``view=summary`` returns name, created_at and node_count without the graphs."""
+    projection = {"name": 1, "created_at": 1, "nodes_json.id": 1} if view == "summary" else None
+    workflows, next_cursor = await find_page(
+        async_workflows_collection, {"user_id": current_user["id"]},
+        "created_at", -1, limit, cursor, projection,
+    )
+    if view == "summary":
+        items = [
+            {
+                "id": str(w["_id"]),
+                "name": w["name"],
+                "created_at": w["created_at"].isoformat() if w.get("created_at") else None,
+                "node_count": len(w.get("nodes_json", [])),
+            }
+            for w in workflows
+        ]
+    else:
+        items = [
+            WorkflowResponse(
+                id=str(w["_id"]),
+                name=w["name"],
+                nodes_json=w.get("nodes_json", []),
+                edges_json=w.get("edges_json", [])
+            )
+            for w in workflows
+        ]
+    return etag_response(request, items, next_cursor)
+
+
+@app.get("/workflows/{workflow_id}", response_model=WorkflowResponse)
+async def get_workflow(
+    workflow_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get one workflow by ID (owner only)."""
+    try:
+        w = await async_workflows_collection.find_one({
+            "_id": ObjectId(workflow_id),
+            "user_id": current_user["id"]
+        })
+    except Exception:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    if not w:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return WorkflowResponse(
+        id=str(w["_id"]),
+        name=w["name"],
+        nodes_json=w.get("nodes_json", []),
+        edges_json=w.get("edges_json", [])
+    )
 
 
 @app.post("/workflows", response_model=WorkflowResponse)
-def create_workflow(
+async def create_workflow(
     workflow: WorkflowCreate,
     current_user: dict = Depends(get_current_user)
 ):
@@ -459,7 +758,7 @@ def create_workflow(
         "edges_json": workflow.edges_json,
         "created_at": datetime.now(timezone.utc)
     }
-    result = workflows_collection.insert_one(new_workflow)
+    result = await async_workflows_collection.insert_one(new_workflow)
     
     return WorkflowResponse(
         id=str(result.inserted_id),
@@ -470,13 +769,13 @@ def create_workflow(
 
 
 @app.delete("/workflows/{workflow_id}")
-def delete_workflow(
+async def delete_workflow(
     workflow_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Delete a workflow."""
     try:
-        result = workflows_collection.delete_one({
+        result = await async_workflows_collection.delete_one({
             "_id": ObjectId(workflow_id),
             "user_id": current_user["id"]
         })
@@ -492,6 +791,15 @@ def delete_workflow(
 
 # ==================== Protected Pipeline Endpoints ====================
 
+def execute_pipeline(request: PipelineRequest, user_id: str, peers: int = 0) -> dict:
+    """Run a pipeline on the worker pool when it is enabled, else in the calling thread."""
+    if pipeline_pool.enabled:
+        return pipeline_pool.run("run_pipeline", {"request": request.model_dump(), "user_id": user_id})
+    service = MLService()  # New instance per run
+    service.expected_peers = peers
+    return service.run_pipeline(request, user_id)
+
+
 @app.post("/run_pipeline")
 async def run_pipeline(
     request: PipelineRequest,
@@ -499,9 +807,7 @@ async def run_pipeline(
 ):
     """Run ML pipeline."""
     try:
-        ml_service = MLService() # [FIX] New instance per request
-        results = ml_service.run_pipeline(request, current_user["id"])
-        return convert_numpy_types(results)
+        return FastJSONResponse(await run_in_threadpool(execute_pipeline, request, current_user["id"]))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -509,25 +815,70 @@ async def run_pipeline(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def execute_batch(requests: dict, user_id: str) -> dict:
+    """Run several pipelines sharing their common work (see pipeline_graph.py), on one
+    pool worker when the pool is enabled. Entries that are ``{"error": ...}`` pass through.
+    Results may hold NumPy values, which FastJSONResponse encodes natively."""
+    runnable = {run_id: r for run_id, r in requests.items() if isinstance(r, PipelineRequest)}
+    try:
+        if pipeline_pool.enabled:
+            results = pipeline_pool.run("run_requests", {
+                "requests": {run_id: r.model_dump() for run_id, r in runnable.items()},
+                "user_id": user_id,
+            })
+        else:
+            results = run_requests(runnable, user_id)
+    except Exception as e:
+        logger.error(f"Batch Execution Error: {e}")
+        results = {run_id: {"error": str(e)} for run_id in runnable}
+    return {run_id: results.get(run_id, r) for run_id, r in requests.items()}
+
+
 @app.post("/run_pipeline_batch")
 async def run_pipeline_batch(
     requests: Dict[str, PipelineRequest],
     current_user: dict = Depends(get_current_user)
 ):
-    """Run batch ML pipeline."""
-    batch_results = {}
-    
-    for result_node_id, request in requests.items():
-        try:
-            # Ownership check handled inside ml_service.run_pipeline now
-            service = MLService()
-            results = service.run_pipeline(request, current_user["id"])
-            batch_results[result_node_id] = convert_numpy_types(results)
-        except Exception as e:
-            logger.error(f"Error processing node {result_node_id}: {e}")
-            batch_results[result_node_id] = {"error": str(e)}
-    
-    return batch_results
+    """Run batch ML pipeline. Result nodes whose pipelines start alike share that work."""
+    # Ownership check handled inside ml_service.resolve_request
+    return FastJSONResponse(await run_in_threadpool(execute_batch, requests, current_user["id"]))
+
+
+@app.post("/run_graph")
+async def run_graph(
+    request: GraphRunRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Run every Result node of a canvas graph, with the steps in the order they are chained."""
+    requests = compile_graph(
+        request.nodes, request.edges, bypass_cache=request.bypass_cache, step_previews=request.step_previews
+    )
+    if not requests:
+        raise HTTPException(status_code=400, detail="No valid pipeline paths found. Connect Dataset → Model → Result.")
+    return FastJSONResponse(await run_in_threadpool(execute_batch, requests, current_user["id"]))
+
+
+@app.post("/workspaces/{workspace_id}/run")
+async def run_workspace(
+    workspace_id: str,
+    step_previews: Literal['none', 'shape', 'rows'] = 'rows',
+    current_user: dict = Depends(get_current_user)
+):
+    """Run the saved graph of a workspace (owner only); results are keyed by Result node id."""
+    try:
+        ws = await async_workspaces_collection.find_one(
+            {"_id": ObjectId(workspace_id), "user_id": current_user["id"]},
+            {"nodes_json": 1, "edges_json": 1},
+        )
+    except Exception:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    if not ws:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    requests = compile_graph(ws.get("nodes_json", []), ws.get("edges_json", []),
+                             workflow_id=workspace_id, step_previews=step_previews)
+    if not requests:
+        raise HTTPException(status_code=400, detail="No valid pipeline paths found. Connect Dataset → Model → Result.")
+    return FastJSONResponse(await run_in_threadpool(execute_batch, requests, current_user["id"]))
 
 
 
@@ -543,45 +894,35 @@ async def preview_until(
     """Run pipeline steps up to a ViewDataset node and return the full data snapshot."""
     try:
         # Fetch dataset
-        dataset = None
-        try:
-            dataset = datasets_collection.find_one({
-                "_id": ObjectId(request.file_id),
-                "$or": [
-                    {"user_id": current_user["id"]},
-                    {"is_sample": True},
-                    {"user_id": "system"}
-                ]
-            })
-        except Exception:
-            pass
-
-        if not dataset:
-            dataset = datasets_collection.find_one({
-                "filename": request.file_id,
-                "$or": [
-                    {"user_id": current_user["id"]},
-                    {"is_sample": True},
-                    {"user_id": "system"}
-                ]
-            })
-
+        dataset, _ = await resolve_dataset_async(
+            async_datasets_collection, request.file_id, current_user["id"], exclude=PROFILE_FIELDS
+        )
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset not found")
 
+        ml_service = MLService()
+
+        # No steps before the ViewDataset node: serve the schema and head rows
+        # stored at upload without downloading the file
+        if not request.active_steps:
+            result = ml_service.preview_from_metadata(dataset, max_rows=request.max_rows or 500)
+            if result is not None:
+                return FastJSONResponse(result)
+
         # Download file
         try:
-            response = requests.get(dataset["cloudinary_url"])
-            file_content = response.content
-        except Exception:
+            file_content = await run_in_threadpool(read_dataset, dataset)
+        except ValueError:
             raise HTTPException(status_code=404, detail="File not found in storage")
 
-        ml_service = MLService()
-        result = ml_service.preview_until(
+        result = await run_in_threadpool(
+            ml_service.preview_until,
             file_content=file_content,
             filename=dataset["filename"],
             active_steps=request.active_steps or [],
             duplicate_handling=request.duplicate_handling or 'none',
+            duplicate_round_decimals=request.duplicate_round_decimals,
+            duplicate_normalize_text=request.duplicate_normalize_text or False,
             outlier_method=request.outlier_method or 'none',
             outlier_action=request.outlier_action or 'clip',
             imputer_strategy=request.imputer_strategy or 'none',
@@ -592,7 +933,7 @@ async def preview_until(
             correlation_threshold=request.correlation_threshold or 0.95,
             max_rows=request.max_rows or 500,
         )
-        return convert_numpy_types(result)
+        return FastJSONResponse(result)
 
     except HTTPException:
         raise
@@ -610,7 +951,7 @@ async def chat_endpoint(
 ):
     """Chat with AI about workflow."""
     try:
-        response_data = chat_service.get_response(request.workflow, request.question, request.sample_data)
+        response_data = await run_in_threadpool(chat_service.get_response, request.workflow, request.question, request.sample_data)
         return response_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -628,5 +969,62 @@ async def chat_stream_endpoint(
     )
 
 
+# ==================== Metrics Endpoints ====================
+
+@app.get("/metrics/downloads")
+async def get_download_metrics(current_user: dict = Depends(get_admin_user)):
+    """Per-host transfer counters of the shared download client."""
+    return download_metrics()
+
+
+@app.get("/metrics/auth")
+async def get_auth_metrics(current_user: dict = Depends(get_admin_user)):
+    """Resolved-user cache, password hashing queue and login rate limiter counters."""
+    return {
+        "user_cache": user_cache_metrics(),
+        "password_hashing": password_hashing_metrics(),
+        "login_rate_limit": login_rate_limit_metrics(),
+    }
+
+
+@app.get("/metrics/results")
+async def get_result_cache_metrics(current_user: dict = Depends(get_admin_user)):
+    """Pipeline result cache hit rate and size."""
+    return result_cache_metrics()
+
+
+@app.get("/metrics/compute")
+async def get_compute_metrics(current_user: dict = Depends(get_admin_user)):
+    """CPU budget shared by pipeline runs."""
+    return thread_budget.metrics()
+
+
+@app.get("/metrics/startup")
+async def get_startup_metrics(current_user: dict = Depends(get_admin_user)):
+    """Import and readiness times, background index creation, estimator imports and
+    the response encoders in use."""
+    return {**STARTUP, "estimators": import_metrics(), "responses": encoding_info()}
+
+
+@app.get("/admin/workers")
+async def get_worker_pool(current_user: dict = Depends(get_admin_user)):
+    """Pipeline worker pool configuration, counters and per-worker health."""
+    return pipeline_pool.status()
+
+
+@app.post("/admin/workers/recycle")
+async def recycle_worker_pool(current_user: dict = Depends(get_admin_user)):
+    """Replace all pipeline workers (busy ones after their current job)."""
+    if not pipeline_pool.enabled:
+        raise HTTPException(status_code=400, detail="Pipeline worker pool is disabled (PIPELINE_WORKERS=0)")
+    return {"recycled_idle": await run_in_threadpool(pipeline_pool.recycle)}
+
+
+@app.get("/metrics/queries")
+async def get_query_metrics(current_user: dict = Depends(get_admin_user)):
+    """Per-query MongoDB timings and pool configuration."""
+    return query_metrics()
+
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
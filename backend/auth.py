@@ -3,6 +3,10 @@ Authentication utilities: password hashing, JWT tokens, and user verification.
 Updated for MongoDB.
 """
 import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
@@ -11,7 +15,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
 
-from database import users_collection
+from database import async_users_collection
 
 load_dotenv()
 
@@ -21,6 +25,20 @@ if not SECRET_KEY or SECRET_KEY == "your-secret-key-change-in-production":
     raise ValueError("CRITICAL: SECRET_KEY is not set or is set to default. Check .env")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))  # 24 hours
+# Resolved users are cached per token subject so protected calls skip the users lookup
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+# bcrypt runs on its own small pool so login bursts cannot starve other requests
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+# Login attempts allowed per window: all attempts per client IP, failed ones per
+# (account, client IP). The client IP is the one uvicorn resolves: behind a reverse
+# proxy set FORWARDED_ALLOW_IPS so it is read from X-Forwarded-For (see render.yaml)
+LOGIN_WINDOW_SECONDS = float(os.getenv("LOGIN_WINDOW_SECONDS", "60"))
+LOGIN_MAX_PER_IP = int(os.getenv("LOGIN_MAX_PER_IP", "20"))
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "5"))  # per account and IP
+# Accounts allowed to use the /admin endpoints (comma-separated emails)
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -41,6 +59,150 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password[:72])
 
 
+# ==================== Bounded password hashing ====================
+
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_stats = {"pending": 0, "max_pending": 0, "completed": 0, "rejected": 0, "wait_seconds": 0.0, "run_seconds": 0.0}
+
+
+async def _run_hashing(fn, *args):
+    """Run a bcrypt call on the dedicated executor; 503 when too many are queued."""
+    if _hash_stats["pending"] >= PASSWORD_HASH_MAX_PENDING:
+        _hash_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    submitted = time.perf_counter()
+    timings = {}
+
+    def timed():
+        timings["started"] = time.perf_counter()
+        return fn(*args)
+
+    _hash_stats["pending"] += 1
+    _hash_stats["max_pending"] = max(_hash_stats["max_pending"], _hash_stats["pending"])
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, timed)
+    finally:
+        # Stats are only touched on the event loop thread
+        started = timings.get("started", submitted)
+        _hash_stats["pending"] -= 1
+        _hash_stats["completed"] += 1
+        _hash_stats["wait_seconds"] += started - submitted
+        _hash_stats["run_seconds"] += time.perf_counter() - started
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
+
+
+def password_hashing_metrics() -> dict:
+    completed = _hash_stats["completed"]
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_pending_allowed": PASSWORD_HASH_MAX_PENDING,
+        "pending": _hash_stats["pending"],
+        "max_pending": _hash_stats["max_pending"],
+        "completed": completed,
+        "rejected": _hash_stats["rejected"],
+        "avg_wait_ms": round(_hash_stats["wait_seconds"] * 1000 / completed, 2) if completed else None,
+        "avg_run_ms": round(_hash_stats["run_seconds"] * 1000 / completed, 2) if completed else None,
+    }
+
+
+# ==================== Login rate limiting ====================
+
+class SlidingWindowLimiter:
+    """At most ``limit`` events per key within ``window`` seconds. Keys are kept in
+    LRU order and capped at ``max_keys`` so memory stays bounded under scans."""
+
+    def __init__(self, limit: int, window: float, max_keys: int = 10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.events: "OrderedDict[str, deque]" = OrderedDict()
+        self.blocked = 0
+
+    def _recent(self, key: str, now: float) -> deque:
+        events = self.events.get(key)
+        if events is None:
+            return deque()
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        return events
+
+    def retry_after(self, key: str) -> float:
+        """Seconds until ``key`` may act again (0 when under the limit)."""
+        now = time.monotonic()
+        events = self._recent(key, now)
+        if len(events) < self.limit:
+            return 0.0
+        self.blocked += 1
+        return events[0] + self.window - now
+
+    def hit(self, key: str):
+        now = time.monotonic()
+        events = self._recent(key, now)
+        events.append(now)
+        self.events[key] = events
+        self.events.move_to_end(key)
+        while len(self.events) > self.max_keys:
+            self.events.popitem(last=False)
+
+    def reset(self, key: str):
+        self.events.pop(key, None)
+
+
+login_ip_limiter = SlidingWindowLimiter(LOGIN_MAX_PER_IP, LOGIN_WINDOW_SECONDS)
+login_user_limiter = SlidingWindowLimiter(LOGIN_MAX_FAILURES_PER_USER, LOGIN_WINDOW_SECONDS)
+
+
+def _account_key(email: str, client_ip: str) -> str:
+    # Failures from other addresses cannot lock an account out of its owner's address
+    return f"{email.lower()}|{client_ip}"
+
+
+def check_login_rate(client_ip: str, email: str):
+    """Raise 429 if this IP, or this account from this IP, is over its login budget;
+    counts the attempt against the IP. Failed attempts are counted by
+    ``record_login_failure``."""
+    wait = max(login_ip_limiter.retry_after(client_ip),
+               login_user_limiter.retry_after(_account_key(email, client_ip)))
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(int(wait) + 1)},
+        )
+    login_ip_limiter.hit(client_ip)
+
+
+def record_login_failure(email: str, client_ip: str):
+    login_user_limiter.hit(_account_key(email, client_ip))
+
+
+def record_login_success(email: str, client_ip: str):
+    login_user_limiter.reset(_account_key(email, client_ip))
+
+
+def login_rate_limit_metrics() -> dict:
+    return {
+        "window_seconds": LOGIN_WINDOW_SECONDS,
+        "max_per_ip": LOGIN_MAX_PER_IP,
+        "max_failures_per_user": LOGIN_MAX_FAILURES_PER_USER,
+        "tracked_ips": len(login_ip_limiter.events),
+        "tracked_user_ips": len(login_user_limiter.events),
+        "blocked_by_ip": login_ip_limiter.blocked,
+        "blocked_by_user": login_user_limiter.blocked,
+    }
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -53,10 +215,62 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+# ==================== Resolved-user cache ====================
+
+_user_cache: "OrderedDict[str, tuple]" = OrderedDict()  # subject -> (expires_at, user)
+_user_cache_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+
+def _get_cached_user(subject: str) -> Optional[dict]:
+    """Cached user for a token subject if still fresh, refreshing its LRU position."""
+    entry = _user_cache.get(subject)
+    if entry is None:
+        _user_cache_stats["misses"] += 1
+        return None
+    expires_at, user = entry
+    if expires_at <= time.monotonic():
+        del _user_cache[subject]
+        _user_cache_stats["expired"] += 1
+        _user_cache_stats["misses"] += 1
+        return None
+    _user_cache.move_to_end(subject)
+    _user_cache_stats["hits"] += 1
+    return dict(user)
+
+
+def _cache_user(subject: str, user: dict):
+    _user_cache[subject] = (time.monotonic() + USER_CACHE_TTL_SECONDS, dict(user))
+    _user_cache.move_to_end(subject)
+    while len(_user_cache) > USER_CACHE_SIZE:
+        _user_cache.popitem(last=False)
+        _user_cache_stats["evictions"] += 1
+
+
+def invalidate_user(subject: Optional[str] = None):
+    """Drop a cached user (by email, the token subject), or every user when None.
+    Call after anything that changes or removes a user document."""
+    if subject is None:
+        _user_cache_stats["invalidations"] += len(_user_cache)
+        _user_cache.clear()
+    elif _user_cache.pop(subject, None) is not None:
+        _user_cache_stats["invalidations"] += 1
+
+
+def user_cache_metrics() -> dict:
+    lookups = _user_cache_stats["hits"] + _user_cache_stats["misses"]
+    return {
+        **_user_cache_stats,
+        "size": len(_user_cache),
+        "max_size": USER_CACHE_SIZE,
+        "ttl_seconds": USER_CACHE_TTL_SECONDS,
+        "hit_rate": round(_user_cache_stats["hits"] / lookups, 4) if lookups else None,
+    }
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     """
     Dependency to get the current authenticated user from JWT token.
-    Returns user document from MongoDB.
+    Returns user document from MongoDB (served from the resolved-user cache when fresh).
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -71,22 +285,34 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     except JWTError:
         raise credentials_exception
     
+    user = _get_cached_user(email)
+    if user is not None:
+        return user
+
     # Query MongoDB
-    user = users_collection.find_one({"email": email})
+    user = await async_users_collection.find_one({"email": email})
     if user is None:
         raise credentials_exception
     
     # Convert ObjectId to string for JSON serialization
     user["id"] = str(user["_id"])
+    _cache_user(email, user)
     return user
 
 
-def get_optional_user(token: str = Depends(oauth2_scheme)) -> Optional[dict]:
+async def get_optional_user(token: str = Depends(oauth2_scheme)) -> Optional[dict]:
     """
     Optional user dependency - returns None if no valid token.
     Useful for endpoints that work with or without authentication.
     """
     try:
-        return get_current_user(token)
+        return await get_current_user(token)
     except HTTPException:
         return None
+
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
+    """Dependency for operator endpoints: the current user must be listed in ADMIN_EMAILS."""
+    if current_user.get("email", "").lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
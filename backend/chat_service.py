@@ -2,7 +2,6 @@
 import os
 import json
 import re
-from openai import OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -34,7 +33,8 @@ When removing/modifying nodes, return the COMPLETE pipeline state.
 Node Types: 'dataset', 'imputation', 'encoding', 'preprocessing', 'split', 'model', 'result', 'outlier', 'duplicate', 'featureSelection', 'featureEngineering', 'pca', 'classBalancing', 'crossValidation'.
 
 CRITICAL RULE: For model nodes, the "label" and "modelType" MUST EXACTLY match what the user asked for. Never default to a different model.
-- modelType options: 'Logistic Regression', 'Decision Tree', 'Random Forest', 'Linear Regression', 'Random Forest Regressor', 'Ridge Regression', 'ElasticNet', 'SVM', 'KNN', 'Gradient Boosting', 'XGBoost'
+- modelType options: 'Logistic Regression', 'Decision Tree', 'Random Forest', 'Linear Regression', 'Random Forest Regressor', 'Ridge Regression', 'ElasticNet', 'SVM', 'KNN', 'Gradient Boosting', 'XGBoost', 'Hist Gradient Boosting', 'Linear SVM', 'SGD Classifier', 'Approximate Kernel SVM', 'Hist Gradient Boosting Regressor', 'Linear SVR', 'SGD Regressor', 'Approximate Kernel Ridge'
+- For large datasets (tens of thousands of rows or more) prefer 'Hist Gradient Boosting' over 'Gradient Boosting' and 'Linear SVM' / 'Approximate Kernel SVM' over 'SVM'
 - Pattern: {"type": "model", "data": {"label": "<REQUESTED_MODEL>", "modelType": "<REQUESTED_MODEL>"}}
 - Preprocessing pattern: {"type": "preprocessing", "data": {"label": "Preprocessing", "scaler": "StandardScaler"}}
 - Imputation pattern: {"type": "imputation", "data": {"label": "Imputation", "strategy": "mean"}}
@@ -46,15 +46,21 @@ Dataset {x:0,y:0} → Imputation {x:300,y:0} → Split {x:600,y:0} → Model {x:
 
 class ChatService:
     def __init__(self):
-        api_key = os.getenv("NVIDIA_API_KEY")
-        if not api_key:
+        self.api_key = os.getenv("NVIDIA_API_KEY")
+        if not self.api_key:
             print("WARNING: NVIDIA_API_KEY not found in environment variables.")
-            self.client = None
-        else:
-            self.client = OpenAI(
+        self._client = None
+
+    @property
+    def client(self):
+        """OpenAI client, created (and the SDK imported) on the first chat request."""
+        if self._client is None and self.api_key:
+            from openai import OpenAI
+            self._client = OpenAI(
                 base_url="https://integrate.api.nvidia.com/v1",
-                api_key=api_key
+                api_key=self.api_key
             )
+        return self._client
 
     def _get_system_prompt(self, question: str) -> str:
         """Returns a lean prompt for chat, or extended prompt for pipeline building."""
@@ -1,9 +1,14 @@
 """
 Database configuration for MongoDB connection using PyMongo.
+Async handlers use the ``async_*`` collections (PyMongo's AsyncMongoClient); the
+synchronous client stays for code that runs in worker threads and scripts.
+Both clients share the pool settings below and report per-query timings.
 """
 import os
+import time
 import logging
-from pymongo import MongoClient, ASCENDING, DESCENDING
+import threading
+from pymongo import MongoClient, AsyncMongoClient, ASCENDING, DESCENDING, monitoring
 from pymongo.errors import OperationFailure
 from dotenv import load_dotenv
 
@@ -16,36 +21,152 @@ MONGODB_URI = os.getenv("MONGODB_URI")
 if not MONGODB_URI:
     raise ValueError("MONGODB_URI environment variable is not set")
 
-# Create MongoDB client with connection pool tuning
-client = MongoClient(
-    MONGODB_URI,
-    serverSelectionTimeoutMS=30000,
-    connectTimeoutMS=30000,
-    socketTimeoutMS=30000,
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "10"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "30000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGO_SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "200"))
+
+
+class QueryTimer(monitoring.CommandListener):
+    """Command listener aggregating count/total/max latency per ``collection.command``
+    and logging queries slower than MONGO_SLOW_QUERY_MS."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.stats = {}
+
+    def _key(self, event) -> tuple:
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        label = f"{collection}.{event.command_name}" if isinstance(collection, str) else event.command_name
+        with self._lock:
+            self._pending[self._key(event)] = label
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            label = self._pending.pop(self._key(event), event.command_name)
+            ms = event.duration_micros / 1000
+            entry = self.stats.setdefault(label, {"count": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["failures"] += failed
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+        if ms >= MONGO_SLOW_QUERY_MS:
+            logger.warning(f"Slow MongoDB query: {label} took {ms:.1f} ms")
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                label: {
+                    **entry,
+                    "total_ms": round(entry["total_ms"], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 2) if entry["count"] else None,
+                }
+                for label, entry in self.stats.items()
+            }
+
+
+query_timer = QueryTimer()
+
+# Connection pool tuning shared by both clients
+CLIENT_OPTIONS = dict(
+    serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
     retryWrites=True,
     w="majority",
-    maxPoolSize=10,
-    minPoolSize=2,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    event_listeners=[query_timer],
 )
 
+# Create MongoDB client with connection pool tuning
+client = MongoClient(MONGODB_URI, **CLIENT_OPTIONS)
+# Async client for the FastAPI handlers; connects lazily on first await
+async_client = AsyncMongoClient(MONGODB_URI, **CLIENT_OPTIONS)
+
 db = client.neuroflow  # Database name
+async_db = async_client.neuroflow
 
 # Collections
 users_collection = db.users
 datasets_collection = db.datasets
 workflows_collection = db.workflows
 workspaces_collection = db.workspaces
+results_collection = db.pipeline_results
+
+async_users_collection = async_db.users
+async_datasets_collection = async_db.datasets
+async_workflows_collection = async_db.workflows
+async_workspaces_collection = async_db.workspaces
+
+
+def query_metrics() -> dict:
+    """Per-query timings plus the pool configuration."""
+    return {
+        "queries": query_timer.snapshot(),
+        "pool": {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        },
+    }
+
+
+def _indexes() -> list:
+    """``(collection, keys, options)`` for every index the app relies on."""
+    return [
+        (users_collection, "email", {"unique": True}),
+        (users_collection, "username", {"unique": True}),
+        (datasets_collection, [("user_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        (datasets_collection, "filename", {}),
+        (datasets_collection, "is_sample", {}),
+        # Dataset resolution by filename, narrowed to the caller's own documents
+        (datasets_collection, [("filename", ASCENDING), ("user_id", ASCENDING)], {}),
+        # One index per /datasets $or branch, ending in the (filename, _id) sort key, so
+        # each branch is an index scan and the branches merge without an in-memory sort
+        (datasets_collection, [("user_id", ASCENDING), ("filename", ASCENDING), ("_id", ASCENDING)], {}),
+        (datasets_collection, [("is_sample", ASCENDING), ("filename", ASCENDING), ("_id", ASCENDING)], {}),
+        (workflows_collection, [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        (workspaces_collection, [("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)], {}),
+        # Older result documents have no cache_key; they must not collide on null
+        (results_collection, "cache_key",
+         {"unique": True, "partialFilterExpression": {"cache_key": {"$exists": True}}}),
+        (results_collection, "expires_at", {"expireAfterSeconds": 0}),  # TTL eviction
+    ]
+
+
+def ensure_indexes() -> dict:
+    """Create the collections' indexes (no-op for existing ones). Run once at startup,
+    off the import path so the API can answer before MongoDB is reachable.
 
-# Create indexes for better query performance (only run once)
-try:
-    users_collection.create_index("email", unique=True)
-    users_collection.create_index("username", unique=True)
-    datasets_collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
-    datasets_collection.create_index("filename")
-    datasets_collection.create_index("is_sample")
-    workflows_collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
-    workspaces_collection.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING)])
-except OperationFailure:
-    pass  # Indexes already exist
-except Exception as e:
-    logger.warning(f"Index creation warning: {e}")
+    Each index is created on its own, so one conflicting index (say, an older one with
+    other options) is logged and reported without skipping the rest."""
+    start = time.perf_counter()
+    failed = []
+    for collection, keys, options in _indexes():
+        try:
+            collection.create_index(keys, **options)
+        except OperationFailure as e:
+            logger.warning(f"Index {collection.name}.{keys} not created: {e}")
+            failed.append(f"{collection.name}.{keys}: {e}")
+        except Exception as e:
+            # MongoDB unreachable: the remaining indexes would fail the same way
+            logger.warning(f"Index creation failed: {e}")
+            return {"status": f"failed: {e}", "seconds": round(time.perf_counter() - start, 3)}
+    result = {"status": "ok" if not failed else f"{len(failed)} failed", "seconds": round(time.perf_counter() - start, 3)}
+    if failed:
+        result["failed"] = failed
+    return result
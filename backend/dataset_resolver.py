@@ -0,0 +1,52 @@
+"""
+Dataset lookup shared by /analyze, /preview_until and MLService.run_pipeline.
+A dataset reference (an ObjectId string or a filename) is resolved with one indexed
+aggregation over the datasets the user may read: an exact ``_id`` match wins, then
+the user's own dataset with that filename (newest first), then a sample dataset.
+"""
+from bson import ObjectId
+
+from storage import dataset_location
+
+# Large precomputed fields that most callers do not need
+PROFILE_FIELDS = ("profile",)
+PREVIEW_FIELDS = ("preview_rows",)
+
+
+def readable_by(user_id: str) -> dict:
+    """Datasets a user may read: their own, samples and system datasets."""
+    return {"$or": [{"user_id": user_id}, {"is_sample": True}, {"user_id": "system"}]}
+
+
+def resolve_pipeline(ref: str, user_id: str, exclude: tuple = ()) -> list:
+    oid = ObjectId(ref) if ObjectId.is_valid(ref) else None
+    by_ref = [{"filename": ref}] + ([{"_id": oid}] if oid is not None else [])
+    return [
+        {"$match": {"$and": [{"$or": by_ref}, readable_by(user_id)]}},
+        {"$addFields": {"_rank": {"$switch": {
+            "branches": [
+                {"case": {"$eq": ["$_id", oid]}, "then": 0},
+                {"case": {"$eq": ["$user_id", user_id]}, "then": 1},
+            ],
+            "default": 2,
+        }}}},
+        {"$sort": {"_rank": 1, "created_at": -1}},
+        {"$limit": 1},
+        {"$project": {"_rank": 0, **{field: 0 for field in exclude}}},
+    ]
+
+
+def resolve_dataset(collection, ref: str, user_id: str, exclude: tuple = ()) -> tuple:
+    """``(dataset, location)`` for a reference, or ``(None, None)`` (sync collection)."""
+    docs = list(collection.aggregate(resolve_pipeline(ref, user_id, exclude)))
+    if not docs:
+        return None, None
+    return docs[0], dataset_location(docs[0])
+
+
+async def resolve_dataset_async(collection, ref: str, user_id: str, exclude: tuple = ()) -> tuple:
+    """``(dataset, location)`` for a reference, or ``(None, None)`` (async collection)."""
+    docs = await (await collection.aggregate(resolve_pipeline(ref, user_id, exclude))).to_list()
+    if not docs:
+        return None, None
+    return docs[0], dataset_location(docs[0])
@@ -0,0 +1,195 @@
+"""
+Shared HTTP client for dataset downloads.
+One pooled keep-alive session with bounded timeouts, exponential-backoff retries and
+status checks, per-host concurrency limits, streaming to disk with sha256
+verification, and per-host transfer metrics.
+"""
+import os
+import io
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_POOL_SIZE = int(os.getenv("DOWNLOAD_POOL_SIZE", "10"))
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "5"))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "60"))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+DOWNLOAD_BACKOFF = float(os.getenv("DOWNLOAD_BACKOFF", "0.5"))  # seconds, doubled per retry
+DOWNLOAD_PER_HOST_LIMIT = int(os.getenv("DOWNLOAD_PER_HOST_LIMIT", "4"))
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _CountingRetry(Retry):
+    """urllib3 retry policy that records each retry it grants in the host's metrics.
+    The attempt that exhausts the budget raises instead, and ``_transfer`` counts
+    the failure."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+        if _pool is not None:
+            host = _pool.host if _pool.port in (None, 80, 443) else f"{_pool.host}:{_pool.port}"
+            _bump(_host_stats(host), retries=1)
+        return retry
+
+
+def _build_session() -> requests.Session:
+    # Connect errors and retryable statuses are retried by urllib3 with backoff;
+    # raise_on_status=False hands the last response back so raise_for_status reports it
+    retry = _CountingRetry(
+        total=DOWNLOAD_RETRIES,
+        backoff_factor=DOWNLOAD_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=DOWNLOAD_POOL_SIZE, pool_maxsize=DOWNLOAD_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = _build_session()
+TIMEOUT = (DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)
+
+_lock = threading.Lock()
+_host_slots = {}
+_metrics = {}
+
+
+def _host_stats(host: str) -> dict:
+    with _lock:
+        if host not in _metrics:
+            _metrics[host] = {
+                "requests": 0, "failures": 0, "retries": 0, "checksum_failures": 0,
+                "bytes": 0, "seconds": 0.0, "wait_seconds": 0.0, "in_flight": 0,
+            }
+            _host_slots[host] = threading.BoundedSemaphore(DOWNLOAD_PER_HOST_LIMIT)
+        return _metrics[host]
+
+
+def _bump(stats: dict, **deltas):
+    with _lock:
+        for key, value in deltas.items():
+            stats[key] += value
+
+
+@contextmanager
+def _host_slot(host: str, stats: dict):
+    """Hold one of the host's DOWNLOAD_PER_HOST_LIMIT transfer slots."""
+    waited = time.perf_counter()
+    _host_slots[host].acquire()
+    _bump(stats, wait_seconds=time.perf_counter() - waited, in_flight=1)
+    try:
+        yield
+    finally:
+        _bump(stats, in_flight=-1)
+        _host_slots[host].release()
+
+
+class _ChecksumMismatch(ValueError):
+    pass
+
+
+def _transfer(url: str, sink, headers: dict = None, expected_sha256: str = None) -> tuple:
+    """Stream ``url`` into the seekable ``sink``. Failures while reading the body and
+    checksum mismatches are retried from scratch with exponential backoff.
+    Returns ``(size, sha256 hex digest)``."""
+    host = urlsplit(url).netloc
+    stats = _host_stats(host)
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        sink.seek(0)
+        sink.truncate()
+        digest = hashlib.sha256()
+        size = 0
+        response = None
+        counted = False
+        started = time.perf_counter()
+        try:
+            with _host_slot(host, stats):
+                response = session.get(url, headers=headers, stream=True, timeout=TIMEOUT)
+                with response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                        digest.update(chunk)
+                        sink.write(chunk)
+                        size += len(chunk)
+            _bump(stats, requests=1, bytes=size, seconds=time.perf_counter() - started)
+            counted = True
+
+            checksum = digest.hexdigest()
+            if expected_sha256 and checksum != expected_sha256:
+                _bump(stats, checksum_failures=1)
+                raise _ChecksumMismatch(f"Checksum mismatch for {url}: expected {expected_sha256}, got {checksum}")
+            return size, checksum
+        except (_ChecksumMismatch, requests.exceptions.RequestException) as e:
+            # Only a body that broke off mid-stream (or came back corrupt) is worth
+            # another attempt; connect errors and statuses were already retried
+            retryable = isinstance(e, _ChecksumMismatch) or (
+                response is not None and response.ok and not isinstance(e, requests.exceptions.HTTPError)
+            )
+            if not counted:
+                _bump(stats, requests=1, seconds=time.perf_counter() - started)
+            if not retryable or attempt == DOWNLOAD_RETRIES:
+                _bump(stats, failures=1)
+                raise
+            _bump(stats, retries=1)
+            logger.warning(f"Download of {url} failed ({e}); retrying")
+            time.sleep(DOWNLOAD_BACKOFF * (2 ** attempt))
+
+
+def fetch(url: str, headers: dict = None, expected_sha256: str = None) -> bytes:
+    """Download ``url`` into memory, optionally verifying its sha256."""
+    buffer = io.BytesIO()
+    _transfer(url, buffer, headers=headers, expected_sha256=expected_sha256)
+    return buffer.getvalue()
+
+
+def download_to_file(url: str, path: str, expected_sha256: str = None) -> tuple:
+    """Stream ``url`` to ``path`` in chunks; returns ``(size, sha256)``."""
+    with open(path, 'wb') as f:
+        return _transfer(url, f, expected_sha256=expected_sha256)
+
+
+def open_stream(url: str, headers: dict = None):
+    """Binary file-like stream over ``url`` (pooled session, timeouts and status
+    check; no per-host slot is held while the caller reads)."""
+    host = urlsplit(url).netloc
+    stats = _host_stats(host)
+    response = session.get(url, headers=headers, stream=True, timeout=TIMEOUT)
+    _bump(stats, requests=1, failures=0 if response.ok else 1)
+    response.raise_for_status()
+    response.raw.decode_content = True
+    return response.raw
+
+
+def download_metrics() -> dict:
+    """Per-host transfer counters, with average throughput in MB/s."""
+    with _lock:
+        snapshot = {host: dict(stats) for host, stats in _metrics.items()}
+    for stats in snapshot.values():
+        stats["mb_per_second"] = round(stats["bytes"] / 1e6 / stats["seconds"], 3) if stats["seconds"] else None
+        stats["seconds"] = round(stats["seconds"], 3)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+    return {
+        "hosts": snapshot,
+        "config": {
+            "pool_size": DOWNLOAD_POOL_SIZE,
+            "per_host_limit": DOWNLOAD_PER_HOST_LIMIT,
+            "timeout": {"connect": DOWNLOAD_CONNECT_TIMEOUT, "read": DOWNLOAD_READ_TIMEOUT},
+            "retries": DOWNLOAD_RETRIES,
+        },
+    }
@@ -0,0 +1,90 @@
+"""
+Lazy registry of scikit-learn estimators, transformers and model-selection helpers.
+Importing sklearn's submodules takes seconds, so nothing on the API's import path
+imports them directly: ``estimators.<Name>`` looks the name up in REGISTRY, imports
+its module on first use and caches the class. ``preload()`` warms every module
+(run in the background after startup) and ``import_metrics()`` reports what each
+first import cost.
+"""
+import sys
+import time
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+_MODULES = {
+    "sklearn.model_selection": ("train_test_split", "cross_val_score", "StratifiedKFold", "KFold"),
+    "sklearn.impute": ("SimpleImputer",),
+    "sklearn.preprocessing": (
+        "StandardScaler", "MinMaxScaler", "RobustScaler", "MaxAbsScaler", "Normalizer",
+        "LabelEncoder", "OneHotEncoder", "OrdinalEncoder", "PolynomialFeatures",
+    ),
+    "sklearn.feature_selection": ("VarianceThreshold",),
+    "sklearn.decomposition": ("PCA",),
+    "sklearn.linear_model": (
+        "LogisticRegression", "LinearRegression", "Ridge", "Lasso", "ElasticNet",
+        "SGDClassifier", "SGDRegressor",
+    ),
+    "sklearn.tree": ("DecisionTreeClassifier", "DecisionTreeRegressor"),
+    "sklearn.ensemble": (
+        "RandomForestClassifier", "RandomForestRegressor",
+        "GradientBoostingClassifier", "GradientBoostingRegressor",
+        "HistGradientBoostingClassifier", "HistGradientBoostingRegressor",
+    ),
+    "sklearn.svm": ("SVC", "SVR", "LinearSVC", "LinearSVR"),
+    "sklearn.kernel_approximation": ("Nystroem", "RBFSampler"),
+    "sklearn.pipeline": ("make_pipeline",),
+    "sklearn.neighbors": ("KNeighborsClassifier", "KNeighborsRegressor", "NearestNeighbors"),
+    "sklearn.neural_network": ("MLPClassifier", "MLPRegressor"),
+}
+
+# Name -> module it is imported from
+REGISTRY = {name: module for module, names in _MODULES.items() for name in names}
+
+_lock = threading.Lock()
+_import_seconds = {}  # module -> wall time of its first import
+
+
+def resolve(name: str):
+    """The registered class or function ``name``, importing its module if needed."""
+    module_name = REGISTRY.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'estimators' has no attribute '{name}'")
+    first = module_name not in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if first:
+        with _lock:
+            _import_seconds.setdefault(module_name, round(time.perf_counter() - start, 3))
+    value = getattr(module, name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __getattr__(name: str):
+    return resolve(name)
+
+
+def preload() -> float:
+    """Import every registered module; returns the seconds it took."""
+    start = time.perf_counter()
+    for names in _MODULES.values():
+        for name in names:
+            resolve(name)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Preloaded estimator modules in {elapsed:.2f}s")
+    return elapsed
+
+
+def import_metrics() -> dict:
+    """Registered modules imported so far, and the time of each first import made
+    through the registry (modules pulled in by an earlier import are not timed)."""
+    with _lock:
+        seconds = dict(_import_seconds)
+    return {
+        "modules_loaded": sum(module in sys.modules for module in _MODULES),
+        "modules_registered": len(_MODULES),
+        "import_seconds": seconds,
+    }
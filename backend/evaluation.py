@@ -0,0 +1,205 @@
+"""
+Model evaluation metrics.
+Classification metrics (accuracy, per-class and averaged precision/recall/F1, and the
+classification report) are all derived from one confusion matrix. ROC, precision-recall
+and calibration curves come from a single sort of the test scores. Train-set scoring
+for the overfitting check runs on at most EVAL_TRAIN_SAMPLE_ROWS rows.
+"""
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+import estimators as sk
+
+load_dotenv()
+
+EVAL_TRAIN_SAMPLE_ROWS = int(os.getenv("EVAL_TRAIN_SAMPLE_ROWS", "20000"))
+EVAL_CURVE_POINTS = int(os.getenv("EVAL_CURVE_POINTS", "101"))
+CALIBRATION_BINS = 10
+
+
+# ==================== Helpers ====================
+
+def _take(data, idx):
+    return data.iloc[idx] if hasattr(data, 'iloc') else data[idx]
+
+
+def _safe_div(num, den) -> np.ndarray:
+    num = np.asarray(num, dtype=float)
+    den = np.asarray(den, dtype=float)
+    return np.divide(num, den, out=np.zeros_like(num), where=den != 0)
+
+
+def _round(values) -> list:
+    return [round(float(v), 4) for v in values]
+
+
+def _downsample(n: int, points: int) -> np.ndarray:
+    """Indices of at most ``points`` evenly spaced positions in ``range(n)``, ends included."""
+    if n <= points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, points).round().astype(int))
+
+
+def bounded_sample(X, y, max_rows: int = EVAL_TRAIN_SAMPLE_ROWS, random_state: int = 0):
+    """``(X, y)`` reduced to a uniform sample of ``max_rows`` rows (row order kept)."""
+    n = X.shape[0]
+    if n <= max_rows:
+        return X, y
+    idx = np.sort(np.random.default_rng(random_state).choice(n, max_rows, replace=False))
+    return _take(X, idx), _take(y, idx)
+
+
+# ==================== Predictions ====================
+
+def predict_with_scores(model, X):
+    """``(y_pred, scores, is_proba)`` for a classifier in as few passes as possible.
+
+    Where ``predict`` is the argmax of ``predict_proba`` the labels come from the
+    probabilities; models whose probabilities can disagree with their decision
+    function (SVC's Platt scaling, SGD's clipped modified-Huber scores) and models
+    without scores fall back to ``predict``."""
+    if hasattr(model, 'predict_proba') and hasattr(model, 'classes_'):
+        proba = np.asarray(model.predict_proba(X))
+        if isinstance(model, (sk.SVC, sk.SGDClassifier)):
+            return model.predict(X), proba, True
+        return np.asarray(model.classes_)[proba.argmax(axis=1)], proba, True
+    y_pred = model.predict(X)
+    if hasattr(model, 'decision_function'):
+        return y_pred, np.asarray(model.decision_function(X)), False
+    return y_pred, None, False
+
+
+# ==================== Metrics ====================
+
+def confusion_counts(y_true, y_pred):
+    """``(labels, matrix)`` over the sorted union of true and predicted labels."""
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    labels, codes = np.unique(np.concatenate([y_true, y_pred]), return_inverse=True)
+    n, k = len(y_true), len(labels)
+    matrix = np.bincount(codes[:n] * k + codes[n:], minlength=k * k).reshape(k, k)
+    return labels, matrix
+
+
+def classification_metrics(y_true, y_pred) -> dict:
+    """Accuracy, weighted precision/recall/F1, a ``classification_report``-shaped dict
+    and the confusion matrix, all from one set of confusion counts."""
+    labels, matrix = confusion_counts(y_true, y_pred)
+    tp = np.diag(matrix).astype(float)
+    support = matrix.sum(axis=1)
+    predicted = matrix.sum(axis=0)
+    total = support.sum()
+
+    precision = _safe_div(tp, predicted)
+    recall = _safe_div(tp, support)
+    f1 = _safe_div(2 * precision * recall, precision + recall)
+    weights = support / total if total else np.zeros(len(labels))
+    accuracy = float(tp.sum() / total) if total else 0.0
+
+    report = {
+        str(label): {
+            "precision": float(precision[i]),
+            "recall": float(recall[i]),
+            "f1-score": float(f1[i]),
+            "support": int(support[i]),
+        }
+        for i, label in enumerate(labels)
+    }
+    report["accuracy"] = accuracy
+    for name, w in (("macro avg", None), ("weighted avg", weights)):
+        report[name] = {
+            "precision": float(np.average(precision, weights=w)),
+            "recall": float(np.average(recall, weights=w)),
+            "f1-score": float(np.average(f1, weights=w)),
+            "support": int(total),
+        }
+
+    weighted = report["weighted avg"]
+    return {
+        "accuracy": accuracy,
+        "precision": weighted["precision"],
+        "recall": weighted["recall"],
+        "f1_score": weighted["f1-score"],
+        "report": report,
+        "confusion_matrix": matrix.tolist(),
+    }
+
+
+def regression_metrics(y_true, y_pred) -> dict:
+    """MSE, MAE, R² and explained variance from one residual vector."""
+    y_true = np.asarray(y_true, dtype=float)
+    residual = y_true - np.asarray(y_pred, dtype=float)
+    total_var = np.var(y_true)
+    mse = float(np.mean(residual ** 2))
+    return {
+        "mse": mse,
+        "mae": float(np.mean(np.abs(residual))),
+        "r2": 1 - mse / total_var if total_var else 0.0,
+        "explained_variance": 1 - float(np.var(residual)) / total_var if total_var else 0.0,
+    }
+
+
+# ==================== Curves ====================
+
+def score_curves(y_true, scores, classes, is_proba: bool):
+    """ROC, precision-recall and (for probabilities) calibration curves from one sort
+    of the scores. Binary problems score the second class; multiclass problems are
+    micro-averaged over one-vs-rest columns. None when a curve is undefined."""
+    if scores is None:
+        return None
+    y_true = np.asarray(y_true)
+    classes = np.asarray(classes)
+    if scores.ndim == 1:
+        truth, s, average = y_true == classes[1], scores, "binary"
+    elif scores.shape[1] == 2:
+        truth, s, average = y_true == classes[1], scores[:, 1], "binary"
+    else:
+        truth = (y_true[:, None] == classes[None, :]).ravel()
+        s, average = scores.ravel(), "micro"
+
+    order = np.argsort(-s, kind='mergesort')
+    s = s[order]
+    truth = truth[order]
+    # Cumulative counts at the last position of each distinct threshold
+    cut = np.r_[np.flatnonzero(np.diff(s)), len(s) - 1]
+    tps = np.cumsum(truth)[cut].astype(float)
+    fps = (cut + 1) - tps
+    positives, negatives = tps[-1], fps[-1]
+    if positives == 0 or negatives == 0:
+        return None
+
+    tpr = np.r_[0.0, tps / positives]
+    fpr = np.r_[0.0, fps / negatives]
+    precision = tps / (tps + fps)
+    recall = tps / positives
+    roc_pick = _downsample(len(tpr), EVAL_CURVE_POINTS)
+    pr_pick = _downsample(len(recall), EVAL_CURVE_POINTS)
+    curves = {
+        "average": average,
+        "roc": {
+            "fpr": _round(fpr[roc_pick]),
+            "tpr": _round(tpr[roc_pick]),
+            "auc": round(float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)), 4),
+        },
+        "pr": {
+            "precision": _round(precision[pr_pick]),
+            "recall": _round(recall[pr_pick]),
+            "average_precision": round(float(np.sum(np.diff(np.r_[0.0, recall]) * precision)), 4),
+        },
+    }
+
+    if is_proba:
+        bins = np.clip((s * CALIBRATION_BINS).astype(int), 0, CALIBRATION_BINS - 1)
+        counts = np.bincount(bins, minlength=CALIBRATION_BINS)
+        mean_predicted = _safe_div(np.bincount(bins, weights=s, minlength=CALIBRATION_BINS), counts)
+        fraction_positive = _safe_div(np.bincount(bins, weights=truth, minlength=CALIBRATION_BINS), counts)
+        filled = counts > 0
+        curves["calibration"] = {
+            "mean_predicted": _round(mean_predicted[filled]),
+            "fraction_positive": _round(fraction_positive[filled]),
+            "count": counts[filled].tolist(),
+            "brier_score": round(float(np.mean((s - truth) ** 2)), 4),
+        }
+    return curves
@@ -0,0 +1,182 @@
+"""
+Row fingerprint index for duplicate, near-duplicate and train/test leakage detection.
+Each row is reduced to one 64-bit hash in a vectorized pass; rows that share a hash
+are verified against the actual values before being reported as duplicates.
+Column hashes are folded in one at a time, so the fingerprint of the features is a
+by-product of the fingerprint of the features plus the target.
+"""
+import numpy as np
+import pandas as pd
+
+TARGET_COLUMN = '__target__'
+_SEED = np.uint64(0x9E3779B97F4A7C15)
+_PRIME = np.uint64(0x100000001B3)
+
+
+def normalize_frame(df: pd.DataFrame, round_decimals: int = None, normalize_text: bool = False) -> pd.DataFrame:
+    """Return a view of ``df`` with numeric columns rounded and/or text columns
+    trimmed and lower-cased, so near-duplicates hash to the same fingerprint.
+    Columns that are not touched are shared with ``df`` (no copy)."""
+    if round_decimals is None and not normalize_text:
+        return df
+
+    replaced = {}
+    for col in df.columns:
+        values = df[col]
+        if round_decimals is not None and pd.api.types.is_float_dtype(values):
+            replaced[col] = values.round(round_decimals)
+        elif normalize_text and (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+            replaced[col] = values.astype(str).str.strip().str.lower().where(values.notna())
+    return df.assign(**replaced) if replaced else df
+
+
+def _fold(hashes: np.ndarray, values: pd.Series) -> np.ndarray:
+    """Mix one column's value hashes into running row fingerprints."""
+    return (hashes ^ pd.util.hash_pandas_object(values, index=False).to_numpy()) * _PRIME
+
+
+def row_fingerprints(df: pd.DataFrame, columns: list = None) -> np.ndarray:
+    """One uint64 hash per row over ``columns`` (default: all), built column by column
+    with pandas' vectorized hasher."""
+    hashes = np.full(len(df), _SEED, dtype=np.uint64)
+    for col in (df.columns if columns is None else columns):
+        hashes = _fold(hashes, df[col])
+    return hashes
+
+
+def _rows_equal(left: pd.DataFrame, left_rows: np.ndarray, right: pd.DataFrame,
+                right_rows: np.ndarray, columns: list) -> np.ndarray:
+    """Pairwise equality of ``left_rows`` and ``right_rows`` over ``columns``, treating NaN == NaN."""
+    equal = np.ones(len(left_rows), dtype=bool)
+    for col in columns:
+        a = left[col].to_numpy()[left_rows]
+        b = right[col].to_numpy()[right_rows]
+        same = a == b
+        both_na = pd.isna(a) & pd.isna(b)
+        equal &= np.asarray(same | both_na, dtype=bool)
+    return equal
+
+
+class RowFingerprintIndex:
+    """Hash index over the rows of a DataFrame.
+
+    Rows are grouped by fingerprint; every member of a multi-row group is compared
+    with the group's first row, and hash collisions are split back out into their
+    own groups, so the groups are exact (after optional normalization). A ``target``
+    takes part in the groups as one extra column; ``feature_hashes`` keeps the
+    fingerprint of the features alone for leakage checks.
+    """
+
+    def __init__(self, df: pd.DataFrame, target=None, round_decimals: int = None,
+                 normalize_text: bool = False):
+        self.feature_columns = list(df.columns)
+        if target is not None:
+            df = df.assign(**{TARGET_COLUMN: np.asarray(target)})
+        self.frame = normalize_frame(df, round_decimals=round_decimals, normalize_text=normalize_text)
+        self.feature_hashes = row_fingerprints(self.frame, self.feature_columns)
+        self.hashes = self.feature_hashes if target is None else \
+            _fold(self.feature_hashes, self.frame[TARGET_COLUMN])
+        self.collisions = 0
+        self.group_ids = self._build_groups()
+        self.group_sizes = np.bincount(self.group_ids) if len(self.group_ids) else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _build_groups(self) -> np.ndarray:
+        n = len(self.hashes)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        order = np.argsort(self.hashes, kind='stable')
+        sorted_hashes = self.hashes[order]
+        starts = np.empty(n, dtype=bool)
+        starts[0] = True
+        starts[1:] = sorted_hashes[1:] != sorted_hashes[:-1]
+
+        group_ids = np.empty(n, dtype=np.int64)
+        group_ids[order] = np.cumsum(starts) - 1
+        # Stable sort: the first row of each run is the group's earliest row
+        first_rows = order[starts]
+
+        # Verify candidate rows against their group's first row
+        sizes = np.bincount(group_ids)
+        candidates = np.flatnonzero((sizes[group_ids] > 1) & (np.arange(n) != first_rows[group_ids]))
+        if len(candidates):
+            reps = first_rows[group_ids[candidates]]
+            equal = _rows_equal(self.frame, candidates, self.frame, reps, list(self.frame.columns))
+            collided = candidates[~equal]
+            if len(collided):
+                # Hash collision: give each colliding row a group of its own
+                self.collisions = len(collided)
+                group_ids[collided] = len(first_rows) + np.arange(len(collided))
+        return group_ids
+
+    def duplicated(self, keep='first') -> np.ndarray:
+        """Boolean mask like ``DataFrame.duplicated``: ``keep`` is 'first', 'last' or False."""
+        n = len(self.group_ids)
+        if n == 0:
+            return np.zeros(0, dtype=bool)
+        positions = np.arange(n)
+        if keep is False:
+            return self.group_sizes[self.group_ids] > 1
+        if keep == 'last':
+            last = np.full(len(self.group_sizes), -1)
+            np.maximum.at(last, self.group_ids, positions)
+            return positions != last[self.group_ids]
+        first = np.full(len(self.group_sizes), n)
+        np.minimum.at(first, self.group_ids, positions)
+        return positions != first[self.group_ids]
+
+    def clusters(self, limit: int = 10, max_rows: int = 5) -> list:
+        """Largest duplicate groups as ``{"size", "rows"}`` with row positions (first ``max_rows``)."""
+        dup_groups = np.flatnonzero(self.group_sizes > 1)
+        if not len(dup_groups):
+            return []
+        dup_groups = dup_groups[np.argsort(-self.group_sizes[dup_groups], kind='stable')][:limit]
+        member_order = np.argsort(self.group_ids, kind='stable')
+        group_starts = np.concatenate(([0], np.cumsum(self.group_sizes)))
+        return [
+            {
+                "size": int(self.group_sizes[g]),
+                "rows": member_order[group_starts[g]:group_starts[g] + min(self.group_sizes[g], max_rows)].tolist(),
+            }
+            for g in dup_groups
+        ]
+
+    def _representatives(self, rows: np.ndarray = None) -> np.ndarray:
+        """First position of each group, among ``rows`` (a boolean mask) when given."""
+        positions = np.arange(len(self)) if rows is None else np.flatnonzero(rows)
+        _, first = np.unique(self.group_ids[positions], return_index=True)
+        return positions[first]
+
+    def overlap(self, other: 'RowFingerprintIndex', features_only: bool = False,
+                other_rows: np.ndarray = None) -> np.ndarray:
+        """Mask of rows in this index whose exact values also occur in ``other``.
+
+        ``features_only`` leaves the target out of the comparison; ``other_rows`` is a
+        boolean mask of the rows of ``other`` to match against. A row is checked against
+        every row of ``other`` with the same hash, one per group on each side."""
+        columns = self.feature_columns if features_only else list(self.frame.columns)
+        other_columns = other.feature_columns if features_only else list(other.frame.columns)
+        if len(self) == 0 or len(other) == 0 or columns != other_columns:
+            return np.zeros(len(self), dtype=bool)
+        hashes = self.feature_hashes if features_only else self.hashes
+        other_hashes = other.feature_hashes if features_only else other.hashes
+
+        reps = self._representatives()
+        other_reps = other._representatives(other_rows)
+        other_order = other_reps[np.argsort(other_hashes[other_reps], kind='stable')]
+        other_sorted = other_hashes[other_order]
+        lo = np.searchsorted(other_sorted, hashes[reps], side='left')
+        counts = np.searchsorted(other_sorted, hashes[reps], side='right') - lo
+
+        # One (row, other row) pair per hash match, verified on the actual values
+        left = np.repeat(reps, counts)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(counts) - counts, counts)
+        right = other_order[np.repeat(lo, counts) + offsets]
+        equal = _rows_equal(self.frame, left, other.frame, right, columns)
+
+        matched = np.zeros(len(self.group_sizes), dtype=bool)
+        matched[self.group_ids[left[equal]]] = True
+        return matched[self.group_ids]
@@ -7,38 +7,55 @@ import pandas as pd
 import numpy as np
 import io
 import os
-import requests
+import inspect
 import warnings
-from bson import ObjectId
 from datetime import datetime, timezone
 
-from sklearn.model_selection import train_test_split, cross_val_score, StratifiedKFold, KFold
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import (
-    StandardScaler, MinMaxScaler, RobustScaler, MaxAbsScaler, Normalizer,
-    LabelEncoder, OneHotEncoder, OrdinalEncoder, PolynomialFeatures
-)
-from sklearn.feature_selection import VarianceThreshold
-from sklearn.decomposition import PCA
-from sklearn.linear_model import LogisticRegression, LinearRegression, Ridge, Lasso, ElasticNet
-from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
-from sklearn.ensemble import (
-    RandomForestClassifier, RandomForestRegressor,
-    GradientBoostingClassifier, GradientBoostingRegressor
+import estimators as sk
+from database import datasets_collection
+from fingerprint import RowFingerprintIndex
+from thread_budget import thread_budget
+from training_budget import Budget, TrainingTimeout, fit_with_budget, cross_val_score_with_budget
+from pipeline_steps import STEPS, plan_steps, plan_request
+from evaluation import (
+    bounded_sample, predict_with_scores, classification_metrics, regression_metrics, score_curves
 )
-from sklearn.svm import SVC, SVR
-from sklearn.neighbors import KNeighborsClassifier, KNeighborsRegressor
-from sklearn.neural_network import MLPClassifier, MLPRegressor
-from sklearn.metrics import (
-    accuracy_score, classification_report, confusion_matrix,
-    mean_squared_error, r2_score, mean_absolute_error,
-    precision_score, recall_score, f1_score, explained_variance_score
+from storage import read_dataset
+from result_cache import result_key, get_cached_result, store_result
+from dataset_resolver import resolve_dataset, PROFILE_FIELDS, PREVIEW_FIELDS
+from profiling import (
+    profile_dataframe, dataset_metadata, format_rows, format_column, DistinctSketch,
+    PROFILE_SAMPLE_ROWS, PREVIEW_ROWS_STORED,
 )
 
-from database import datasets_collection
-
 warnings.filterwarnings('ignore')
 
+# Rows parsed per chunk when scanning an uploaded file from disk
+SCAN_CHUNK_ROWS = int(os.getenv("UPLOAD_SCAN_CHUNK_ROWS", "100000"))
+
+# Boosting rounds for the histogram models (early stopping usually ends sooner)
+HGB_MAX_ITER = int(os.getenv("HGB_MAX_ITER", "500"))
+# Feature map of the approximate kernel models: 'nystroem' or 'rbf' (random Fourier features)
+KERNEL_APPROX_METHOD = os.getenv("KERNEL_APPROX_METHOD", "nystroem").lower()
+KERNEL_APPROX_COMPONENTS = int(os.getenv("KERNEL_APPROX_COMPONENTS", "300"))
+# Above this many training rows, exact kernel SVMs and gradient boosting get a hint
+# pointing at their scalable counterparts
+LARGE_TRAIN_ROWS = 20000
+# Model types trained as regressors (class balancing is skipped for them)
+REGRESSION_MODELS = {
+    'Linear Regression', 'Random Forest Regressor', 'Ridge Regression',
+    'Lasso Regression', 'ElasticNet', 'SVR', 'KNN Regressor',
+    'Gradient Boosting Regressor', 'XGBoost Regressor', 'MLP Regressor',
+    'Decision Tree Regressor', 'Hist Gradient Boosting Regressor', 'Linear SVR',
+    'SGD Regressor', 'Approximate Kernel Ridge',
+}
+SCALABLE_ALTERNATIVES = {
+    'SVM': "'Linear SVM' or 'Approximate Kernel SVM'",
+    'SVR': "'Linear SVR' or 'Approximate Kernel Ridge'",
+    'Gradient Boosting': "'Hist Gradient Boosting'",
+    'Gradient Boosting Regressor': "'Hist Gradient Boosting Regressor'",
+}
+
 
 class MLService:
     def __init__(self):
@@ -52,18 +69,36 @@ class MLService:
         self.is_regression = False
         self.numeric_cols = []
         self.cat_cols = []
+        self.ordinal_cols = []  # Categorical columns label-encoded to integer codes
         self.target_encoder = None  # For categorical targets
         self.pipeline_warnings = []  # Collect warnings throughout pipeline
+        # After preprocessing, X_train/X_test are contiguous NumPy blocks of this
+        # dtype and feature_names holds the column metadata for them.
+        self.feature_dtype = np.dtype('float64')
+        self.missing_fill = 0  # Written for missing values when features enter the block
+        self.sample_weight = None  # Per-row training weights (class_balancing='sample_weight')
+        self.n_jobs = 1  # Cores for this run, assigned by the thread budget
+        self.compute = None  # Thread budget report for this run
+        self.expected_peers = 0  # Runs expected to train alongside this one (batch runs)
+        self.model_parallel = False  # Whether the model itself uses n_jobs cores
+        self.fit_params = {}  # Extra keyword arguments for model.fit
+        self.training = None  # How training ended (see training_budget.py)
+        self.step_results = {}  # Reports of the data steps, by results key
+        self.step_previews = {}  # Data snapshot after each step, by node type
+        self.preview_level = 'rows'  # 'rows', 'shape' or 'none' (see PipelineRequest.step_previews)
+        self._prev_shape = None
+        self._last_full_preview = None  # Step whose snapshot later identical ones refer to
 
     # ==================== ViewDataset: Preview Until ====================
 
-    def _df_snapshot(self, df: 'pd.DataFrame', step: str, rows_before: int = None) -> dict:
+    def _df_snapshot(self, step: str, rows_before: int = None) -> dict:
         """Lightweight step-tracking metadata."""
+        rows, cols = self.X_train.shape
         return {
             'step': step,
-            'rows': len(df),
-            'cols': len(df.columns),
-            'delta_rows': (len(df) - rows_before) if rows_before is not None else 0,
+            'rows': rows,
+            'cols': cols,
+            'delta_rows': (rows - rows_before) if rows_before is not None else 0,
         }
 
     def preview_until(
@@ -72,6 +107,8 @@ class MLService:
         filename: str,
         active_steps: list,
         duplicate_handling: str = 'none',
+        duplicate_round_decimals: int = None,
+        duplicate_normalize_text: bool = False,
         outlier_method: str = 'none',
         outlier_action: str = 'clip',
         imputer_strategy: str = 'none',
@@ -83,119 +120,54 @@ class MLService:
         max_rows: int = 500,
     ) -> dict:
         """Load the full raw DataFrame, apply the ordered cleaning/transform steps
-        that come BEFORE the ViewDataset node, and return column stats + data grid."""
+        that come BEFORE the ViewDataset node, and return column stats + data grid.
+
+        The steps are the pipeline's own (``run_step``), applied to the whole
+        dataset: no split, and the target is just another column."""
         file_obj = io.BytesIO(file_content)
-        if filename.endswith('.csv'):
+        if filename.lower().endswith('.csv'):
             df = pd.read_csv(file_obj)
-        elif filename.endswith(('.xls', '.xlsx')):
+        elif filename.lower().endswith(('.xls', '.xlsx')):
             df = pd.read_excel(file_obj)
         else:
             raise ValueError('Unsupported file format')
 
         total_rows = len(df)
-        step_log = [self._df_snapshot(df, 'raw')]
-
-        for step in (active_steps or []):
-            rows_before = len(df)
-
-            if step == 'duplicate' and duplicate_handling != 'none':
-                if duplicate_handling == 'all':
-                    df = df.drop_duplicates(keep=False)
-                elif duplicate_handling == 'first':
-                    df = df.drop_duplicates(keep='first')
-                elif duplicate_handling == 'last':
-                    df = df.drop_duplicates(keep='last')
-                df = df.reset_index(drop=True)
-                step_log.append(self._df_snapshot(df, 'duplicate', rows_before))
-
-            elif step == 'outlier' and outlier_method != 'none':
-                numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
-                for col in numeric_cols:
-                    if outlier_method == 'iqr':
-                        Q1, Q3 = df[col].quantile(0.25), df[col].quantile(0.75)
-                        lower, upper = Q1 - 1.5 * (Q3 - Q1), Q3 + 1.5 * (Q3 - Q1)
-                    elif outlier_method == 'zscore':
-                        mean, std = df[col].mean(), df[col].std()
-                        lower, upper = mean - 3 * std, mean + 3 * std
-                    else:
-                        continue
-                    if outlier_action == 'clip':
-                        df[col] = df[col].clip(lower, upper)
-                    elif outlier_action == 'remove':
-                        df = df[(df[col] >= lower) & (df[col] <= upper)]
-                df = df.reset_index(drop=True)
-                step_log.append(self._df_snapshot(df, 'outlier', rows_before))
-
-            elif step == 'imputation' and imputer_strategy != 'none':
-                numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
-                cat_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
-                if imputer_strategy == 'drop':
-                    df = df.dropna().reset_index(drop=True)
-                else:
-                    strat = imputer_strategy if imputer_strategy in ('mean', 'median', 'most_frequent') else 'mean'
-                    if numeric_cols:
-                        imp = SimpleImputer(strategy=strat)
-                        df[numeric_cols] = imp.fit_transform(df[numeric_cols])
-                    if cat_cols:
-                        imp_cat = SimpleImputer(strategy='most_frequent')
-                        df[cat_cols] = imp_cat.fit_transform(df[cat_cols])
-                step_log.append(self._df_snapshot(df, 'imputation', rows_before))
-
-            elif step == 'encoding' and encoder_strategy not in ('none', 'None', None):
-                cat_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
-                if cat_cols:
-                    if encoder_strategy == 'onehot':
-                        df = pd.get_dummies(df, columns=cat_cols, drop_first=True)
-                        # Convert bool columns to int for clean display
-                        bool_cols = df.select_dtypes(include='bool').columns.tolist()
-                        if bool_cols:
-                            df[bool_cols] = df[bool_cols].astype(int)
-                    elif encoder_strategy in ('label', 'ordinal'):
-                        oe = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1)
-                        df[cat_cols] = oe.fit_transform(df[cat_cols].astype(str))
-                    elif encoder_strategy == 'frequency':
-                        for col in cat_cols:
-                            freq_map = df[col].value_counts(normalize=True)
-                            df[col] = df[col].map(freq_map).fillna(0)
-                    else:
-                        # target encoding requires target — fall back to label
-                        oe = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1)
-                        df[cat_cols] = oe.fit_transform(df[cat_cols].astype(str))
-                step_log.append(self._df_snapshot(df, 'encoding'))
-
-            elif step == 'preprocessing' and scaler_type not in ('None', 'none', None):
-                numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
-                if numeric_cols:
-                    scaler_map = {
-                        'StandardScaler': StandardScaler(),
-                        'MinMaxScaler': MinMaxScaler(),
-                        'RobustScaler': RobustScaler(),
-                        'MaxAbsScaler': MaxAbsScaler(),
-                        'Normalizer': Normalizer(),
-                    }
-                    scaler = scaler_map.get(scaler_type)
-                    if scaler:
-                        df[numeric_cols] = scaler.fit_transform(df[numeric_cols])
-                step_log.append(self._df_snapshot(df, 'preprocessing'))
-
-            elif step == 'featureSelection' and feature_selection_method != 'none':
-                numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-                if feature_selection_method in ('variance', 'both') and numeric_cols:
-                    try:
-                        sel = VarianceThreshold(threshold=variance_threshold)
-                        sel.fit(df[numeric_cols])
-                        low_var = [c for c, s in zip(numeric_cols, sel.get_support()) if not s]
-                        df = df.drop(columns=low_var)
-                    except Exception:
-                        pass
-                if feature_selection_method in ('correlation', 'both'):
-                    numeric_cols2 = df.select_dtypes(include=[np.number]).columns.tolist()
-                    if len(numeric_cols2) > 1:
-                        corr = df[numeric_cols2].corr().abs()
-                        upper = corr.where(np.triu(np.ones(corr.shape), k=1).astype(bool))
-                        high_corr = [c for c in upper.columns if any(upper[c] > correlation_threshold)]
-                        df = df.drop(columns=high_corr)
-                step_log.append(self._df_snapshot(df, 'featureSelection'))
+        self.X_train = df
+        self.numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
+        self.cat_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+        self.preview_level = 'none'
+        self.missing_fill = np.nan  # the grid shows what is still missing
+        step_log = [self._df_snapshot('raw')]
+
+        values = {
+            'duplicate_handling': duplicate_handling,
+            'duplicate_round_decimals': duplicate_round_decimals,
+            'duplicate_normalize_text': duplicate_normalize_text,
+            'outlier_method': outlier_method,
+            'outlier_action': outlier_action,
+            'imputer_strategy': imputer_strategy,
+            'encoder_strategy': encoder_strategy,
+            'scaler_type': scaler_type,
+            'feature_selection_method': feature_selection_method,
+            'variance_threshold': variance_threshold,
+            'correlation_threshold': correlation_threshold,
+        }
+        # Only the steps a preview configures; other node types are ignored
+        order = [name for name in active_steps or [] if name in STEPS and STEPS[name].fields[0][0] in values]
+        planned, notes = plan_steps(order, values, implicit=False)
+        self.pipeline_warnings.extend(notes)
+        for step in planned:
+            if not STEPS[step.node_type].enabled(values):
+                continue
+            rows_before = len(self.X_train)
+            self.run_step(step.node_type, values)
+            step_log.append(self._df_snapshot(step.node_type, rows_before))
+
+        if isinstance(self.X_train, pd.DataFrame):
+            df = self.X_train
+        else:
+            df = pd.DataFrame(self.X_train, columns=self.feature_names)
 
         # ── Build column statistics ──────────────────────────────────────────
         col_stats = []
@@ -229,27 +201,7 @@ class MLService:
             })
 
         # ── Build sample data rows ────────────────────────────────────────────
-        sample_df = df.head(max_rows)
-        data_rows = []
-        for _, row in sample_df.iterrows():
-            row_dict = {}
-            for col in df.columns:
-                val = row[col]
-                try:
-                    is_nan = pd.isna(val)
-                except Exception:
-                    is_nan = False
-                if is_nan:
-                    row_dict[str(col)] = None
-                elif isinstance(val, (np.integer,)):
-                    row_dict[str(col)] = int(val)
-                elif isinstance(val, (np.floating, float)):
-                    row_dict[str(col)] = round(float(val), 4)
-                elif isinstance(val, np.bool_):
-                    row_dict[str(col)] = bool(val)
-                else:
-                    row_dict[str(col)] = str(val)[:200]
-            data_rows.append(row_dict)
+        data_rows = format_rows(df, max_rows)
 
         return {
             'rows': len(df),
@@ -259,25 +211,108 @@ class MLService:
             'data': data_rows,
             'step_log': step_log,
             'total_rows_in_dataset': total_rows,
+            'warnings': self.pipeline_warnings,
+        }
+
+    def preview_from_metadata(self, dataset: dict, max_rows: int = 500):
+        """Build the preview_until response for a dataset with no active steps straight
+        from its stored schema and head rows. Returns None if those don't cover the request."""
+        schema = dataset.get("schema")
+        head_rows = dataset.get("preview_rows")
+        if not schema or head_rows is None:
+            return None
+
+        total_rows = dataset.get("shape", {}).get("rows", 0)
+        if len(head_rows) < min(max_rows, total_rows):
+            return None
+
+        return {
+            'rows': total_rows,
+            'cols': len(schema),
+            'columns': [c['name'] for c in schema],
+            'col_stats': schema,
+            'data': head_rows[:max_rows],
+            'step_log': [{'step': 'raw', 'rows': total_rows, 'cols': len(schema), 'delta_rows': 0}],
+            'total_rows_in_dataset': total_rows,
         }
 
     def load_data(self, file_content: bytes, filename: str):
         """Load data from bytes and return preview info."""
         file_obj = io.BytesIO(file_content)
 
-        if filename.endswith('.csv'):
+        if filename.lower().endswith('.csv'):
             df = pd.read_csv(file_obj)
-        elif filename.endswith(('.xls', '.xlsx')):
+        elif filename.lower().endswith(('.xls', '.xlsx')):
             df = pd.read_excel(file_obj)
         else:
             raise ValueError("Unsupported file format")
         
-        return {
+        data = {
             "id": filename,
             "preview": df.head(10).astype(object).where(pd.notnull(df), None).to_dict(orient='records'),
             "columns": list(df.columns),
             "shape": df.shape
         }
+        return data
+
+    def scan_file(self, path: str, filename: str, chunk_rows: int = SCAN_CHUNK_ROWS):
+        """Read an uploaded file from disk in row chunks and return preview info plus
+        the stored metadata (profile, typed schema, head rows) under ``"metadata"``.
+
+        Memory stays bounded by the chunk size: the head is kept for the preview, row
+        and null counts are summed and per-column distinct sketches updated per chunk,
+        and the rest of the profile is built from a uniform sample of at most
+        ``PROFILE_SAMPLE_ROWS`` rows (smallest random keys win).
+        Excel files cannot be read incrementally and are loaded whole."""
+        if filename.lower().endswith('.csv'):
+            chunks = pd.read_csv(path, chunksize=chunk_rows)
+        elif filename.lower().endswith(('.xls', '.xlsx')):
+            chunks = [pd.read_excel(path)]
+        else:
+            raise ValueError("Unsupported file format")
+
+        rng = np.random.RandomState(42)
+        head = sample = sample_keys = null_counts = None
+        sketches = {}
+        total_rows = 0
+        for chunk in chunks:
+            if head is None:
+                head = chunk.head(PREVIEW_ROWS_STORED)
+            total_rows += len(chunk)
+            chunk_nulls = chunk.isna().sum()
+            null_counts = chunk_nulls if null_counts is None else null_counts.add(chunk_nulls, fill_value=0)
+            for col in chunk.columns:
+                sketches.setdefault(col, DistinctSketch()).update(chunk[col])
+
+            keys = rng.random_sample(len(chunk))
+            if sample is None:
+                sample, sample_keys = chunk, keys
+            else:
+                sample = pd.concat([sample, chunk], ignore_index=True)
+                sample_keys = np.concatenate([sample_keys, keys])
+            if len(sample) > PROFILE_SAMPLE_ROWS:
+                keep = np.sort(np.argpartition(sample_keys, PROFILE_SAMPLE_ROWS)[:PROFILE_SAMPLE_ROWS])
+                sample = sample.iloc[keep].reset_index(drop=True)
+                sample_keys = sample_keys[keep]
+
+        if head is None:
+            # Header-only CSV: no chunks are produced
+            head = sample = pd.read_csv(path, nrows=0)
+            null_counts = sample.isna().sum()
+        # Below the sample size every row is profiled and distinct counts are exact
+        distinct_counts = {col: sketch.estimate() for col, sketch in sketches.items()} \
+            if total_rows > len(sample) else None
+
+        return {
+            "id": filename,
+            "preview": head.head(10).astype(object).where(pd.notnull(head.head(10)), None).to_dict(orient='records'),
+            "columns": list(head.columns),
+            "shape": (total_rows, head.shape[1]),
+            "metadata": dataset_metadata(
+                sample, head=head, total_rows=total_rows, null_counts=null_counts,
+                distinct_counts=distinct_counts,
+            ),
+        }
 
     def load_and_split(self, file_content: bytes, filename: str, target_column: str,
                        test_size: float = 0.2, stratified: bool = False,
@@ -285,9 +320,9 @@ class MLService:
         """Load data and split into train/test sets."""
         file_obj = io.BytesIO(file_content)
         
-        if filename.endswith('.csv'):
+        if filename.lower().endswith('.csv'):
             df = pd.read_csv(file_obj)
-        elif filename.endswith(('.xls', '.xlsx')):
+        elif filename.lower().endswith(('.xls', '.xlsx')):
             df = pd.read_excel(file_obj)
         else:
             raise ValueError("Unsupported file format")
@@ -302,7 +337,7 @@ class MLService:
 
         # Auto-encode categorical target for classification
         if y.dtype == 'object' or y.dtype.name == 'category':
-            self.target_encoder = LabelEncoder()
+            self.target_encoder = sk.LabelEncoder()
             y = pd.Series(self.target_encoder.fit_transform(y), index=y.index, name=y.name)
             self.pipeline_warnings.append(
                 f"Target column '{target_column}' is categorical — auto-encoded with LabelEncoder. "
@@ -321,7 +356,7 @@ class MLService:
                     "Stratified split requested but some classes have fewer than 2 samples. Using regular split."
                 )
         
-        self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(
+        self.X_train, self.X_test, self.y_train, self.y_test = sk.train_test_split(
             X, y, test_size=test_size, random_state=random_state,
             shuffle=shuffle, stratify=stratify_param
         )
@@ -330,50 +365,73 @@ class MLService:
         self.cat_cols = self.X_train.select_dtypes(include=['object', 'category']).columns.tolist()
 
     # ==================== NEW: Duplicate Removal ====================
-    def remove_duplicates(self, strategy: str = 'all'):
-        """Remove duplicate rows from training and test data."""
+    def remove_duplicates(self, strategy: str = 'all', round_decimals: int = None,
+                          normalize_text: bool = False, report_leakage: bool = True):
+        """Remove duplicate rows from training and test data using row fingerprints.
+
+        ``round_decimals`` / ``normalize_text`` turn on near-duplicate matching. Also
+        reports the largest duplicate clusters and, with ``report_leakage``, test rows
+        whose features also appear in the training data."""
         if self.X_train is None:
             return {"removed_train": 0, "removed_test": 0}
 
         train_before = len(self.X_train)
-        test_before = len(self.X_test)
+        test_before = len(self.X_test) if self.X_test is not None else 0
 
         if strategy == 'none':
             return {"removed_train": 0, "removed_test": 0}
 
-        # Combine X and y for duplicate detection
-        train_combined = self.X_train.copy()
-        train_combined['__target__'] = self.y_train.values
-
-        if strategy == 'all':
-            train_combined = train_combined.drop_duplicates(keep=False)
-        elif strategy == 'first':
-            train_combined = train_combined.drop_duplicates(keep='first')
-        elif strategy == 'last':
-            train_combined = train_combined.drop_duplicates(keep='last')
-
-        self.y_train = train_combined['__target__']
-        self.X_train = train_combined.drop(columns=['__target__'])
-
-        # Also clean test set
-        test_combined = self.X_test.copy()
-        test_combined['__target__'] = self.y_test.values
-        if strategy == 'all':
-            test_combined = test_combined.drop_duplicates(keep=False)
-        else:
-            test_combined = test_combined.drop_duplicates(keep='first')
-        self.y_test = test_combined['__target__']
-        self.X_test = test_combined.drop(columns=['__target__'])
+        # One pass over the train split: the target is folded into the feature fingerprint
+        train_index = RowFingerprintIndex(
+            self.X_train, target=self.y_train,
+            round_decimals=round_decimals, normalize_text=normalize_text
+        )
+        clusters = train_index.clusters()
+        collisions = train_index.collisions
+        train_keep = {'all': False, 'first': 'first', 'last': 'last'}.get(strategy)
+        train_mask = None
+        if strategy in ('all', 'first', 'last'):
+            train_mask = ~train_index.duplicated(keep=train_keep)
+            self.X_train = self.X_train[train_mask]
+            if self.y_train is not None:
+                self.y_train = self.y_train[train_mask]
 
         removed_train = train_before - len(self.X_train)
-        removed_test = test_before - len(self.X_test)
+        removed_test = leaked_test_rows = 0
+        if self.X_test is not None:
+            # Also clean test set
+            test_index = RowFingerprintIndex(
+                self.X_test, target=self.y_test,
+                round_decimals=round_decimals, normalize_text=normalize_text
+            )
+            collisions += test_index.collisions
+            test_keep = False if strategy == 'all' else 'first'
+            test_mask = ~test_index.duplicated(keep=test_keep)
+            self.X_test = self.X_test[test_mask]
+            self.y_test = self.y_test[test_mask]
+            removed_test = test_before - len(self.X_test)
+
+            if report_leakage:
+                # Leakage: kept test rows whose features also appear in the kept training rows
+                leaked = test_index.overlap(train_index, features_only=True, other_rows=train_mask)
+                leaked_test_rows = int(leaked[test_mask].sum())
 
         if removed_train > 0 or removed_test > 0:
             self.pipeline_warnings.append(
                 f"Removed {removed_train} duplicate rows from training data and {removed_test} from test data."
             )
+        if leaked_test_rows > 0:
+            self.pipeline_warnings.append(
+                f"Possible leakage: {leaked_test_rows} test rows also appear in the training data."
+            )
 
-        return {"removed_train": removed_train, "removed_test": removed_test}
+        return {
+            "removed_train": removed_train,
+            "removed_test": removed_test,
+            "leaked_test_rows": leaked_test_rows,
+            "duplicate_clusters": clusters,
+            "hash_collisions": collisions,
+        }
 
     # ==================== NEW: Outlier Handling ====================
     def handle_outliers(self, method: str = 'iqr', action: str = 'clip'):
@@ -385,41 +443,46 @@ class MLService:
             return {"outliers_handled": 0}
 
         total_outliers = 0
+        keep_mask = None  # rows kept by 'remove', applied once after the scan
 
         for col in self.numeric_cols:
             if col not in self.X_train.columns:
                 continue
 
+            # Bounds are computed on the rows still kept by earlier columns
+            values = self.X_train[col] if keep_mask is None else self.X_train[col][keep_mask]
+
             if method == 'iqr':
-                Q1 = self.X_train[col].quantile(0.25)
-                Q3 = self.X_train[col].quantile(0.75)
+                Q1 = values.quantile(0.25)
+                Q3 = values.quantile(0.75)
                 IQR = Q3 - Q1
                 lower = Q1 - 1.5 * IQR
                 upper = Q3 + 1.5 * IQR
             elif method == 'zscore':
-                mean = self.X_train[col].mean()
-                std = self.X_train[col].std()
+                mean = values.mean()
+                std = values.std()
                 lower = mean - 3 * std
                 upper = mean + 3 * std
             else:
                 continue
 
             # Count outliers
-            train_outliers = ((self.X_train[col] < lower) | (self.X_train[col] > upper)).sum()
+            train_outliers = ((values < lower) | (values > upper)).sum()
             total_outliers += train_outliers
 
             if action == 'clip':
                 self.X_train[col] = self.X_train[col].clip(lower, upper)
-                self.X_test[col] = self.X_test[col].clip(lower, upper)
+                if self.X_test is not None:
+                    self.X_test[col] = self.X_test[col].clip(lower, upper)
             elif action == 'remove':
                 mask = (self.X_train[col] >= lower) & (self.X_train[col] <= upper)
-                self.X_train = self.X_train[mask]
-                self.y_train = self.y_train[mask]
+                keep_mask = mask if keep_mask is None else keep_mask & mask
 
         # Bug 7 fix: reset index after row-removal to avoid pandas alignment bugs
-        if action == 'remove':
-            self.X_train = self.X_train.reset_index(drop=True)
-            self.y_train = self.y_train.reset_index(drop=True)
+        if action == 'remove' and keep_mask is not None:
+            self.X_train = self.X_train[keep_mask].reset_index(drop=True)
+            if self.y_train is not None:
+                self.y_train = self.y_train[keep_mask].reset_index(drop=True)
 
         if total_outliers > 0:
             self.pipeline_warnings.append(
@@ -432,7 +495,8 @@ class MLService:
     # ==================== NEW: Feature Selection ====================
     def apply_feature_selection(self, method: str = 'variance', variance_threshold: float = 0.01,
                                  correlation_threshold: float = 0.95):
-        """Select features based on variance or correlation."""
+        """Select features based on variance or correlation. Before encoding only the
+        numeric columns are candidates; afterwards every feature of the block is."""
         if self.X_train is None:
             return {"features_removed": []}
 
@@ -440,155 +504,217 @@ class MLService:
             return {"features_removed": []}
 
         removed_features = []
-        original_count = len(self.X_train.columns)
+        original_count = self.X_train.shape[1]
 
         # Variance Threshold — remove near-zero variance features
-        if method in ['variance', 'both']:
-            # Only apply to numeric columns
-            numeric_train = self.X_train.select_dtypes(include=[np.number])
-            if len(numeric_train.columns) > 0:
-                selector = VarianceThreshold(threshold=variance_threshold)
-                try:
-                    selector.fit(numeric_train)
-                    low_variance_cols = numeric_train.columns[~selector.get_support()].tolist()
-                    if low_variance_cols:
-                        self.X_train = self.X_train.drop(columns=low_variance_cols)
-                        self.X_test = self.X_test.drop(columns=low_variance_cols)
-                        removed_features.extend(low_variance_cols)
-                        self.pipeline_warnings.append(
-                            f"Removed {len(low_variance_cols)} low-variance features: {low_variance_cols}"
-                        )
-                except Exception:
-                    pass
-
-        # Correlation Filter — remove highly correlated features
-        if method in ['correlation', 'both']:
-            numeric_train = self.X_train.select_dtypes(include=[np.number])
-            if len(numeric_train.columns) > 1:
-                corr_matrix = numeric_train.corr().abs()
-                upper = corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(bool))
-                high_corr_cols = [col for col in upper.columns if any(upper[col] > correlation_threshold)]
-                if high_corr_cols:
-                    self.X_train = self.X_train.drop(columns=high_corr_cols)
-                    self.X_test = self.X_test.drop(columns=high_corr_cols)
-                    removed_features.extend(high_corr_cols)
+        names, X = self._selectable_features()
+        if method in ['variance', 'both'] and X.shape[1] > 0:
+            selector = sk.VarianceThreshold(threshold=variance_threshold)
+            try:
+                selector.fit(X)
+                keep = selector.get_support()
+                low_variance_cols = [name for name, k in zip(names, keep) if not k]
+                if low_variance_cols:
+                    self._drop_features(low_variance_cols)
+                    removed_features.extend(low_variance_cols)
                     self.pipeline_warnings.append(
-                        f"Removed {len(high_corr_cols)} highly correlated features (>{correlation_threshold}): {high_corr_cols}"
+                        f"Removed {len(low_variance_cols)} low-variance features: {low_variance_cols}"
                     )
+            except Exception:
+                pass
 
-        # Update column lists
-        self.numeric_cols = self.X_train.select_dtypes(include=['float64', 'int64']).columns.tolist()
-        self.cat_cols = self.X_train.select_dtypes(include=['object', 'category']).columns.tolist()
+        # Correlation Filter — remove highly correlated features
+        names, X = self._selectable_features()
+        if method in ['correlation', 'both'] and X.shape[1] > 1:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                corr_matrix = np.abs(np.corrcoef(X, rowvar=False))
+            # Drop column j if it correlates with any earlier column i < j
+            high_corr = (np.triu(corr_matrix, k=1) > correlation_threshold).any(axis=0)
+            high_corr_cols = [name for name, h in zip(names, high_corr) if h]
+            if high_corr_cols:
+                self._drop_features(high_corr_cols)
+                removed_features.extend(high_corr_cols)
+                self.pipeline_warnings.append(
+                    f"Removed {len(high_corr_cols)} highly correlated features (>{correlation_threshold}): {high_corr_cols}"
+                )
 
         return {
             "features_removed": removed_features,
             "features_before": original_count,
-            "features_after": len(self.X_train.columns)
+            "features_after": self.X_train.shape[1]
         }
 
-    def apply_preprocessing(self, imputer_strategy: str = 'mean', encoder_strategy: str = 'onehot', scaler_type: str = 'None'):
-        """Apply imputation, encoding, and scaling."""
-        # --- 1. Imputation ---
-        if imputer_strategy == 'drop':
+    def _selectable_features(self):
+        """Names and training values of the features feature selection may drop."""
+        if isinstance(self.X_train, pd.DataFrame):
+            names = [c for c in self.X_train.columns if c in self.numeric_cols]
+            return names, self.X_train[names].to_numpy(dtype='float64', na_value=np.nan)
+        return self.feature_names, self.X_train
+
+    def _drop_features(self, names: list):
+        if isinstance(self.X_train, pd.DataFrame):
+            self.X_train = self.X_train.drop(columns=names)
+            if self.X_test is not None:
+                self.X_test = self.X_test.drop(columns=names)
+        else:
+            dropped = set(names)
+            self._select_features(np.array([name not in dropped for name in self.feature_names]))
+
+    def apply_imputation(self, strategy: str = 'mean'):
+        """Fill in (or, with 'drop', remove rows with) missing values in the raw columns."""
+        if strategy == 'drop':
             train_mask = self.X_train.notna().all(axis=1)
             self.X_train = self.X_train[train_mask]
-            self.y_train = self.y_train[train_mask]
-            
-            test_mask = self.X_test.notna().all(axis=1)
-            self.X_test = self.X_test[test_mask]
-            self.y_test = self.y_test[test_mask]
-        else:
-            if self.numeric_cols:
-                num_cols_present = [c for c in self.numeric_cols if c in self.X_train.columns]
-                if num_cols_present:
-                    imp_num = SimpleImputer(
-                        strategy=imputer_strategy if imputer_strategy != 'constant' else 'constant',
-                        fill_value=0 if imputer_strategy == 'constant' else None
-                    )
-                    self.X_train[num_cols_present] = imp_num.fit_transform(self.X_train[num_cols_present])
+            if self.y_train is not None:
+                self.y_train = self.y_train[train_mask]
+
+            if self.X_test is not None:
+                test_mask = self.X_test.notna().all(axis=1)
+                self.X_test = self.X_test[test_mask]
+                self.y_test = self.y_test[test_mask]
+            return
+
+        if self.numeric_cols:
+            num_cols_present = [c for c in self.numeric_cols if c in self.X_train.columns]
+            if num_cols_present:
+                imp_num = sk.SimpleImputer(
+                    strategy=strategy if strategy != 'constant' else 'constant',
+                    fill_value=0 if strategy == 'constant' else None
+                )
+                self.X_train[num_cols_present] = imp_num.fit_transform(self.X_train[num_cols_present])
+                if self.X_test is not None:
                     self.X_test[num_cols_present] = imp_num.transform(self.X_test[num_cols_present])
-            
-            if self.cat_cols:
-                cat_cols_present = [c for c in self.cat_cols if c in self.X_train.columns]
-                if cat_cols_present:
-                    # Bug 6 fix: respect 'constant' strategy for categorical cols too
-                    cat_strategy = 'most_frequent'
-                    cat_fill = None
-                    if imputer_strategy == 'constant':
-                        cat_strategy = 'constant'
-                        cat_fill = 'missing'
-                    imp_cat = SimpleImputer(strategy=cat_strategy, fill_value=cat_fill)
-                    self.X_train[cat_cols_present] = imp_cat.fit_transform(self.X_train[cat_cols_present])
+
+        if self.cat_cols:
+            cat_cols_present = [c for c in self.cat_cols if c in self.X_train.columns]
+            if cat_cols_present:
+                # Bug 6 fix: respect 'constant' strategy for categorical cols too
+                cat_strategy = 'most_frequent'
+                cat_fill = None
+                if strategy == 'constant':
+                    cat_strategy = 'constant'
+                    cat_fill = 'missing'
+                imp_cat = sk.SimpleImputer(strategy=cat_strategy, fill_value=cat_fill)
+                self.X_train[cat_cols_present] = imp_cat.fit_transform(self.X_train[cat_cols_present])
+                if self.X_test is not None:
                     self.X_test[cat_cols_present] = imp_cat.transform(self.X_test[cat_cols_present])
 
-        # --- 2. Encoding ---
+    def apply_encoding(self, strategy: str = 'onehot'):
+        """Encode the categorical columns and move the features into the NumPy block."""
+        if not isinstance(self.X_train, pd.DataFrame):
+            self.pipeline_warnings.append("Encoding skipped: the features are already numeric.")
+            return
+
+        # One-hot output is kept as a separate array and written straight into
+        # the feature block below instead of being concatenated onto the frame.
+        encoded_train = encoded_test = None
+        encoded_names = []
         cat_cols_present = [c for c in self.cat_cols if c in self.X_train.columns]
+        if strategy == 'target' and self.y_train is None:
+            strategy = 'label'  # previews have no target to encode against
         if cat_cols_present:
-            if encoder_strategy == 'onehot':
-                ohe = OneHotEncoder(handle_unknown='ignore', sparse_output=False, drop='first')
-                
-                X_train_enc = ohe.fit_transform(self.X_train[cat_cols_present])
-                X_test_enc = ohe.transform(self.X_test[cat_cols_present])
-                
-                feat_names = ohe.get_feature_names_out(cat_cols_present)
-                
-                X_train_cat = pd.DataFrame(X_train_enc, columns=feat_names, index=self.X_train.index)
-                X_test_cat = pd.DataFrame(X_test_enc, columns=feat_names, index=self.X_test.index)
-                
-                self.X_train = pd.concat([self.X_train.drop(columns=cat_cols_present), X_train_cat], axis=1)
-                self.X_test = pd.concat([self.X_test.drop(columns=cat_cols_present), X_test_cat], axis=1)
-            elif encoder_strategy == 'label':
-                oe = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1)
+            if strategy == 'onehot':
+                ohe = sk.OneHotEncoder(handle_unknown='ignore', sparse_output=False, drop='first',
+                                    dtype=self.feature_dtype)
+
+                encoded_train = ohe.fit_transform(self.X_train[cat_cols_present])
+                encoded_names = list(ohe.get_feature_names_out(cat_cols_present))
+                self.X_train = self.X_train.drop(columns=cat_cols_present)
+                if self.X_test is not None:
+                    encoded_test = ohe.transform(self.X_test[cat_cols_present])
+                    self.X_test = self.X_test.drop(columns=cat_cols_present)
+            elif strategy in ('label', 'ordinal'):
+                oe = sk.OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1)
                 self.X_train[cat_cols_present] = oe.fit_transform(self.X_train[cat_cols_present])
-                self.X_test[cat_cols_present] = oe.transform(self.X_test[cat_cols_present])
                 self.X_train[cat_cols_present] = self.X_train[cat_cols_present].astype(float)
-                self.X_test[cat_cols_present] = self.X_test[cat_cols_present].astype(float)
-            elif encoder_strategy == 'target':
+                if self.X_test is not None:
+                    self.X_test[cat_cols_present] = oe.transform(self.X_test[cat_cols_present])
+                    self.X_test[cat_cols_present] = self.X_test[cat_cols_present].astype(float)
+                self.ordinal_cols = list(cat_cols_present)
+            elif strategy == 'target':
                 # Target Encoding — replace category with mean of target
+                y_train = pd.Series(np.asarray(self.y_train), index=self.X_train.index)
+                global_mean = y_train.mean()
                 for col in cat_cols_present:
-                    target_means = self.X_train.copy()
-                    target_means['__target__'] = self.y_train.values
-                    means = target_means.groupby(col)['__target__'].mean()
-                    global_mean = self.y_train.mean()
+                    means = y_train.groupby(self.X_train[col]).mean()
                     self.X_train[col] = self.X_train[col].map(means).fillna(global_mean).astype(float)
-                    self.X_test[col] = self.X_test[col].map(means).fillna(global_mean).astype(float)
-            elif encoder_strategy == 'frequency':
+                    if self.X_test is not None:
+                        self.X_test[col] = self.X_test[col].map(means).fillna(global_mean).astype(float)
+            elif strategy == 'frequency':
                 # Frequency Encoding — replace category with its frequency
                 for col in cat_cols_present:
                     freq_map = self.X_train[col].value_counts(normalize=True)
                     self.X_train[col] = self.X_train[col].map(freq_map).fillna(0).astype(float)
-                    self.X_test[col] = self.X_test[col].map(freq_map).fillna(0).astype(float)
-
-        self.X_train = self.X_train.fillna(0)
-        self.X_test = self.X_test.fillna(0)
-        self.feature_names = list(self.X_train.columns)
-
-        # --- 3. Scaling ---
-        if scaler_type != 'None':
-            if scaler_type == 'StandardScaler':
-                scaler = StandardScaler()
-            elif scaler_type == 'MinMaxScaler':
-                scaler = MinMaxScaler()
-            elif scaler_type == 'RobustScaler':
-                scaler = RobustScaler()
-            elif scaler_type == 'MaxAbsScaler':
-                scaler = MaxAbsScaler()
-            elif scaler_type == 'Normalizer':
-                scaler = Normalizer()
-            else:
-                scaler = None
+                    if self.X_test is not None:
+                        self.X_test[col] = self.X_test[col].map(freq_map).fillna(0).astype(float)
+
+        self._featurize(encoded_train, encoded_test, encoded_names)
+
+    def _featurize(self, encoded_train: np.ndarray = None, encoded_test: np.ndarray = None,
+                   encoded_names: list = ()):
+        """From here on the features live in one contiguous NumPy block per split."""
+        self.feature_names = list(self.X_train.columns) + list(encoded_names)
+        self.X_train = self._to_feature_block(self.X_train, encoded_train)
+        if self.X_test is not None:
+            self.X_test = self._to_feature_block(self.X_test, encoded_test)
+        if self.y_train is not None:
+            self.y_train = np.asarray(self.y_train)
+            self.y_test = np.asarray(self.y_test)
+        self.numeric_cols = list(self.feature_names)
+        self.cat_cols = []
 
-            if scaler is not None:
-                self.X_train = pd.DataFrame(
-                    scaler.fit_transform(self.X_train),
-                    columns=self.feature_names,
-                    index=self.X_train.index
-                )
-                self.X_test = pd.DataFrame(
-                    scaler.transform(self.X_test),
-                    columns=self.feature_names,
-                    index=self.X_test.index
-                )
+    def _ensure_block(self):
+        """Move the features into the NumPy block if no encoding step has yet."""
+        if isinstance(self.X_train, pd.DataFrame):
+            self._featurize()
+
+    def apply_scaling(self, scaler_type: str = 'None'):
+        """Scale the features; before encoding, only the numeric columns."""
+        scalers = {
+            'StandardScaler': sk.StandardScaler,
+            'MinMaxScaler': sk.MinMaxScaler,
+            'RobustScaler': sk.RobustScaler,
+            'MaxAbsScaler': sk.MaxAbsScaler,
+            'Normalizer': sk.Normalizer,
+        }
+        if scaler_type not in scalers:
+            return
+
+        if isinstance(self.X_train, pd.DataFrame):
+            cols = [c for c in self.numeric_cols if c in self.X_train.columns]
+            if cols:
+                scaler = scalers[scaler_type]()
+                self.X_train[cols] = scaler.fit_transform(self.X_train[cols])
+                if self.X_test is not None:
+                    self.X_test[cols] = scaler.transform(self.X_test[cols])
+            return
+
+        # copy=False: scalers transform the float block in place
+        scaler = scalers[scaler_type](copy=False)
+        self.X_train = scaler.fit_transform(self.X_train)
+        if self.X_test is not None:
+            self.X_test = scaler.transform(self.X_test)
+
+    def _to_feature_block(self, frame: 'pd.DataFrame', encoded: np.ndarray = None) -> np.ndarray:
+        """Write the frame's columns (and any encoded columns) into a single
+        C-contiguous array of ``self.feature_dtype``, one column at a time,
+        filling missing values with ``self.missing_fill``."""
+        n_base = frame.shape[1]
+        n_encoded = encoded.shape[1] if encoded is not None else 0
+        block = np.empty((len(frame), n_base + n_encoded), dtype=self.feature_dtype)
+        for j, col in enumerate(frame.columns):
+            block[:, j] = frame[col].to_numpy(dtype=self.feature_dtype, na_value=self.missing_fill)
+        if n_encoded:
+            block[:, n_base:] = encoded
+        return block
+
+    def _select_features(self, keep: np.ndarray):
+        """Keep only the feature-block columns flagged in the boolean ``keep`` mask."""
+        self.X_train = self.X_train[:, keep]
+        if self.X_test is not None:
+            self.X_test = self.X_test[:, keep]
+        self.feature_names = [name for name, k in zip(self.feature_names, keep) if k]
+        self.numeric_cols = list(self.feature_names)
 
     # ==================== NEW: PCA ====================
     def apply_pca(self, n_components: int = 0):
@@ -596,16 +722,18 @@ class MLService:
         if n_components <= 0 or self.X_train is None:
             return {"applied": False}
 
+        self._ensure_block()
+
         max_components = min(self.X_train.shape[0], self.X_train.shape[1])
         n_components = min(n_components, max_components)
 
-        pca = PCA(n_components=n_components)
+        pca = sk.PCA(n_components=n_components)
         X_train_pca = pca.fit_transform(self.X_train)
         X_test_pca = pca.transform(self.X_test)
 
         pca_cols = [f"PC{i+1}" for i in range(n_components)]
-        self.X_train = pd.DataFrame(X_train_pca, columns=pca_cols, index=self.X_train.index)
-        self.X_test = pd.DataFrame(X_test_pca, columns=pca_cols, index=self.X_test.index)
+        self.X_train = np.ascontiguousarray(X_train_pca)
+        self.X_test = np.ascontiguousarray(X_test_pca)
         self.feature_names = pca_cols
 
         explained = sum(pca.explained_variance_ratio_) * 100
@@ -626,101 +754,91 @@ class MLService:
         if method == 'none' or self.X_train is None:
             return {"applied": False}
 
+        self._ensure_block()
+
         if method == 'polynomial':
-            poly = PolynomialFeatures(degree=polynomial_degree, include_bias=False, interaction_only=False)
+            poly = sk.PolynomialFeatures(degree=polynomial_degree, include_bias=False, interaction_only=False)
             X_train_poly = poly.fit_transform(self.X_train)
             X_test_poly = poly.transform(self.X_test)
             poly_cols = [f"poly_{i}" for i in range(X_train_poly.shape[1])]
-            self.X_train = pd.DataFrame(X_train_poly, columns=poly_cols, index=self.X_train.index)
-            self.X_test = pd.DataFrame(X_test_poly, columns=poly_cols, index=self.X_test.index)
+            self.X_train = X_train_poly
+            self.X_test = X_test_poly
             self.feature_names = poly_cols
             self.pipeline_warnings.append(
                 f"Polynomial features (degree={polynomial_degree}) expanded features from {len(self.numeric_cols)} to {len(poly_cols)}."
             )
         elif method == 'log':
-            for col in self.X_train.columns:
-                if self.X_train[col].min() > 0:
-                    self.X_train[col] = np.log1p(self.X_train[col])
-                    self.X_test[col] = np.log1p(self.X_test[col])
-            self.feature_names = list(self.X_train.columns)
+            # Column-wise ufuncs with out= rewrite the block in place
+            for j in np.flatnonzero(self.X_train.min(axis=0) > 0):
+                np.log1p(self.X_train[:, j], out=self.X_train[:, j])
+                np.log1p(self.X_test[:, j], out=self.X_test[:, j])
             self.pipeline_warnings.append("Applied log(1+x) transformation to positive-valued features.")
         elif method == 'sqrt':
-            for col in self.X_train.columns:
-                if self.X_train[col].min() >= 0:
-                    self.X_train[col] = np.sqrt(self.X_train[col])
-                    self.X_test[col] = np.sqrt(self.X_test[col])
-            self.feature_names = list(self.X_train.columns)
+            for j in np.flatnonzero(self.X_train.min(axis=0) >= 0):
+                np.sqrt(self.X_train[:, j], out=self.X_train[:, j])
+                np.sqrt(self.X_test[:, j], out=self.X_test[:, j])
             self.pipeline_warnings.append("Applied sqrt transformation to non-negative features.")
 
         return {"applied": True, "method": method, "features_count": len(self.feature_names)}
 
     # ==================== NEW: Class Balancing ====================
-    def handle_class_imbalance(self, method: str = 'none'):
-        """Handle class imbalance in training data."""
+    def handle_class_imbalance(self, method: str = 'none', balance_ratio: float = 1.0):
+        """Handle class imbalance in training data.
+
+        Rows are grouped by class once (a stable argsort of the class codes) and every
+        strategy works on that grouped index. ``balance_ratio`` is the target
+        minority/majority ratio: below 1.0 oversampling and SMOTE only partially
+        close the gap and undersampling keeps more of the majority classes."""
         if method == 'none' or self.X_train is None or self.is_regression:
             return {"applied": False}
 
-        class_counts = pd.Series(self.y_train).value_counts()
+        self._ensure_block()
+
+        classes, y_codes, class_counts = np.unique(self.y_train, return_inverse=True, return_counts=True)
         majority_count = class_counts.max()
         minority_count = class_counts.min()
+        ratio = min(max(float(balance_ratio or 1.0), 0.01), 1.0)
 
-        if minority_count / majority_count > 0.8:
-            self.pipeline_warnings.append("Classes are already balanced (minority/majority ratio > 0.8). No balancing applied.")
+        if minority_count / majority_count > min(0.8, ratio):
+            self.pipeline_warnings.append(
+                f"Classes are already balanced (minority/majority ratio > {min(0.8, ratio):g}). No balancing applied."
+            )
             return {"applied": False, "reason": "already_balanced"}
 
         original_size = len(self.X_train)
-
-        if method == 'oversample':
-            # Random oversampling of minority classes
-            from sklearn.utils import resample
-            combined = pd.DataFrame(self.X_train)
-            combined['__target__'] = self.y_train.values
-            
-            dfs = []
-            for cls in class_counts.index:
-                cls_data = combined[combined['__target__'] == cls]
-                if len(cls_data) < majority_count:
-                    cls_upsampled = resample(cls_data, replace=True, n_samples=majority_count, random_state=42)
-                    dfs.append(cls_upsampled)
-                else:
-                    dfs.append(cls_data)
-            
-            balanced = pd.concat(dfs).reset_index(drop=True)
-            self.y_train = balanced['__target__'].reset_index(drop=True)
-            self.X_train = balanced.drop(columns=['__target__']).reset_index(drop=True)
-
-        elif method == 'undersample':
-            # Random undersampling of majority class
-            from sklearn.utils import resample
-            combined = pd.DataFrame(self.X_train)
-            combined['__target__'] = self.y_train.values
-            
-            dfs = []
-            for cls in class_counts.index:
-                cls_data = combined[combined['__target__'] == cls]
-                if len(cls_data) > minority_count:
-                    cls_downsampled = resample(cls_data, replace=False, n_samples=minority_count, random_state=42)
-                    dfs.append(cls_downsampled)
-                else:
-                    dfs.append(cls_data)
-            
-            balanced = pd.concat(dfs).reset_index(drop=True)
-            self.y_train = balanced['__target__'].reset_index(drop=True)
-            self.X_train = balanced.drop(columns=['__target__']).reset_index(drop=True)
-
-        elif method == 'smote':
-            try:
-                from imblearn.over_sampling import SMOTE
-                smote = SMOTE(random_state=42)
-                X_resampled, y_resampled = smote.fit_resample(self.X_train, self.y_train)
-                self.X_train = pd.DataFrame(X_resampled, columns=self.X_train.columns)
-                self.y_train = pd.Series(y_resampled)
-            except ImportError:
-                self.pipeline_warnings.append(
-                    "SMOTE requires 'imbalanced-learn' package. Install with: pip install imbalanced-learn. "
-                    "Falling back to random oversampling."
-                )
-                return self.handle_class_imbalance('oversample')
+        rng = np.random.RandomState(42)
+        # Rows grouped by class: class c occupies grouped[starts[c]:starts[c] + class_counts[c]]
+        grouped = np.argsort(y_codes, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(class_counts)[:-1]))
+        raised = np.maximum(class_counts, int(np.ceil(ratio * majority_count)))
+
+        if method in ('oversample', 'undersample'):
+            if method == 'oversample':
+                targets = raised
+            else:
+                targets = np.minimum(class_counts, max(minority_count, int(minority_count / ratio)))
+            idx = self._resample_indices(y_codes, grouped, starts, class_counts, targets, rng)
+            self.X_train = self.X_train[idx]
+            self.y_train = self.y_train[idx]
+
+        elif method in ('smote', 'borderline_smote'):
+            self._smote(y_codes, classes, grouped, starts, class_counts, raised, rng,
+                        borderline=method == 'borderline_smote')
+
+        elif method == 'sample_weight':
+            # Lazy rebalancing: weight rows so each class counts as if resampled to
+            # its target size; the training data itself is left untouched.
+            class_weights = raised / class_counts
+            class_weights = class_weights * (len(y_codes) / float(np.dot(class_weights, class_counts)))
+            self.sample_weight = class_weights[y_codes]
+            self.pipeline_warnings.append(
+                "Class balancing via sample weights will be applied during model training."
+            )
+            return {
+                "applied": True,
+                "method": "sample_weight",
+                "class_weights": {str(cls): round(float(w), 4) for cls, w in zip(classes, class_weights)},
+            }
 
         # 'class_weight' is handled directly in model training, not here
         elif method == 'class_weight':
@@ -736,57 +854,92 @@ class MLService:
 
         return {"applied": True, "method": method, "original_size": original_size, "new_size": new_size}
 
+    @staticmethod
+    def _resample_indices(y_codes, grouped, starts, class_counts, targets, rng):
+        """Row indices that bring every class c from class_counts[c] to targets[c] rows.
+
+        Classes above target keep a random subset (random keys sorted inside each
+        group); classes below target keep all rows plus draws with replacement."""
+        keep_counts = np.minimum(targets, class_counts)
+        if (keep_counts < class_counts).any():
+            grouped = np.lexsort((rng.random_sample(len(y_codes)), y_codes))
+        rank = np.arange(len(grouped)) - starts[y_codes[grouped]]
+        kept = grouped[rank < keep_counts[y_codes[grouped]]]
+
+        extra = np.maximum(targets - class_counts, 0)
+        if not extra.any():
+            return kept
+        extra_cls = np.repeat(np.arange(len(class_counts)), extra)
+        offsets = (rng.random_sample(len(extra_cls)) * class_counts[extra_cls]).astype(np.int64)
+        return np.concatenate([kept, grouped[starts[extra_cls] + offsets]])
+
+    def _smote(self, y_codes, classes, grouped, starts, class_counts, targets, rng,
+               borderline: bool = False, k_neighbors: int = 5):
+        """Append SMOTE samples for each class below its target, in the block's dtype.
+
+        Synthetic rows interpolate between a seed row and one of its k nearest
+        same-class neighbours. ``borderline`` seeds only from rows whose
+        neighbourhood in the full training set is mostly other classes."""
+        X = self.X_train
+        n_new = np.maximum(targets - class_counts, 0)
+        for c in np.flatnonzero(n_new):
+            if class_counts[c] < 2:
+                self.pipeline_warnings.append(
+                    f"SMOTE skipped class '{classes[c]}': needs at least 2 samples."
+                )
+                n_new[c] = 0
+
+        out_X = np.empty((len(X) + n_new.sum(), X.shape[1]), dtype=X.dtype)
+        out_X[:len(X)] = X
+        out_y = np.concatenate([self.y_train, np.repeat(classes, n_new)])
+
+        if borderline:
+            m = min(k_neighbors, len(X) - 1)
+            _, full_neighbors = sk.NearestNeighbors(n_neighbors=m + 1).fit(X).kneighbors(X)
+
+        row = len(X)
+        for c in np.flatnonzero(n_new):
+            members = grouped[starts[c]:starts[c] + class_counts[c]]
+            k = min(k_neighbors, len(members) - 1)
+            _, neighbors = sk.NearestNeighbors(n_neighbors=k + 1).fit(X[members]).kneighbors(X[members])
+
+            seeds = np.arange(len(members))
+            if borderline:
+                other_frac = (y_codes[full_neighbors[members, 1:]] != c).mean(axis=1)
+                danger = np.flatnonzero((other_frac >= 0.5) & (other_frac < 1.0))
+                if len(danger):
+                    seeds = danger
+
+            pick = seeds[rng.randint(0, len(seeds), n_new[c])]
+            partner = neighbors[pick, 1 + rng.randint(0, k, n_new[c])]
+            base = X[members[pick]]
+            gap = rng.random_sample((n_new[c], 1)).astype(X.dtype)
+            out_X[row:row + n_new[c]] = base + gap * (X[members[partner]] - base)
+            row += n_new[c]
+
+        self.X_train = out_X
+        self.y_train = out_y
+
     def analyze_dataset(self, file_content: bytes, filename: str):
-        """Analyze dataset for histograms and correlations."""
+        """Profile the dataset: histograms, quantiles, nulls, cardinalities, top values, correlations."""
         file_obj = io.BytesIO(file_content)
-        if filename.endswith('.csv'):
+        if filename.lower().endswith('.csv'):
             df = pd.read_csv(file_obj)
-        elif filename.endswith(('.xls', '.xlsx')):
+        elif filename.lower().endswith(('.xls', '.xlsx')):
             df = pd.read_excel(file_obj)
         else:
             raise ValueError("Unsupported file format")
 
-        numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
-        
-        histograms = []
-        for col in numeric_cols[:10]:
-            try:
-                data = df[col].dropna().tolist()
-                if not data:
-                    continue
-                counts, bin_edges = np.histogram(data, bins=10)
-                hist_data = []
-                for i in range(len(counts)):
-                    hist_data.append({
-                        "bin": f"{bin_edges[i]:.1f} - {bin_edges[i+1]:.1f}",
-                        "count": int(counts[i])
-                    })
-                histograms.append({"column": col, "data": hist_data})
-            except Exception:
-                continue
-
-        correlation_matrix = []
-        if len(numeric_cols) > 1:
-            try:
-                corr_df = df[numeric_cols].corr()
-                correlation_matrix = {
-                    "columns": numeric_cols,
-                    "values": corr_df.where(pd.notnull(corr_df), 0).values.tolist()
-                }
-            except Exception:
-                pass
+        return profile_dataframe(df)
 
-        return {
-            "histograms": histograms,
-            "correlation_matrix": correlation_matrix if isinstance(correlation_matrix, dict) else {"columns": [], "values": []},
-            "columns": list(df.columns),
-            "rows_count": len(df)
-        }
+    def train_model(self, model_type: str, class_balancing: str = 'none', budget: Budget = None):
+        """Train the specified model within ``budget`` (the server default when None)."""
+        from neighbors import build_knn  # imports sklearn; kept off the API import path
 
-    def train_model(self, model_type: str, class_balancing: str = 'none'):
-        """Train the specified model."""
         if self.X_train is None:
             raise ValueError("Data not split")
+
+        self._ensure_block()
             
         self.is_regression = False
         self.model_type = model_type  # Store for reporting
@@ -795,27 +948,27 @@ class MLService:
         use_balanced = class_balancing == 'class_weight'
         
         if model_type == 'Logistic Regression':
-            self.model = LogisticRegression(
+            self.model = sk.LogisticRegression(
                 max_iter=2000,
                 class_weight='balanced' if use_balanced else None
             )
         elif model_type == 'Decision Tree':
-            self.model = DecisionTreeClassifier(
+            self.model = sk.DecisionTreeClassifier(
                 class_weight='balanced' if use_balanced else None
             )
         elif model_type == 'Random Forest':
-            self.model = RandomForestClassifier(
+            self.model = sk.RandomForestClassifier(
                 class_weight='balanced' if use_balanced else None
             )
         elif model_type == 'SVM':
-            self.model = SVC(
+            self.model = sk.SVC(
                 probability=True, max_iter=5000,
                 class_weight='balanced' if use_balanced else None
             )
         elif model_type == 'KNN':
-            self.model = KNeighborsClassifier()
+            self.model = build_knn(sk.KNeighborsClassifier, n_rows=self.X_train.shape[0])
         elif model_type == 'Gradient Boosting':
-            self.model = GradientBoostingClassifier()
+            self.model = sk.GradientBoostingClassifier()
         elif model_type == 'XGBoost':
             try:
                 from xgboost import XGBClassifier
@@ -826,34 +979,56 @@ class MLService:
                     "XGBoost is not installed. Install with: pip install xgboost"
                 )
         elif model_type == 'MLP Classifier':
-            self.model = MLPClassifier(max_iter=1000, early_stopping=True)
+            self.model = sk.MLPClassifier(max_iter=1000, early_stopping=True)
+        elif model_type == 'Hist Gradient Boosting':
+            self.model = sk.HistGradientBoostingClassifier(
+                max_iter=HGB_MAX_ITER, early_stopping=True,
+                categorical_features=self._categorical_mask(),
+                class_weight='balanced' if use_balanced else None
+            )
+        elif model_type == 'Linear SVM':
+            self.model = sk.LinearSVC(
+                max_iter=5000,
+                class_weight='balanced' if use_balanced else None
+            )
+        elif model_type == 'SGD Classifier':
+            # modified_huber: a smoothed hinge loss that also yields probabilities
+            self.model = sk.SGDClassifier(
+                loss='modified_huber', early_stopping=True,
+                class_weight='balanced' if use_balanced else None
+            )
+        elif model_type == 'Approximate Kernel SVM':
+            self.model = sk.make_pipeline(
+                self._kernel_map(),
+                sk.LinearSVC(max_iter=5000, class_weight='balanced' if use_balanced else None)
+            )
         # Bug 4 fix: add Decision Tree Regressor
         elif model_type == 'Decision Tree Regressor':
-            self.model = DecisionTreeRegressor()
+            self.model = sk.DecisionTreeRegressor()
             self.is_regression = True
         elif model_type == 'Linear Regression':
-            self.model = LinearRegression()
+            self.model = sk.LinearRegression()
             self.is_regression = True
         elif model_type == 'Random Forest Regressor':
-            self.model = RandomForestRegressor()
+            self.model = sk.RandomForestRegressor()
             self.is_regression = True
         elif model_type == 'Ridge Regression':
-            self.model = Ridge()
+            self.model = sk.Ridge()
             self.is_regression = True
         elif model_type == 'Lasso Regression':
-            self.model = Lasso()
+            self.model = sk.Lasso()
             self.is_regression = True
         elif model_type == 'ElasticNet':
-            self.model = ElasticNet()
+            self.model = sk.ElasticNet()
             self.is_regression = True
         elif model_type == 'SVR':
-            self.model = SVR()
+            self.model = sk.SVR()
             self.is_regression = True
         elif model_type == 'KNN Regressor':
-            self.model = KNeighborsRegressor()
+            self.model = build_knn(sk.KNeighborsRegressor, n_rows=self.X_train.shape[0])
             self.is_regression = True
         elif model_type == 'Gradient Boosting Regressor':
-            self.model = GradientBoostingRegressor()
+            self.model = sk.GradientBoostingRegressor()
             self.is_regression = True
         elif model_type == 'XGBoost Regressor':
             try:
@@ -865,28 +1040,108 @@ class MLService:
                 )
             self.is_regression = True
         elif model_type == 'MLP Regressor':
-            self.model = MLPRegressor(max_iter=1000, early_stopping=True)
+            self.model = sk.MLPRegressor(max_iter=1000, early_stopping=True)
+            self.is_regression = True
+        elif model_type == 'Hist Gradient Boosting Regressor':
+            self.model = sk.HistGradientBoostingRegressor(
+                max_iter=HGB_MAX_ITER, early_stopping=True,
+                categorical_features=self._categorical_mask()
+            )
+            self.is_regression = True
+        elif model_type == 'Linear SVR':
+            self.model = sk.LinearSVR(max_iter=5000)
+            self.is_regression = True
+        elif model_type == 'SGD Regressor':
+            self.model = sk.SGDRegressor(early_stopping=True)
+            self.is_regression = True
+        elif model_type == 'Approximate Kernel Ridge':
+            self.model = sk.make_pipeline(self._kernel_map(), sk.Ridge())
             self.is_regression = True
         else:
             raise ValueError(f"Unsupported model: {model_type}")
-            
-        self.model.fit(self.X_train, self.y_train)
+
+        self.model_parallel = self._assign_cores(self.model)
+
+        if model_type in SCALABLE_ALTERNATIVES and len(self.X_train) > LARGE_TRAIN_ROWS:
+            self.pipeline_warnings.append(
+                f"{model_type} scales superlinearly with {len(self.X_train):,} training rows; "
+                f"{SCALABLE_ALTERNATIVES[model_type]} trains much faster at this size."
+            )
+
+        self.fit_params = {}
+        if self.sample_weight is not None:
+            if 'sample_weight' in inspect.signature(self.model.fit).parameters:
+                self.fit_params['sample_weight'] = self.sample_weight
+            else:
+                self.pipeline_warnings.append(
+                    f"{model_type} does not support sample weights; trained without class balancing."
+                )
+
+        self.model, self.training = fit_with_budget(
+            self.model, self.X_train, self.y_train, self.fit_params, budget or Budget()
+        )
+
+    def _assign_cores(self, model) -> bool:
+        """Set ``n_jobs`` on the model (and estimators nested in a pipeline) to this
+        run's cores. Returns whether the model has any such parameter."""
+        params = {
+            name: self.n_jobs for name in model.get_params()
+            if name == 'n_jobs' or name.endswith('__n_jobs')
+        }
+        if params:
+            model.set_params(**params)
+        return bool(params)
+
+    def _categorical_mask(self):
+        """Boolean mask of feature-block columns that hold label-encoded category codes,
+        for the histogram models' native categorical splits. Codes are only usable
+        while still small non-negative integers (unscaled, not resampled; -1 marks
+        unseen categories and is treated as missing). None when there are none."""
+        mask = np.zeros(len(self.feature_names), dtype=bool)
+        for j, name in enumerate(self.feature_names):
+            if name not in self.ordinal_cols:
+                continue
+            codes = self.X_train[:, j]
+            mask[j] = bool(np.all(codes == np.round(codes))) and codes.max() < 255
+        return mask if mask.any() else None
+
+    def _kernel_map(self):
+        """RBF kernel feature map for the approximate kernel models."""
+        n_components = min(KERNEL_APPROX_COMPONENTS, len(self.X_train))
+        if KERNEL_APPROX_METHOD == 'rbf':
+            return sk.RBFSampler(n_components=n_components)
+        return sk.Nystroem(n_components=n_components)
 
     # ==================== NEW: Cross-Validation ====================
-    def cross_validate(self, cv_folds: int = 5, cv_stratified: bool = True):
-        """Perform cross-validation on the training data."""
+    def cross_validate(self, cv_folds: int = 5, cv_stratified: bool = True, budget: Budget = None):
+        """Perform cross-validation on the training data, within what is left of the
+        training ``budget``. Skipped (recorded in the training report) once it runs out."""
+        from neighbors import is_knn, cross_validate_knn
+
         if self.model is None or self.X_train is None or cv_folds <= 1:
             return None
+        budget = budget or Budget()
+        if budget.expired():
+            return self._skip_cross_validation("the training time budget was used up before it started")
 
         try:
             scoring = 'r2' if self.is_regression else 'accuracy'
 
             if cv_stratified and not self.is_regression:
-                cv = StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=42)
+                cv = sk.StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=42)
             else:
-                cv = KFold(n_splits=cv_folds, shuffle=True, random_state=42)
+                cv = sk.KFold(n_splits=cv_folds, shuffle=True, random_state=42)
 
-            scores = cross_val_score(self.model, self.X_train, self.y_train, cv=cv, scoring=scoring)
+            if is_knn(self.model):
+                # Fold scores from one neighbor graph of the fitted index instead of refitting
+                scores = cross_validate_knn(self.model, self.X_train, self.y_train, cv, self.is_regression)
+            else:
+                # Folds run in parallel only when the model is single-threaded itself
+                cv_jobs = 1 if self.model_parallel else min(self.n_jobs, cv_folds)
+                scores = cross_val_score_with_budget(
+                    self.model, self.X_train, self.y_train, budget, cv=cv, scoring=scoring,
+                    params=self.fit_params or None, n_jobs=cv_jobs
+                )
 
             return {
                 "folds": cv_folds,
@@ -896,86 +1151,102 @@ class MLService:
                 "metric": scoring,
                 "stratified": cv_stratified and not self.is_regression
             }
+        except TrainingTimeout:
+            return self._skip_cross_validation("it did not finish within the training time budget")
         except Exception as e:
             self.pipeline_warnings.append(f"Cross-validation failed: {str(e)}")
             return None
 
-    def evaluate(self):
-        """Evaluate the trained model with overfitting detection."""
+    def _skip_cross_validation(self, why: str):
+        self.pipeline_warnings.append(f"Cross-validation skipped: {why}.")
+        if self.training is not None:
+            self.training["cv_stop_reason"] = "time_budget"
+        return None
+
+    def evaluate(self, score_train: bool = True):
+        """Evaluate the trained model with overfitting detection.
+
+        The overfitting check scores a bounded sample of the training set
+        (EVAL_TRAIN_SAMPLE_ROWS); ``score_train=False`` skips it."""
         if self.model is None or self.X_test is None:
             raise ValueError("Model not trained or data not present")
 
-        y_pred = self.model.predict(self.X_test)
-        y_train_pred = self.model.predict(self.X_train)
+        if score_train:
+            X_train_eval, y_train_eval = bounded_sample(self.X_train, self.y_train)
+            y_train_pred = self.model.predict(X_train_eval)
+        train_info = {
+            "train_rows_scored": int(X_train_eval.shape[0]) if score_train else 0,
+            "train_rows": int(self.X_train.shape[0]),
+        }
 
         if self.is_regression:
+            y_pred = self.model.predict(self.X_test)
+
             # Test metrics
-            mse = mean_squared_error(self.y_test, y_pred)
+            test = regression_metrics(self.y_test, y_pred)
+            mse = test["mse"]
             rmse = np.sqrt(mse)
-            mae = mean_absolute_error(self.y_test, y_pred)
-            r2 = r2_score(self.y_test, y_pred)
-            explained_var = explained_variance_score(self.y_test, y_pred)
-
-            # Training metrics for overfitting detection
-            train_r2 = r2_score(self.y_train, y_train_pred)
-            train_mse = mean_squared_error(self.y_train, y_train_pred)
+            r2 = test["r2"]
 
             # Adjusted R²
             n = len(self.y_test)
             p = self.X_test.shape[1]
             adjusted_r2 = 1 - (1 - r2) * (n - 1) / (n - p - 1) if n > p + 1 else r2
 
-            # Overfitting analysis
-            overfit_gap = train_r2 - r2
-            overfitting_analysis = self._analyze_overfitting(train_r2, r2, overfit_gap)
+            # Training metrics for overfitting detection
+            train_r2 = train_mse = overfitting_analysis = None
+            if score_train:
+                train = regression_metrics(y_train_eval, y_train_pred)
+                train_r2, train_mse = round(train["r2"], 4), round(train["mse"], 4)
+                overfitting_analysis = self._analyze_overfitting(train["r2"], r2, train["r2"] - r2)
 
             feature_importance = self._get_feature_importance()
 
             return {
                 "mse": round(mse, 4),
                 "rmse": round(rmse, 4),
-                "mae": round(mae, 4),
+                "mae": round(test["mae"], 4),
                 "r2_score": round(r2, 4),
                 "adjusted_r2": round(adjusted_r2, 4),
-                "explained_variance": round(explained_var, 4),
-                "train_r2": round(train_r2, 4),
-                "train_mse": round(train_mse, 4),
+                "explained_variance": round(test["explained_variance"], 4),
+                "train_r2": train_r2,
+                "train_mse": train_mse,
+                **train_info,
                 "feature_importance": feature_importance,
                 "is_regression": True,
                 "overfitting_analysis": overfitting_analysis,
                 "model_type": getattr(self, 'model_type', 'Unknown Model')
             }
         else:
-            # Test metrics
-            acc = accuracy_score(self.y_test, y_pred)
-            report = classification_report(self.y_test, y_pred, output_dict=True)
+            # Test metrics: labels and scores from one pass, every metric from one confusion matrix
+            y_pred, scores, is_proba = predict_with_scores(self.model, self.X_test)
+            test = classification_metrics(self.y_test, y_pred)
+            acc = test["accuracy"]
             try:
-                cm = confusion_matrix(self.y_test, y_pred).tolist()
-            except ValueError:
-                cm = []
+                curves = score_curves(self.y_test, scores, getattr(self.model, 'classes_', []), is_proba)
+            except (ValueError, IndexError) as e:
+                self.pipeline_warnings.append(f"Could not compute ROC/PR curves: {str(e)}")
+                curves = None
 
             # Training metrics for overfitting detection
-            train_acc = accuracy_score(self.y_train, y_train_pred)
-
-            # Weighted averages
-            precision_w = precision_score(self.y_test, y_pred, average='weighted', zero_division=0)
-            recall_w = recall_score(self.y_test, y_pred, average='weighted', zero_division=0)
-            f1_w = f1_score(self.y_test, y_pred, average='weighted', zero_division=0)
-
-            # Overfitting analysis
-            overfit_gap = train_acc - acc
-            overfitting_analysis = self._analyze_overfitting(train_acc, acc, overfit_gap)
+            train_acc = overfitting_analysis = None
+            if score_train:
+                train_acc = classification_metrics(y_train_eval, y_train_pred)["accuracy"]
+                overfitting_analysis = self._analyze_overfitting(train_acc, acc, train_acc - acc)
+                train_acc = round(train_acc, 4)
 
             feature_importance = self._get_feature_importance()
 
             return {
                 "accuracy": round(acc, 4),
-                "train_accuracy": round(train_acc, 4),
-                "precision": round(precision_w, 4),
-                "recall": round(recall_w, 4),
-                "f1_score": round(f1_w, 4),
-                "report": report,
-                "confusion_matrix": cm,
+                "train_accuracy": train_acc,
+                **train_info,
+                "precision": round(test["precision"], 4),
+                "recall": round(test["recall"], 4),
+                "f1_score": round(test["f1_score"], 4),
+                "report": test["report"],
+                "confusion_matrix": test["confusion_matrix"],
+                "curves": curves,
                 "feature_importance": feature_importance,
                 "is_regression": False,
                 "overfitting_analysis": overfitting_analysis,
@@ -1045,68 +1316,44 @@ class MLService:
         feature_importance.sort(key=lambda x: x['value'], reverse=True)
         return feature_importance
 
-    @staticmethod
-    def _convert_numpy(obj):
-        """Recursively convert numpy types to native Python types."""
-        if isinstance(obj, dict):
-            return {k: MLService._convert_numpy(v) for k, v in obj.items()}
-        elif isinstance(obj, (list, tuple)):
-            return [MLService._convert_numpy(item) for item in obj]
-        elif isinstance(obj, (np.integer,)):
-            return int(obj)
-        elif isinstance(obj, (np.floating,)):
-            return float(obj)
-        elif isinstance(obj, (np.bool_,)):
-            return bool(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return obj
-
     def _capture_snapshot(self, step_name: str, prev_shape=None):
-        """Capture a lightweight snapshot of current data state for step previews."""
+        """Capture a lightweight snapshot of current data state for step previews:
+        the shape, plus (``preview_level`` 'rows') up to 20 column names and a
+        3-row sample of the first 10 columns, already JSON-ready."""
         if self.X_train is None:
             return None
         
         current_shape = (len(self.X_train), self.X_train.shape[1] if hasattr(self.X_train, 'shape') and len(self.X_train.shape) > 1 else 0)
-        
-        # Get column names
-        columns = []
-        if hasattr(self.X_train, 'columns'):
-            columns = list(self.X_train.columns)[:20]  # max 20 columns
-        elif hasattr(self, 'feature_names') and self.feature_names:
-            columns = list(self.feature_names)[:20]
-        
-        # Get 3-row sample preview as list of dicts
-        sample = []
-        try:
-            if isinstance(self.X_train, pd.DataFrame):
-                sample_df = self.X_train.head(3)
-            else:
-                sample_df = pd.DataFrame(self.X_train[:3], columns=columns if columns else None)
-            
-            for _, row in sample_df.iterrows():
-                row_dict = {}
-                for col in sample_df.columns[:10]:  # Max 10 cols in preview
-                    val = row[col]
-                    if pd.isna(val):
-                        row_dict[str(col)] = None
-                    elif isinstance(val, (np.integer,)):
-                        row_dict[str(col)] = int(val)
-                    elif isinstance(val, (np.floating, float)):
-                        row_dict[str(col)] = round(float(val), 4)
-                    else:
-                        row_dict[str(col)] = str(val)[:30]
-                sample.append(row_dict)
-        except:
-            pass
-        
         snapshot = {
             "step": step_name,
             "rows": current_shape[0],
             "cols": current_shape[1],
-            "columns": columns,
-            "sample": sample,
         }
+
+        if self.preview_level == 'rows':
+            # Get column names
+            columns = []
+            if hasattr(self.X_train, 'columns'):
+                columns = [str(col) for col in list(self.X_train.columns)[:20]]  # max 20 columns
+            elif hasattr(self, 'feature_names') and self.feature_names:
+                columns = [str(col) for col in list(self.feature_names)[:20]]
+
+            # Get 3-row sample preview as list of dicts (max 10 cols), converted column by column
+            sample = []
+            try:
+                if isinstance(self.X_train, pd.DataFrame):
+                    corner = self.X_train.iloc[:3, :10]
+                    names = [str(col) for col in corner.columns]
+                    values = [format_column(corner.iloc[:, i], text_chars=30) for i in range(corner.shape[1])]
+                else:
+                    corner = np.asarray(self.X_train[:3, :10])
+                    names = [str(col) for col in list(self.feature_names)[:corner.shape[1]]]
+                    values = [format_column(corner[:, i], text_chars=30) for i in range(corner.shape[1])]
+                sample = [dict(zip(names, row)) for row in zip(*values)]
+            except Exception:
+                pass
+            snapshot["columns"] = columns
+            snapshot["sample"] = sample
         
         # Compute delta from previous shape
         if prev_shape:
@@ -1118,66 +1365,62 @@ class MLService:
         return snapshot, current_shape
 
     def run_pipeline(self, request, user_id: str):
+        """Run the pipeline on this run's share of the CPU budget (see thread_budget.py)."""
+        with thread_budget.reserve(peers=self.expected_peers) as self.compute:
+            self.n_jobs = self.compute["cores"]
+            return self._run_pipeline(request, user_id)
+
+    def _run_pipeline(self, request, user_id: str):
         """
         Orchestrates the full ML pipeline:
-        1. Fetch Dataset from MongoDB
-        2. Download file from Cloudinary
+        1. Fetch Dataset from MongoDB (serve the cached result of an identical run)
+        2. Download file from storage
         3. Load & Split
-        4. Remove Duplicates (if node present)
-        5. Handle Outliers (if node present)
-        6. Preprocess (Impute, Encode, Scale)
-        7. Feature Selection (if node present)
-        8. Feature Engineering (if node present)
-        9. PCA (if node present)
-        10. Class Balancing (if node present)
-        11. Train
-        12. Cross-Validate (if node present)
-        13. Evaluate
-        14. Save Result to MongoDB
+        4. Run the data steps (see pipeline_steps.py): in the request's ``steps`` order,
+           or duplicates, outliers, imputation, encoding, scaling, feature selection,
+           feature engineering, PCA and class balancing for the nodes present
+        5. Train, Cross-Validate (if node present), Evaluate
+        6. Save Result to the result cache (see result_cache.py)
         """
-        self.pipeline_warnings = []  # Reset warnings
+        dataset, cache_key, cached = self.resolve_request(request, user_id)
+        if cached is not None:
+            return cached
 
-        # 1. Fetch Dataset from MongoDB
-        dataset = None
-        try:
-            dataset = datasets_collection.find_one({"_id": ObjectId(request.file_id)})
-        except:
-            pass
-        
-        if not dataset:
-            dataset = datasets_collection.find_one({"filename": request.file_id})
+        self.load_request(request, read_dataset(dataset), dataset["filename"])
+
+        planned, notes = plan_request(request)
+        self.pipeline_warnings.extend(notes)
+        values = request.model_dump()
+        for step in planned:
+            self.run_step(step.node_type, values)
+
+        return self.train_and_evaluate(request, user_id, dataset, cache_key)
 
+    @staticmethod
+    def resolve_request(request, user_id: str):
+        """The request's dataset document (own, sample or system datasets only), its
+        result-cache key and the cached result of an identical run (None if there is none)."""
+        dataset, _ = resolve_dataset(
+            datasets_collection, request.file_id, user_id, exclude=PROFILE_FIELDS + PREVIEW_FIELDS
+        )
         if not dataset:
-            raise ValueError(f"Dataset not found: {request.file_id}")
-            
-        # Security: Check ownership or public/sample status
-        is_public = dataset.get("is_sample", False) or dataset.get("user_id") == "system"
-        
-        if dataset["user_id"] != user_id and not is_public:
-            if "filename" in dataset:
-                 my_dataset = datasets_collection.find_one({
-                     "filename": dataset["filename"],
-                     "user_id": user_id
-                 })
-                 if my_dataset:
-                     dataset = my_dataset
-                 else:
-                     raise ValueError("Unauthorized: You do not own this dataset")
-            else:
-                 raise ValueError("Unauthorized: You do not own this dataset")
-        
-        # 2. Download from Cloudinary
-        try:
-            response = requests.get(dataset["cloudinary_url"])
-            file_content = response.content
-        except Exception as e:
-            raise ValueError(f"File not found in storage: {dataset.get('cloudinary_url')}")
+            raise ValueError(f"Dataset not found or unauthorized: {request.file_id}")
+
+        cache_key = result_key(request, dataset.get("content_hash"))
+        cached = None
+        if cache_key and not getattr(request, 'bypass_cache', False):
+            cached = get_cached_result(cache_key)
+        return dataset, cache_key, cached
 
-        # 3. Load & Split
+    def load_request(self, request, file_content: bytes, filename: str):
+        """Load & split the dataset for ``request`` and snapshot it."""
+        self.pipeline_warnings = []  # Reset warnings
+        self.preview_level = getattr(request, 'step_previews', None) or 'rows'
+        self.feature_dtype = np.dtype(getattr(request, 'feature_dtype', None) or 'float64')
         try:
             self.load_and_split(
                 file_content=file_content,
-                filename=dataset["filename"],
+                filename=filename,
                 target_column=request.target_column,
                 test_size=request.test_size,
                 stratified=getattr(request, 'stratified', False),
@@ -1189,146 +1432,64 @@ class MLService:
                 raise ValueError(f"Target Column Error: {str(e)}\nHINT: Check if '{request.target_column}' is spelled correctly.")
             raise ValueError(f"Data Loading Error: {str(e)}")
 
-        # --- Step Previews: capture snapshots after each step ---
-        step_previews = {}
-        prev_shape = None
-
-        # Snapshot after load & split (dataset + split)
-        snap = self._capture_snapshot("dataset")
-        if snap:
-            step_previews["dataset"] = snap[0]
-            step_previews["split"] = snap[0]  # split happens here too
-            prev_shape = snap[1]
-
-        # 4. Remove Duplicates (if node present)
-        dup_strategy = getattr(request, 'duplicate_handling', 'none')
-        dup_result = {}
-        if dup_strategy != 'none':
-            try:
-                dup_result = self.remove_duplicates(strategy=dup_strategy)
-                snap = self._capture_snapshot("duplicate", prev_shape)
-                if snap:
-                    step_previews["duplicate"] = snap[0]
-                    prev_shape = snap[1]
-            except Exception as e:
-                self.pipeline_warnings.append(f"Duplicate removal failed: {str(e)}")
-
-        # 5. Handle Outliers (if node present)
-        outlier_method = getattr(request, 'outlier_method', 'none')
-        outlier_action = getattr(request, 'outlier_action', 'clip')
-        outlier_result = {}
-        if outlier_method != 'none':
-            try:
-                outlier_result = self.handle_outliers(method=outlier_method, action=outlier_action)
-                snap = self._capture_snapshot("outlier", prev_shape)
-                if snap:
-                    step_previews["outlier"] = snap[0]
-                    prev_shape = snap[1]
-            except Exception as e:
-                self.pipeline_warnings.append(f"Outlier handling failed: {str(e)}")
-        
-        # 6. Preprocess (Impute, Encode, Scale)
-        try:
-            self.apply_preprocessing(
-                imputer_strategy=request.imputer_strategy,
-                encoder_strategy=request.encoder_strategy,
-                scaler_type=request.scaler_type
-            )
-            # Capture separate snapshots for imputation, encoding, preprocessing
-            snap = self._capture_snapshot("imputation", prev_shape)
-            if snap:
-                step_previews["imputation"] = snap[0]
-                step_previews["encoding"] = snap[0]  # same step handles all three
-                step_previews["preprocessing"] = snap[0]
-                prev_shape = snap[1]
-        except ValueError as e:
-            msg = str(e)
-            hint = ""
-            if "could not convert string to float" in msg:
-                hint = "\nHINT: You have text data in a numeric column. Try adding an 'Encoding' node (OneHot or Label) before the model."
-            elif "Input contains NaN" in msg:
-                hint = "\nHINT: Your data has missing values. Try changing the Imputer strategy to 'Mean' or 'Constant'."
-            raise ValueError(f"Preprocessing Error: {msg}{hint}")
-        except Exception as e:
-            raise ValueError(f"Preprocessing Failed: {str(e)}")
-
-        # 7. Feature Selection (if node present)
-        fs_method = getattr(request, 'feature_selection_method', 'none')
-        fs_result = {}
-        if fs_method != 'none':
-            try:
-                fs_result = self.apply_feature_selection(
-                    method=fs_method,
-                    variance_threshold=getattr(request, 'variance_threshold', 0.01),
-                    correlation_threshold=getattr(request, 'correlation_threshold', 0.95)
-                )
-                snap = self._capture_snapshot("featureSelection", prev_shape)
-                if snap:
-                    step_previews["featureSelection"] = snap[0]
-                    prev_shape = snap[1]
-            except Exception as e:
-                self.pipeline_warnings.append(f"Feature selection failed: {str(e)}")
-
-        # 8. Feature Engineering (if node present)
-        fe_method = getattr(request, 'feature_engineering_method', 'none')
-        fe_result = {}
-        if fe_method != 'none':
-            try:
-                fe_result = self.apply_feature_engineering(
-                    method=fe_method,
-                    polynomial_degree=getattr(request, 'polynomial_degree', 2)
-                )
-                snap = self._capture_snapshot("featureEngineering", prev_shape)
-                if snap:
-                    step_previews["featureEngineering"] = snap[0]
-                    prev_shape = snap[1]
-            except Exception as e:
-                self.pipeline_warnings.append(f"Feature engineering failed: {str(e)}")
-
-        # 9. PCA (if node present)
-        pca_components = getattr(request, 'pca_components', 0)
-        pca_result = {}
-        if pca_components > 0:
-            try:
-                pca_result = self.apply_pca(n_components=pca_components)
-                snap = self._capture_snapshot("pca", prev_shape)
-                if snap:
-                    step_previews["pca"] = snap[0]
-                    prev_shape = snap[1]
-            except Exception as e:
-                self.pipeline_warnings.append(f"PCA failed: {str(e)}")
-
         # Bug 2 fix: detect regression from model_type BEFORE class balancing runs
         # (self.is_regression is only set inside train_model which runs later)
-        _regression_models = {
-            'Linear Regression', 'Random Forest Regressor', 'Ridge Regression',
-            'Lasso Regression', 'ElasticNet', 'SVR', 'KNN Regressor',
-            'Gradient Boosting Regressor', 'XGBoost Regressor', 'MLP Regressor',
-            'Decision Tree Regressor'
-        }
-        self.is_regression = request.model_type in _regression_models
+        self.is_regression = request.model_type in REGRESSION_MODELS
+
+        self._capture_step("dataset")
+        self._capture_step("split")  # split happens here too
 
-        # 10. Class Balancing (if node present)
-        class_balancing = getattr(request, 'class_balancing', 'none')
-        balance_result = {}
-        if class_balancing != 'none' and class_balancing != 'class_weight':
+    def run_step(self, node_type: str, values: dict):
+        """Run one data step (see pipeline_steps.py) with its settings taken from
+        ``values``, keep its report and snapshot the data for the step preview.
+        A disabled step only takes the snapshot."""
+        step = STEPS[node_type]
+        if step.enabled(values):
             try:
-                balance_result = self.handle_class_imbalance(method=class_balancing)
-                snap = self._capture_snapshot("classBalancing", prev_shape)
-                if snap:
-                    step_previews["classBalancing"] = snap[0]
-                    prev_shape = snap[1]
+                report = getattr(self, step.method)(**step.kwargs(values))
             except Exception as e:
-                self.pipeline_warnings.append(f"Class balancing failed: {str(e)}")
+                if step.failure is None:
+                    raise _preprocessing_error(e)
+                self.pipeline_warnings.append(f"{step.failure} failed: {str(e)}")
+                return
+            if step.result and report:
+                self.step_results[step.result] = report
+        self._capture_step(node_type)
+
+    def _capture_step(self, step_name: str):
+        """Keep the step's snapshot. A snapshot with the same columns and sample rows
+        as the last one kept in full only names that step (``same_as``)."""
+        if self.preview_level == 'none':
+            return
+        snap = self._capture_snapshot(step_name, self._prev_shape)
+        if not snap:
+            return
+        snapshot, self._prev_shape = snap
+        last = self.step_previews.get(self._last_full_preview)
+        if (self.preview_level == 'rows' and last is not None
+                and (snapshot["rows"], snapshot["cols"], snapshot["columns"], snapshot["sample"])
+                == (last["rows"], last["cols"], last["columns"], last["sample"])):
+            del snapshot["columns"], snapshot["sample"]
+            snapshot["same_as"] = self._last_full_preview
+        else:
+            self._last_full_preview = step_name
+        self.step_previews[step_name] = snapshot
 
+    def train_and_evaluate(self, request, user_id: str, dataset: dict, cache_key: str = None) -> dict:
+        """Train on the prepared data, cross-validate and evaluate, then assemble the
+        results and store them in the result cache."""
         # Final snapshot before training (for model node)
-        snap = self._capture_snapshot("model", prev_shape)
-        if snap:
-            step_previews["model"] = snap[0]
+        self._capture_step("model")
 
-        # 11. Train
+        # Train
         try:
-            self.train_model(request.model_type, class_balancing=class_balancing)
+            budget = Budget(
+                seconds=getattr(request, 'time_budget_seconds', None),
+                max_iterations=getattr(request, 'max_iterations', None),
+            )
+            self.train_model(
+                request.model_type, class_balancing=getattr(request, 'class_balancing', 'none'), budget=budget
+            )
         except Exception as e:
             msg = str(e)
             hint = ""
@@ -1336,38 +1497,38 @@ class MLService:
                 hint = "\nHINT: Your target variable might need encoding if it's categorical."
             raise ValueError(f"Training Error: {msg}{hint}")
 
-        # 12. Cross-Validate (if node present)
+        # Cross-Validate (if node present)
         cv_folds = getattr(request, 'cv_folds', 0)
         cv_result = None
         if cv_folds > 1:
             cv_result = self.cross_validate(
                 cv_folds=cv_folds,
-                cv_stratified=getattr(request, 'cv_stratified', True)
+                cv_stratified=getattr(request, 'cv_stratified', True),
+                budget=budget
             )
 
-        # 13. Evaluate
+        # Evaluate
         try:
-            results = self.evaluate()
+            results = self.evaluate(score_train=getattr(request, 'score_train', True))
         except Exception as e:
             raise ValueError(f"Evaluation Failed: {str(e)}")
 
         # Add pipeline metadata to results
         results["warnings"] = self.pipeline_warnings
-        results["step_previews"] = step_previews
         if cv_result:
             results["cross_validation"] = cv_result
-        if dup_result:
-            results["duplicate_removal"] = dup_result
-        if outlier_result:
-            results["outlier_handling"] = outlier_result
-        if fs_result:
-            results["feature_selection"] = fs_result
-        if fe_result:
-            results["feature_engineering"] = fe_result
-        if pca_result:
-            results["pca"] = pca_result
-        if balance_result:
-            results["class_balancing"] = balance_result
+        results.update(self.step_results)
+        from neighbors import is_knn, index_report
+        if is_knn(self.model):
+            try:
+                results["neighbor_index"] = index_report(self.model, self.X_train, self.X_test)
+            except Exception as e:
+                self.pipeline_warnings.append(f"Could not measure neighbor index recall: {str(e)}")
+
+        if self.training:
+            results["training"] = self.training
+        if self.compute:
+            results["compute"] = {**self.compute, "model_parallel": self.model_parallel}
 
         results["data_shape"] = {
             "train_samples": len(self.X_train),
@@ -1375,7 +1536,26 @@ class MLService:
             "features": len(self.feature_names)
         }
 
-        # Convert numpy types to native Python types before serialization
-        results = self._convert_numpy(results)
+        # NumPy values stay as they are: the response encoder writes them natively and
+        # store_result converts only the copy it persists
+        if self.step_previews:
+            results["step_previews"] = self.step_previews
+        results["cached"] = False
+        # A run cut short by the clock depends on machine load; do not replay it
+        training = self.training or {}
+        if cache_key and "time_budget" not in (training.get("stop_reason"), training.get("cv_stop_reason")):
+            store_result(cache_key, user_id, request, dataset["content_hash"], results)
         return results
 
+
+def _preprocessing_error(e: Exception) -> ValueError:
+    """The run's error for a failed imputation, encoding or scaling step."""
+    if not isinstance(e, ValueError):
+        return ValueError(f"Preprocessing Failed: {str(e)}")
+    msg = str(e)
+    hint = ""
+    if "could not convert string to float" in msg:
+        hint = "\nHINT: You have text data in a numeric column. Try adding an 'Encoding' node (OneHot or Label) before the model."
+    elif "Input contains NaN" in msg:
+        hint = "\nHINT: Your data has missing values. Try changing the Imputer strategy to 'Mean' or 'Constant'."
+    return ValueError(f"Preprocessing Error: {msg}{hint}")
@@ -5,7 +5,7 @@ These replace SQLAlchemy ORM models.
 from pydantic import BaseModel, Field, EmailStr, ConfigDict
 from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime, timezone
-from pydantic import BaseModel, Field, EmailStr, ConfigDict, field_validator
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, field_validator, model_validator
 from bson import ObjectId
 
 
@@ -59,10 +59,17 @@ class DatasetInDB(BaseModel):
     id: Optional[str] = Field(default=None, alias="_id")
     user_id: str
     filename: str
-    cloudinary_url: str
-    cloudinary_public_id: str
+    storage_backend: str = "cloudinary"  # cloudinary | local | s3
+    storage_key: Optional[str] = None
+    cloudinary_url: Optional[str] = None
+    cloudinary_public_id: Optional[str] = None
     columns: List[str] = []
     shape: Dict[str, int] = {}
+    content_hash: Optional[str] = None  # sha256 of the uploaded bytes
+    size_bytes: Optional[int] = None
+    profile: Optional[Dict[str, Any]] = None  # /analyze payload, computed at upload
+    schema_: Optional[List[Dict[str, Any]]] = Field(default=None, alias="schema")  # typed per-column stats
+    preview_rows: Optional[List[Dict[str, Any]]] = None  # head rows for preview_until
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     model_config = ConfigDict(
@@ -77,6 +84,7 @@ class DatasetResponse(BaseModel):
     filename: str
     columns: List[str]
     shape: Dict[str, int]
+    schema_: Optional[List[Dict[str, Any]]] = Field(default=None, alias="schema")
     created_at: Optional[str] = None
 
 
@@ -120,11 +128,30 @@ class WorkspaceCreate(BaseModel):
 
 
 class WorkspaceUpdate(BaseModel):
+    base_version: Optional[int] = None  # Rejected with 409 if the stored version differs
     name: Optional[str] = None
     nodes_json: Optional[List[Dict[str, Any]]] = None
     edges_json: Optional[List[Dict[str, Any]]] = None
 
 
+class WorkspaceOp(BaseModel):
+    op: Literal['add_node', 'update_node', 'remove_node', 'add_edge', 'update_edge', 'remove_edge']
+    id: str
+    value: Optional[Dict[str, Any]] = None  # Full node/edge for add/update (replaces the stored one)
+
+    @model_validator(mode='after')
+    def validate_value(self):
+        if self.value is None and not self.op.startswith('remove'):
+            raise ValueError('value is required for add/update operations')
+        return self
+
+
+class WorkspacePatch(BaseModel):
+    base_version: Optional[int] = None  # Rejected with 409 if the stored version differs
+    name: Optional[str] = None
+    ops: List[WorkspaceOp] = []
+
+
 class WorkspaceResponse(BaseModel):
     id: str
     name: str
@@ -141,6 +168,7 @@ class WorkspaceDetailResponse(BaseModel):
     nodes_json: List[Dict[str, Any]] = []
     edges_json: List[Dict[str, Any]] = []
     updated_at: Optional[str] = None
+    version: int = 0
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -153,7 +181,11 @@ class PipelineResultInDB(BaseModel):
     workflow_id: Optional[str] = None
     results_json: Dict[str, Any] = {}
     workflow_snapshot: Optional[Dict[str, Any]] = None
+    # Result cache: sha256 of the canonical request + dataset content hash
+    cache_key: Optional[str] = None
+    content_hash: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: Optional[datetime] = None
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -175,6 +207,10 @@ ALLOWED_MODEL_TYPES = Literal[
     'Gradient Boosting',
     'XGBoost',
     'MLP Classifier',
+    'Hist Gradient Boosting',
+    'Linear SVM',
+    'SGD Classifier',
+    'Approximate Kernel SVM',
     # Regression
     'Linear Regression',
     'Decision Tree Regressor',
@@ -187,6 +223,17 @@ ALLOWED_MODEL_TYPES = Literal[
     'Gradient Boosting Regressor',
     'XGBoost Regressor',
     'MLP Regressor',
+    'Hist Gradient Boosting Regressor',
+    'Linear SVR',
+    'SGD Regressor',
+    'Approximate Kernel Ridge',
+]
+
+
+# Data step node types a pipeline can run (see pipeline_steps.py)
+PIPELINE_STEP_TYPES = Literal[
+    'duplicate', 'outlier', 'imputation', 'encoding', 'preprocessing',
+    'featureSelection', 'featureEngineering', 'pca', 'classBalancing',
 ]
 
 
@@ -206,6 +253,9 @@ class PipelineRequest(BaseModel):
     workflow_id: Optional[str] = None
     workflow_snapshot: Optional[Dict[str, Any]] = None
 
+    # Data steps in canvas order; None runs the enabled steps in the default order
+    steps: Optional[List[PIPELINE_STEP_TYPES]] = None
+
     # Split enhancements
     stratified: Optional[bool] = False
     random_state: Optional[int] = 42
@@ -213,6 +263,9 @@ class PipelineRequest(BaseModel):
 
     # Duplicate Removal Node
     duplicate_handling: Optional[str] = 'none'  # 'all', 'first', 'last', 'none'
+    duplicate_round_decimals: Optional[int] = None  # round floats before matching (near-duplicates)
+    duplicate_normalize_text: Optional[bool] = False  # trim + lower-case text before matching
+    duplicate_report_leakage: Optional[bool] = True  # count test rows whose features appear in training
 
     # Outlier Handling Node
     outlier_method: Optional[str] = 'none'  # 'iqr', 'zscore', 'none'
@@ -235,7 +288,26 @@ class PipelineRequest(BaseModel):
     polynomial_degree: Optional[int] = 2
 
     # Class Balancing Node
-    class_balancing: Optional[str] = 'none'  # 'smote', 'oversample', 'undersample', 'class_weight', 'none'
+    class_balancing: Optional[str] = 'none'  # 'smote', 'borderline_smote', 'oversample', 'undersample', 'sample_weight', 'class_weight', 'none'
+    balance_ratio: Optional[float] = 1.0  # target minority/majority ratio (< 1.0 = partial rebalancing)
+
+    # Feature block precision after preprocessing ('float32' halves pipeline memory)
+    feature_dtype: Optional[Literal['float32', 'float64']] = 'float64'
+
+    # Score a bounded training sample for the overfitting check (False skips it)
+    score_train: Optional[bool] = True
+
+    # Data snapshot after each step: 'rows' (shape, columns and 3 sample rows),
+    # 'shape' (rows and columns counts only) or 'none'
+    step_previews: Optional[Literal['none', 'shape', 'rows']] = 'rows'
+
+    # Recompute even when an identical run is cached (the fresh result replaces it)
+    bypass_cache: Optional[bool] = False
+
+    # Training budget: wall-clock seconds (capped by TRAIN_TIME_BUDGET_SECONDS) and
+    # boosting rounds / epochs / trees for iterative models
+    time_budget_seconds: Optional[float] = None
+    max_iterations: Optional[int] = None
 
     @field_validator('test_size')
     @classmethod
@@ -244,6 +316,20 @@ class PipelineRequest(BaseModel):
             raise ValueError('test_size must be between 0.0 and 1.0')
         return v
 
+    @field_validator('balance_ratio')
+    @classmethod
+    def validate_balance_ratio(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and not (0.0 < v <= 1.0):
+            raise ValueError('balance_ratio must be in (0.0, 1.0]')
+        return v
+
+    @field_validator('time_budget_seconds', 'max_iterations')
+    @classmethod
+    def validate_budget(cls, v):
+        if v is not None and v <= 0:
+            raise ValueError('training budgets must be positive')
+        return v
+
 
 class ChatRequest(BaseModel):
     workflow: Dict[str, Any]
@@ -262,6 +348,8 @@ class PreviewUntilRequest(BaseModel):
     active_steps: Optional[List[str]] = []
     # Step params (default to 'none'/disabled when step not in active_steps)
     duplicate_handling: Optional[str] = 'none'
+    duplicate_round_decimals: Optional[int] = None
+    duplicate_normalize_text: Optional[bool] = False
     outlier_method: Optional[str] = 'none'
     outlier_action: Optional[str] = 'clip'
     imputer_strategy: Optional[str] = 'none'
@@ -272,3 +360,11 @@ class PreviewUntilRequest(BaseModel):
     correlation_threshold: Optional[float] = 0.95
     # Max rows to return in the data grid (col_stats always reflect full df)
     max_rows: Optional[int] = 500
+
+
+class GraphRunRequest(BaseModel):
+    """Canvas graph to run: every Result node fed by a Model node is one pipeline."""
+    nodes: List[Dict[str, Any]]
+    edges: List[Dict[str, Any]] = []
+    bypass_cache: Optional[bool] = False
+    step_previews: Optional[Literal['none', 'shape', 'rows']] = 'rows'
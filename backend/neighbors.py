@@ -0,0 +1,229 @@
+"""
+Neighbor indexes for the KNN models.
+KNN_INDEX selects how ``KNN`` / ``KNN Regressor`` find neighbors: sklearn's exact
+``brute`` / ``kd_tree`` / ``ball_tree`` (with KNN_LEAF_SIZE), or ``approximate``, which
+finds candidates with a KD-tree over a randomized-PCA projection to KNN_ANN_DIMS
+dimensions and re-ranks KNN_ANN_CANDIDATES of them by exact distance. ``auto`` uses
+the approximate index from KNN_APPROX_MIN_ROWS training rows and a ball tree below.
+The fitted index is reused by evaluation and by cross-validation, which queries one
+neighbor graph over the training set instead of refitting per fold.
+"""
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from scipy import sparse
+from sklearn.base import BaseEstimator, ClassifierMixin, RegressorMixin
+from sklearn.decomposition import PCA
+from sklearn.neighbors import KDTree, NearestNeighbors, KNeighborsClassifier, KNeighborsRegressor
+
+load_dotenv()
+
+KNN_INDEX = os.getenv("KNN_INDEX", "auto").lower()
+KNN_LEAF_SIZE = int(os.getenv("KNN_LEAF_SIZE", "40"))
+KNN_APPROX_MIN_ROWS = int(os.getenv("KNN_APPROX_MIN_ROWS", "50000"))
+KNN_ANN_DIMS = int(os.getenv("KNN_ANN_DIMS", "8"))
+KNN_ANN_CANDIDATES = int(os.getenv("KNN_ANN_CANDIDATES", "64"))
+KNN_RECALL_PROBES = int(os.getenv("KNN_RECALL_PROBES", "200"))
+KNN_NEIGHBORS = 5
+
+INDEX_TYPES = ('auto', 'brute', 'kd_tree', 'ball_tree', 'approximate')
+_RERANK_BLOCK = 1 << 22  # floats gathered per query block when re-ranking
+
+
+class _ApproximateKNeighbors(BaseEstimator):
+    """k-NN over a projected KD-tree: candidates are the ``n_candidates`` nearest rows
+    in a ``n_components``-dimensional randomized-PCA space, re-ranked by exact
+    Euclidean distance. With no more features than ``n_components`` the tree is exact."""
+
+    def __init__(self, n_neighbors: int = KNN_NEIGHBORS, n_components: int = KNN_ANN_DIMS,
+                 n_candidates: int = KNN_ANN_CANDIDATES, leaf_size: int = KNN_LEAF_SIZE,
+                 random_state: int = 0):
+        self.n_neighbors = n_neighbors
+        self.n_components = n_components
+        self.n_candidates = n_candidates
+        self.leaf_size = leaf_size
+        self.random_state = random_state
+
+    @staticmethod
+    def _dense(X) -> np.ndarray:
+        return np.asarray(X.toarray() if sparse.issparse(X) else X, dtype=np.float64)
+
+    def _fit_index(self, X):
+        X = self._dense(X)
+        self.X_ = X
+        self.n_samples_fit_ = X.shape[0]
+        if X.shape[1] > self.n_components:
+            self.projection_ = PCA(n_components=self.n_components, svd_solver='randomized',
+                                   random_state=self.random_state).fit(X)
+            self.tree_ = KDTree(self.projection_.transform(X), leaf_size=self.leaf_size)
+            self.sq_norms_ = np.einsum('ij,ij->i', X, X)
+        else:
+            self.projection_ = None
+            self.tree_ = KDTree(X, leaf_size=self.leaf_size)
+
+    def kneighbors(self, X=None, n_neighbors: int = None, return_distance: bool = True):
+        """``(distances, indices)`` of the nearest training rows, nearest first."""
+        k = min(n_neighbors or self.n_neighbors, self.n_samples_fit_)
+        Q = self.X_ if X is None else self._dense(X)
+        if self.projection_ is None:
+            distances, indices = self.tree_.query(Q, k=k)
+            return (distances, indices) if return_distance else indices
+
+        width = min(max(k, self.n_candidates), self.n_samples_fit_)
+        candidates = self.tree_.query(self.projection_.transform(Q), k=width, return_distance=False)
+        distances = np.empty((len(Q), k))
+        indices = np.empty((len(Q), k), dtype=np.intp)
+        block = max(1, _RERANK_BLOCK // (width * Q.shape[1]))
+        for start in range(0, len(Q), block):
+            q = Q[start:start + block]
+            cand = candidates[start:start + block]
+            d2 = (np.einsum('ij,ij->i', q, q)[:, None] + self.sq_norms_[cand]
+                  - 2 * np.einsum('qd,qcd->qc', q, self.X_[cand]))
+            top = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < width else np.argsort(d2, axis=1)
+            top_d2 = np.take_along_axis(d2, top, axis=1)
+            rank = np.argsort(top_d2, axis=1, kind='stable')
+            distances[start:start + block] = np.sqrt(np.maximum(np.take_along_axis(top_d2, rank, axis=1), 0))
+            indices[start:start + block] = np.take_along_axis(np.take_along_axis(cand, top, axis=1), rank, axis=1)
+        return (distances, indices) if return_distance else indices
+
+
+class ApproximateKNeighborsClassifier(ClassifierMixin, _ApproximateKNeighbors):
+    """Majority vote over the approximate neighbors (uniform weights, like KNeighborsClassifier)."""
+
+    def fit(self, X, y):
+        self.classes_, self._y_codes = np.unique(np.asarray(y), return_inverse=True)
+        self._fit_index(X)
+        return self
+
+    def predict_proba(self, X) -> np.ndarray:
+        indices = self.kneighbors(X, return_distance=False)
+        votes = np.zeros((indices.shape[0], len(self.classes_)))
+        np.add.at(votes, (np.arange(indices.shape[0])[:, None], self._y_codes[indices]), 1)
+        return votes / indices.shape[1]
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class ApproximateKNeighborsRegressor(RegressorMixin, _ApproximateKNeighbors):
+    """Mean target of the approximate neighbors (uniform weights, like KNeighborsRegressor)."""
+
+    def fit(self, X, y):
+        self._y = np.asarray(y, dtype=np.float64)
+        self._fit_index(X)
+        return self
+
+    def predict(self, X) -> np.ndarray:
+        return self._y[self.kneighbors(X, return_distance=False)].mean(axis=1)
+
+
+APPROXIMATE = {
+    KNeighborsClassifier: ApproximateKNeighborsClassifier,
+    KNeighborsRegressor: ApproximateKNeighborsRegressor,
+}
+
+
+def resolve_index_type(n_rows: int, index_type: str = KNN_INDEX) -> str:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown KNN_INDEX: {index_type}. Choose from {', '.join(INDEX_TYPES)}")
+    if index_type == 'auto':
+        return 'approximate' if n_rows >= KNN_APPROX_MIN_ROWS else 'ball_tree'
+    return index_type
+
+
+def build_knn(estimator_cls, n_rows: int, n_neighbors: int = KNN_NEIGHBORS):
+    """A KNeighborsClassifier/Regressor (or its approximate counterpart) using the
+    configured neighbor index."""
+    index_type = resolve_index_type(n_rows)
+    if index_type == 'approximate':
+        return APPROXIMATE[estimator_cls](n_neighbors=n_neighbors)
+    return estimator_cls(n_neighbors=n_neighbors, algorithm=index_type, leaf_size=KNN_LEAF_SIZE)
+
+
+def is_knn(model) -> bool:
+    return isinstance(model, (KNeighborsClassifier, KNeighborsRegressor, _ApproximateKNeighbors))
+
+
+def _kneighbors(model, X, k: int):
+    distances, indices = model.kneighbors(X, n_neighbors=k)
+    return np.asarray(distances), np.asarray(indices)
+
+
+def index_report(model, X_train, X_test, random_state: int = 0) -> dict:
+    """Neighbor index in use, with its recall@k against exact search and the query
+    latency of both, measured on up to KNN_RECALL_PROBES test rows."""
+    if not is_knn(model):
+        return None
+    k = min(model.n_neighbors, X_train.shape[0])
+    n_probe = min(KNN_RECALL_PROBES, X_test.shape[0])
+    probe_idx = np.random.default_rng(random_state).choice(X_test.shape[0], n_probe, replace=False)
+    probe = X_test.iloc[probe_idx] if hasattr(X_test, 'iloc') else X_test[probe_idx]
+
+    start = time.perf_counter()
+    _, found = _kneighbors(model, probe, k)
+    index_ms = (time.perf_counter() - start) * 1000
+
+    exact = NearestNeighbors(n_neighbors=k, algorithm='brute').fit(X_train)
+    start = time.perf_counter()
+    _, truth = exact.kneighbors(probe)
+    exact_ms = (time.perf_counter() - start) * 1000
+
+    hits = (found[:, :, None] == truth[:, None, :]).any(axis=2).sum()
+    approximate = isinstance(model, _ApproximateKNeighbors)
+    report = {
+        "index": "approximate" if approximate else model.algorithm,
+        "n_neighbors": k,
+        "probes": n_probe,
+        f"recall_at_{k}": round(float(hits / (n_probe * k)), 4) if n_probe else None,
+        "query_ms_per_1k": round(index_ms / n_probe * 1000, 2) if n_probe else None,
+        "exact_query_ms_per_1k": round(exact_ms / n_probe * 1000, 2) if n_probe else None,
+    }
+    report["leaf_size"] = model.leaf_size
+    if approximate:
+        report.update(projected_dims=model.n_components, candidates=model.n_candidates)
+    return report
+
+
+def cross_validate_knn(model, X, y, cv, is_regression: bool) -> np.ndarray:
+    """Fold scores (accuracy or R²) for a fitted KNN model from one neighbor graph over
+    ``X``: each validation row keeps its nearest neighbors that fall in the fold's
+    training rows. Equivalent to refitting per fold whenever those ``k`` neighbors are
+    among the graph's first ``K`` (K is sized from the fold count)."""
+    n = X.shape[0]
+    folds = list(cv.split(X, y))
+    k = model.n_neighbors
+    n_splits = len(folds)
+    wide = min(n, 2 * int(np.ceil(k * n_splits / max(1, n_splits - 1))) + 1)
+    _, graph = _kneighbors(model, X, wide)
+    # A training row is its own nearest neighbor; it is never in its own fold's training rows
+    y = np.asarray(y)
+    if is_regression:
+        values = y.astype(float)
+    else:
+        labels, codes = np.unique(y, return_inverse=True)
+
+    scores = []
+    for train_idx, val_idx in folds:
+        in_train = np.zeros(n, dtype=bool)
+        in_train[train_idx] = True
+        neighbors = graph[val_idx]
+        keep = in_train[neighbors]
+        keep &= np.cumsum(keep, axis=1) <= k
+        found = keep.sum(axis=1)
+        if is_regression:
+            fallback = values[train_idx].mean()
+            sums = np.where(keep, values[neighbors], 0.0).sum(axis=1)
+            pred = np.where(found > 0, sums / np.maximum(found, 1), fallback)
+            truth = values[val_idx]
+            total_var = np.var(truth)
+            scores.append(1 - np.mean((truth - pred) ** 2) / total_var if total_var else 0.0)
+        else:
+            votes = np.zeros((len(val_idx), len(labels)))
+            rows = np.repeat(np.arange(len(val_idx)), keep.sum(axis=1))
+            np.add.at(votes, (rows, codes[neighbors][keep]), 1)
+            fallback = np.bincount(codes[train_idx], minlength=len(labels)).argmax()
+            pred = np.where(found > 0, votes.argmax(axis=1), fallback)
+            scores.append(np.mean(pred == codes[val_idx]))
+    return np.asarray(scores)
@@ -0,0 +1,222 @@
+"""
+Graph executor for pipeline runs.
+``compile_graph`` turns a canvas (workspace ``nodes_json`` / ``edges_json``) into one
+PipelineRequest per Result node, with the data steps in the order the nodes are chained.
+``run_requests`` executes a set of requests as a tree: runs that load the same dataset
+with the same split and start with the same steps share that work — it is computed once
+and the state is copied where their chains diverge — and diverging branches run in
+parallel (PIPELINE_BATCH_CONCURRENCY threads). Each training run reserves its share of
+the CPU budget like a single run does.
+"""
+import os
+import copy
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from dotenv import load_dotenv
+
+from models import PipelineRequest
+from pipeline_steps import STEPS, plan_request
+from storage import read_dataset
+from thread_budget import thread_budget
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Branches of one batch or graph run executed at the same time (trainings split the CPU budget)
+PIPELINE_BATCH_CONCURRENCY = int(os.getenv("PIPELINE_BATCH_CONCURRENCY", "2"))
+
+# Request fields that decide the loaded, split data every step starts from, and how
+# the steps of the shared prefix are snapshotted
+_LOAD_FIELDS = ("file_id", "target_column", "test_size", "stratified", "random_state", "shuffle", "feature_dtype",
+                "step_previews")
+
+
+# ==================== Compile ====================
+
+def _node_values(node: dict) -> dict:
+    """Request fields set by one canvas node (see STEPS)."""
+    data = node.get("data") or {}
+    values = {}
+    for field, keys, default in STEPS[node["type"]].fields:
+        keys = keys if isinstance(keys, tuple) else (keys,)
+        values[field] = next((data[k] for k in keys if data.get(k) not in (None, "")), default)
+    return values
+
+
+def request_for_chain(chain: list, **extra) -> PipelineRequest:
+    """PipelineRequest for a Dataset → ... → Model chain of canvas nodes."""
+    values = {"scaler_type": "None", "test_size": 0.2}
+    steps = []
+    for node in chain:
+        step = STEPS.get(node.get("type"))
+        if step is None:
+            continue
+        values.update(_node_values(node))
+        if step.method:
+            steps.append(node["type"])
+    if not values.get("file_id"):
+        raise ValueError("Dataset node is empty")
+    if not values.get("target_column"):
+        raise ValueError("Model node has no target column")
+    return PipelineRequest(**values, steps=steps, **extra)
+
+
+def compile_graph(nodes: list, edges: list, **extra) -> dict:
+    """One PipelineRequest (or ``{"error": ...}``) per Result node fed by a Model node
+    whose chain of parents reaches a Dataset node; other Result nodes are skipped.
+    A node's parent is the source of its first incoming edge, as on the canvas."""
+    by_id = {node.get("id"): node for node in nodes}
+    parents = {}
+    for edge in edges:
+        parents.setdefault(edge.get("target"), edge.get("source"))
+
+    compiled = {}
+    for result in nodes:
+        if result.get("type") != "result":
+            continue
+        model = by_id.get(parents.get(result["id"]))
+        if model is None or model.get("type") != "model":
+            continue
+        chain, seen = [model], {result["id"], model["id"]}
+        node = by_id.get(parents.get(model["id"]))
+        while node is not None and node["id"] not in seen and chain[-1].get("type") != "dataset":
+            seen.add(node["id"])
+            chain.append(node)
+            node = by_id.get(parents.get(node["id"]))
+        if chain[-1].get("type") != "dataset":
+            continue
+        try:
+            compiled[result["id"]] = request_for_chain(chain[::-1], **extra)
+        except ValueError as e:
+            compiled[result["id"]] = {"error": str(e)}
+    return compiled
+
+
+# ==================== Execute ====================
+
+class _Branch:
+    """A node of the execution tree: one data step (the root loads and splits), the
+    steps that follow it, and the runs that train on its output."""
+
+    def __init__(self, step: str = None, values: dict = None):
+        self.step = step
+        self.values = values  # settings of the step (those of the first run through it)
+        self.children = {}  # (node type, settings) -> _Branch
+        self.leaves = []  # [run], each run is [ids, request, dataset, cache_key, notes]
+
+    def run_ids(self) -> list:
+        ids = [i for leaf in self.leaves for i in leaf[0]]
+        for child in self.children.values():
+            ids.extend(child.run_ids())
+        return ids
+
+
+def _step_key(node_type: str, values: dict):
+    step = STEPS[node_type]
+    settings = {field: values.get(field) for _, field in step.args}
+    if step.method == 'handle_class_imbalance':
+        settings["is_regression"] = values["is_regression"]  # skipped for regressors
+    return node_type, json.dumps(settings, sort_keys=True, default=str)
+
+
+def run_requests(requests: dict, user_id: str, concurrency: int = PIPELINE_BATCH_CONCURRENCY) -> dict:
+    """Run ``{run id: PipelineRequest}`` with shared prefixes; returns ``{run id: results}``
+    (``{"error": ...}`` for a failed run). Entries that are already errors pass through."""
+    from ml_service import MLService, REGRESSION_MODELS
+
+    results = {}
+    roots = {}  # load key -> (_Branch, request, dataset)
+    runs = {}  # identical requests train once
+    planned_steps = 0
+    for run_id, request in requests.items():
+        if isinstance(request, dict):
+            results[run_id] = request
+            continue
+        try:
+            dataset, cache_key, cached = MLService.resolve_request(request, user_id)
+        except ValueError as e:
+            results[run_id] = {"error": str(e)}
+            continue
+        if cached is not None:
+            results[run_id] = cached
+            continue
+
+        fingerprint = json.dumps(request.model_dump(exclude={"workflow_id", "workflow_snapshot"}),
+                                 sort_keys=True, default=str)
+        if fingerprint in runs:
+            runs[fingerprint][0].append(run_id)
+            continue
+
+        values = request.model_dump()
+        values["is_regression"] = request.model_type in REGRESSION_MODELS
+        load_key = json.dumps([values[f] for f in _LOAD_FIELDS] + [values["is_regression"]], default=str)
+        if load_key not in roots:
+            roots[load_key] = (_Branch(), request, dataset)
+        branch = roots[load_key][0]
+        planned, notes = plan_request(request)
+        for step in planned:
+            key = _step_key(step.node_type, values)
+            if key not in branch.children:
+                branch.children[key] = _Branch(step.node_type, values)
+            branch = branch.children[key]
+            planned_steps += 1
+        run = [[run_id], request, dataset, cache_key, notes]
+        runs[fingerprint] = run
+        branch.leaves.append(run)
+
+    peers = max(0, min(concurrency, len(runs)) - 1)
+    executed = [0]
+
+    def advance(branch: _Branch, service, root=None) -> list:
+        """Run the branch's step; returns the follow-up work for its children and runs."""
+        if root is not None:
+            request, dataset = root
+            service.load_request(request, read_dataset(dataset), dataset["filename"])
+        else:
+            service.run_step(branch.step, branch.values)
+            executed[0] += 1
+        work = [("branch", child) for child in branch.children.values()]
+        work += [("train", leaf) for leaf in branch.leaves]
+        # The last follow-up keeps this state; the others get copies
+        return [(kind, item, service if i == len(work) - 1 else copy.deepcopy(service))
+                for i, (kind, item) in enumerate(work)]
+
+    def train(run: list, service) -> None:
+        ids, request, dataset, cache_key, notes = run
+        service.pipeline_warnings.extend(notes)
+        with thread_budget.reserve(peers=peers) as service.compute:
+            service.n_jobs = service.compute["cores"]
+            result = service.train_and_evaluate(request, user_id, dataset, cache_key)
+        for run_id in ids:
+            results[run_id] = result
+
+    def fail(item, message: str):
+        for run_id in (item[0] if isinstance(item, list) else item.run_ids()):
+            results[run_id] = {"error": message}
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="pipeline-branch") as pool:
+        pending = {}
+        for branch, request, dataset in roots.values():
+            pending[pool.submit(advance, branch, MLService(), (request, dataset))] = branch
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    follow_up = future.result()
+                except Exception as e:
+                    logger.error(f"Pipeline branch failed: {e}")
+                    fail(item, str(e))
+                    continue
+                for kind, child, service in follow_up or ():
+                    task = advance if kind == "branch" else train
+                    pending[pool.submit(task, child, service)] = child
+
+    logger.info(
+        f"Ran {len(requests)} pipelines: {executed[0]} of {planned_steps} planned steps executed, "
+        f"{len(runs)} distinct runs"
+    )
+    return {run_id: results[run_id] for run_id in requests}
@@ -0,0 +1,171 @@
+"""
+Declarative registry of pipeline steps.
+STEPS describes every canvas node type: the PipelineRequest fields it sets (read from
+the node's data, falling back to the canvas defaults) and, for data steps, the MLService
+method that runs it. ``plan_steps`` puts a run's data steps in order — the canvas order
+for graph runs, DEFAULT_ORDER for plain requests — and is shared by training runs and
+dataset previews.
+"""
+from typing import NamedTuple, Optional
+
+
+class Step(NamedTuple):
+    """How one node type configures and runs a pipeline."""
+    # 'config' nodes only set request fields. Data steps run on the raw columns
+    # ('frame'), move the features into the numeric block ('encode'), need that
+    # block ('block'), or work on either ('any').
+    phase: str
+    fields: tuple = ()  # (request field, node data key(s), default when the node is present)
+    method: Optional[str] = None  # MLService method that runs the step
+    args: tuple = ()  # (method keyword, request field)
+    off: tuple = ()  # values of the first field that disable the step
+    result: Optional[str] = None  # key of the step's report in the pipeline results
+    failure: Optional[str] = None  # warning label when the step fails; None fails the run
+
+    def enabled(self, values: dict) -> bool:
+        return self.method is not None and values.get(self.fields[0][0]) not in self.off
+
+    def kwargs(self, values: dict) -> dict:
+        return {arg: values.get(field) for arg, field in self.args}
+
+
+STEPS = {
+    'dataset': Step('config', fields=(('file_id', ('file_id', 'file'), None),)),
+    'split': Step('config', fields=(
+        ('test_size', 'testSize', 0.2),
+        ('stratified', 'stratified', False),
+        ('random_state', 'randomState', 42),
+        ('shuffle', 'shuffle', True),
+    )),
+    'duplicate': Step(
+        'frame',
+        fields=(('duplicate_handling', 'duplicateHandling', 'first'),),
+        method='remove_duplicates',
+        args=(('strategy', 'duplicate_handling'), ('round_decimals', 'duplicate_round_decimals'),
+              ('normalize_text', 'duplicate_normalize_text'),
+              ('report_leakage', 'duplicate_report_leakage')),
+        off=('none',), result='duplicate_removal', failure='Duplicate removal',
+    ),
+    'outlier': Step(
+        'frame',
+        fields=(('outlier_method', 'outlierMethod', 'iqr'), ('outlier_action', 'outlierAction', 'clip')),
+        method='handle_outliers',
+        args=(('method', 'outlier_method'), ('action', 'outlier_action')),
+        off=('none',), result='outlier_handling', failure='Outlier handling',
+    ),
+    'imputation': Step(
+        'frame',
+        fields=(('imputer_strategy', 'strategy', 'mean'),),
+        method='apply_imputation', args=(('strategy', 'imputer_strategy'),), off=('none',),
+    ),
+    'encoding': Step(
+        'encode',
+        fields=(('encoder_strategy', 'strategy', 'onehot'),),
+        method='apply_encoding', args=(('strategy', 'encoder_strategy'),), off=('none',),
+    ),
+    'preprocessing': Step(
+        'any',
+        fields=(('scaler_type', 'scaler', 'None'),),
+        method='apply_scaling', args=(('scaler_type', 'scaler_type'),), off=('None', 'none'),
+    ),
+    'featureSelection': Step(
+        'any',
+        fields=(('feature_selection_method', 'featureSelectionMethod', 'variance'),
+                ('variance_threshold', 'varianceThreshold', 0.01),
+                ('correlation_threshold', 'correlationThreshold', 0.95)),
+        method='apply_feature_selection',
+        args=(('method', 'feature_selection_method'), ('variance_threshold', 'variance_threshold'),
+              ('correlation_threshold', 'correlation_threshold')),
+        off=('none',), result='feature_selection', failure='Feature selection',
+    ),
+    'featureEngineering': Step(
+        'block',
+        fields=(('feature_engineering_method', 'featureEngineeringMethod', 'polynomial'),
+                ('polynomial_degree', 'polynomialDegree', 2)),
+        method='apply_feature_engineering',
+        args=(('method', 'feature_engineering_method'), ('polynomial_degree', 'polynomial_degree')),
+        off=('none',), result='feature_engineering', failure='Feature engineering',
+    ),
+    'pca': Step(
+        'block',
+        fields=(('pca_components', 'pcaComponents', 0),),
+        method='apply_pca', args=(('n_components', 'pca_components'),),
+        off=(0, None), result='pca', failure='PCA',
+    ),
+    'classBalancing': Step(
+        'block',
+        fields=(('class_balancing', 'classBalancing', 'oversample'), ('balance_ratio', 'balanceRatio', 1.0)),
+        method='handle_class_imbalance',
+        args=(('method', 'class_balancing'), ('balance_ratio', 'balance_ratio')),
+        # 'class_weight' is applied by the model itself
+        off=('none', 'class_weight'), result='class_balancing', failure='Class balancing',
+    ),
+    'crossValidation': Step('config', fields=(('cv_folds', 'cvFolds', 0), ('cv_stratified', 'cvStratified', True))),
+    'model': Step('config', fields=(
+        ('target_column', 'targetColumn', None),
+        ('model_type', 'modelType', 'Logistic Regression'),
+    )),
+}
+
+DATA_STEPS = tuple(name for name, step in STEPS.items() if step.method)
+
+# Order of a request without ``steps`` (the fixed order runs always had)
+DEFAULT_ORDER = (
+    'duplicate', 'outlier', 'imputation', 'encoding', 'preprocessing',
+    'featureSelection', 'featureEngineering', 'pca', 'classBalancing',
+)
+# Part of every default-order run, even when switched off
+ALWAYS_PLANNED = ('imputation', 'encoding', 'preprocessing')
+
+
+class PlannedStep(NamedTuple):
+    node_type: str
+    implicit: bool = False  # added by plan_steps, not on the canvas
+
+
+def plan_steps(order, values: dict, implicit: bool = True):
+    """Order the data steps of one run; returns ``(planned steps, notes)``.
+
+    Steps keep the given order, except that block steps placed before the encoding
+    are moved just after it, and raw-column steps ('frame') placed after the encoding
+    or a block step are moved just before it. With ``implicit``, imputation and
+    encoding missing from the chain are added at that point too, with the strategies
+    in ``values``: models need numeric features, previews do not."""
+    steps = [name for name in order if name in DATA_STEPS]
+    notes = []
+    encode = next((i for i, name in enumerate(steps) if STEPS[name].phase == 'encode'), None)
+    early = [name for name in steps[:encode or 0] if STEPS[name].phase == 'block']
+    if early:
+        notes.append(
+            f"Ran {', '.join(early)} after {steps[encode]}: "
+            f"{'they need' if len(early) > 1 else 'it needs'} the encoded features."
+        )
+        steps = ([name for name in steps[:encode] if STEPS[name].phase != 'block']
+                 + [steps[encode]] + early + steps[encode + 1:])
+
+    boundary = next(
+        (i for i, name in enumerate(steps) if STEPS[name].phase in ('encode', 'block')), len(steps)
+    )
+    moved = [name for name in steps[boundary:] if STEPS[name].phase == 'frame']
+    if moved:
+        notes.append(
+            f"Ran {', '.join(moved)} before {steps[boundary]}: "
+            f"{'they need' if len(moved) > 1 else 'it needs'} the raw columns."
+        )
+        steps = steps[:boundary] + moved + [name for name in steps[boundary:] if STEPS[name].phase != 'frame']
+        boundary += len(moved)
+
+    planned = [PlannedStep(name) for name in steps]
+    if implicit:
+        missing = [name for name in ('imputation', 'encoding') if name not in steps]
+        planned[boundary:boundary] = [PlannedStep(name, implicit=True) for name in missing]
+    return planned, notes
+
+
+def plan_request(request):
+    """Planned data steps of a PipelineRequest and the notes about their order."""
+    values = request.model_dump()
+    order = request.steps
+    if order is None:
+        order = [name for name in DEFAULT_ORDER if name in ALWAYS_PLANNED or STEPS[name].enabled(values)]
+    return plan_steps(order, values)
@@ -0,0 +1,375 @@
+"""
+Columnar dataset profiling for the analysis modal and dataset metadata.
+All numeric columns are profiled together on one float block; datasets with more
+than PROFILE_SAMPLE_ROWS rows compute distribution statistics on a row sample and
+distinct counts with a KMV sketch (DistinctSketch, updated chunk by chunk on upload).
+"""
+import os
+import math
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "200000"))
+PROFILE_MAX_CORR_COLUMNS = int(os.getenv("PROFILE_MAX_CORR_COLUMNS", "50"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "64"))
+PROFILE_BINS = 10
+PROFILE_TOP_K = 5
+PROFILE_MAX_HISTOGRAMS = 10  # histograms listed at the top level for the analysis modal
+PREVIEW_ROWS_STORED = 500  # head rows kept on the dataset document (preview_until default)
+PREVIEW_CELLS_STORED = 50000  # cap for wide datasets so the document stays small
+SCHEMA_SAMPLE_VALUES = 5
+KMV_SKETCH_SIZE = 1024
+# Relative standard error of a KMV estimate
+KMV_RELATIVE_ERROR = 1 / math.sqrt(KMV_SKETCH_SIZE - 2)
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+# ==================== Helpers ====================
+
+def _native(value):
+    """Convert a scalar to a JSON/BSON-safe Python value."""
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return None if not np.isfinite(value) else round(value, 4)
+    if isinstance(value, (bool, int, str)):
+        return value
+    return str(value)
+
+
+def _column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return 'boolean'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'numeric'
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'datetime'
+    return 'text'
+
+
+class DistinctSketch:
+    """K-Minimum-Values sketch of a column's distinct non-null values: the
+    KMV_SKETCH_SIZE smallest value hashes seen. Updates merge, so a file can be
+    sketched chunk by chunk; the estimate is exact while fewer values were seen."""
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.saturated = False
+
+    def update(self, series: pd.Series):
+        values = series.dropna()
+        if _column_kind(values) == 'numeric':
+            # Chunks may parse the same column as int or float; hash one representation
+            values = values.astype(np.float64)
+        hashes = np.unique(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        merged = np.union1d(self.hashes, hashes[:KMV_SKETCH_SIZE])
+        if len(merged) > KMV_SKETCH_SIZE or len(hashes) > KMV_SKETCH_SIZE:
+            self.saturated = True
+        self.hashes = merged[:KMV_SKETCH_SIZE]
+
+    def estimate(self) -> int:
+        if not self.saturated:
+            return int(len(self.hashes))
+        kth = float(self.hashes[-1]) / float(np.iinfo(np.uint64).max)
+        return int(round((KMV_SKETCH_SIZE - 1) / kth))
+
+
+def approx_distinct(series: pd.Series) -> int:
+    """Distinct non-null values, estimated with a K-Minimum-Values sketch over row hashes.
+
+    Exact whenever the column has at most KMV_SKETCH_SIZE distinct values."""
+    sketch = DistinctSketch()
+    sketch.update(series)
+    return sketch.estimate()
+
+
+def _top_values(series: pd.Series, scale: float) -> list:
+    counts = series.value_counts(dropna=True).head(PROFILE_TOP_K)
+    return [
+        {"value": _native(value), "count": int(round(count * scale))}
+        for value, count in counts.items()
+    ]
+
+
+def _histograms(sample: np.ndarray, lo: np.ndarray, hi: np.ndarray, scale: float) -> tuple:
+    """Equal-width histograms for every column of ``sample`` in one bincount.
+
+    Returns (counts[p, bins], edges[p, bins + 1]). Constant columns get the same
+    +/-0.5 range that ``np.histogram`` uses."""
+    n_cols = sample.shape[1]
+    lo = np.where(np.isfinite(lo), lo, 0.0)
+    hi = np.where(np.isfinite(hi), hi, 0.0)
+    flat = hi == lo
+    lo = np.where(flat, lo - 0.5, lo)
+    hi = np.where(flat, hi + 0.5, hi)
+    edges = lo[:, None] + (hi - lo)[:, None] * np.linspace(0.0, 1.0, PROFILE_BINS + 1)[None, :]
+
+    with np.errstate(invalid='ignore'):
+        bin_idx = np.floor((sample - lo) / (hi - lo) * PROFILE_BINS)
+    valid = np.isfinite(bin_idx)
+    bin_idx = np.clip(bin_idx[valid], 0, PROFILE_BINS - 1).astype(np.int64)
+    col_idx = np.broadcast_to(np.arange(n_cols), sample.shape)[valid]
+    counts = np.bincount(col_idx * PROFILE_BINS + bin_idx, minlength=n_cols * PROFILE_BINS)
+    counts = np.rint(counts.reshape(n_cols, PROFILE_BINS) * scale).astype(np.int64)
+    return counts, edges
+
+
+def _correlations(sample: np.ndarray) -> np.ndarray:
+    if np.isnan(sample).any():
+        # Pairwise-complete correlations, as DataFrame.corr() computes them
+        corr = pd.DataFrame(sample).corr().to_numpy()
+    else:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.atleast_2d(np.corrcoef(sample, rowvar=False))
+    return np.where(np.isfinite(corr), corr, 0.0)
+
+
+# ==================== Profiling ====================
+
+def profile_dataframe(df: pd.DataFrame, random_state: int = 42, total_rows: int = None,
+                      null_counts: pd.Series = None, distinct_counts: dict = None) -> dict:
+    """Profile every column of ``df``: nulls, distinct counts, top values and, for
+    numeric columns, min/max/mean/std, quantiles and a histogram, plus a
+    correlation matrix over the numeric columns.
+
+    When ``df`` is itself a row sample of a larger file (streaming upload), pass the
+    file's ``total_rows``, exact ``null_counts`` and ``distinct_counts`` estimated over
+    the whole file; counts are then scaled up and the profile is flagged approximate.
+
+    The output keeps the ``histograms`` / ``correlation_matrix`` / ``columns`` /
+    ``rows_count`` keys that the analysis modal reads."""
+    n_rows = len(df)
+    if n_rows > PROFILE_SAMPLE_ROWS:
+        rng = np.random.RandomState(random_state)
+        sample_idx = np.sort(rng.choice(n_rows, PROFILE_SAMPLE_ROWS, replace=False))
+        sample_df = df.iloc[sample_idx]
+    else:
+        sample_idx = None
+        sample_df = df
+    total_rows = max(total_rows or n_rows, n_rows)
+    approximate = total_rows > len(sample_df)
+    scale = total_rows / len(sample_df) if len(sample_df) else 1.0
+
+    numeric_cols = [c for c in df.columns if _column_kind(df[c]) == 'numeric']
+
+    # One float block for all numeric columns; NaN marks missing values
+    block = np.empty((n_rows, len(numeric_cols)), dtype=np.float64)
+    for j, col in enumerate(numeric_cols):
+        block[:, j] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+    sample = block[sample_idx] if sample_idx is not None else block
+
+    numeric_stats = {}
+    if numeric_cols:
+        # All-NaN columns make the nan-reductions warn; they come out as None
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            mins = np.nanmin(block, axis=0) if n_rows else np.full(len(numeric_cols), np.nan)
+            maxs = np.nanmax(block, axis=0) if n_rows else np.full(len(numeric_cols), np.nan)
+            means = np.nanmean(block, axis=0)
+            stds = np.nanstd(block, axis=0, ddof=1)
+            quantiles = np.nanquantile(sample, QUANTILES, axis=0) if len(sample) else \
+                np.full((len(QUANTILES), len(numeric_cols)), np.nan)
+        hist_counts, hist_edges = _histograms(sample, mins, maxs, scale)
+        for j, col in enumerate(numeric_cols):
+            numeric_stats[col] = {
+                "min": _native(mins[j]),
+                "max": _native(maxs[j]),
+                "mean": _native(means[j]),
+                "std": _native(stds[j]),
+                "quantiles": {f"p{int(q * 100)}": _native(quantiles[i, j]) for i, q in enumerate(QUANTILES)},
+                "histogram": [
+                    {
+                        "bin": f"{hist_edges[j, i]:.1f} - {hist_edges[j, i + 1]:.1f}",
+                        "count": int(hist_counts[j, i]),
+                    }
+                    for i in range(PROFILE_BINS)
+                ],
+            }
+
+    if null_counts is None:
+        null_counts = df.isna().sum()
+    column_profiles = []
+    for col in df.columns:
+        series = df[col]
+        if distinct_counts is not None:
+            distinct = int(distinct_counts[col])
+        else:
+            distinct = approx_distinct(series) if approximate else int(series.nunique(dropna=True))
+        profile = {
+            "name": str(col),
+            "dtype": str(series.dtype),
+            "kind": _column_kind(series),
+            "nulls": int(null_counts[col]),
+            "distinct": distinct,
+            "top_values": _top_values(sample_df[col], scale),
+        }
+        profile.update(numeric_stats.get(col, {}))
+        column_profiles.append(profile)
+
+    histograms = [
+        {"column": str(col), "data": numeric_stats[col]["histogram"]}
+        for col in numeric_cols[:PROFILE_MAX_HISTOGRAMS]
+    ]
+
+    correlation_matrix = {"columns": [], "values": []}
+    corr_cols = numeric_cols[:PROFILE_MAX_CORR_COLUMNS]
+    if len(corr_cols) > 1 and len(sample):
+        corr = _correlations(sample[:, :len(corr_cols)])
+        correlation_matrix = {
+            "columns": [str(c) for c in corr_cols],
+            "values": np.round(corr, 4).tolist(),
+        }
+
+    return {
+        "histograms": histograms,
+        "correlation_matrix": correlation_matrix,
+        "columns": [str(c) for c in df.columns],
+        "rows_count": total_rows,
+        "column_profiles": column_profiles,
+        "approximate": approximate,
+        "sample_rows": len(sample_df),
+    }
+
+
+# ==================== Stored dataset metadata ====================
+
+def _semantic_type(kind: str, series: pd.Series, distinct: int, non_null: int,
+                   approximate: bool = False) -> str:
+    """Coarse role of a column: binary, categorical, identifier, continuous, free_text, ...
+
+    With an ``approximate`` (sketched) distinct count, a column is a key when the count
+    is within two standard errors of the sketch of ``non_null``."""
+    if kind in ('boolean', 'datetime'):
+        return kind
+    if distinct <= 2:
+        return 'binary'
+    small_cardinality = distinct <= max(20, int(0.05 * non_null))
+    if approximate:
+        is_key = non_null > 20 and distinct >= (1 - 2 * KMV_RELATIVE_ERROR) * non_null
+    else:
+        is_key = non_null > 20 and distinct == non_null
+    if kind == 'numeric':
+        if pd.api.types.is_integer_dtype(series):
+            if is_key:
+                return 'identifier'
+            if small_cardinality:
+                return 'categorical'
+        return 'continuous'
+    if is_key:
+        return 'identifier'
+    return 'categorical' if small_cardinality else 'free_text'
+
+
+def build_schema(df: pd.DataFrame, profile: dict) -> list:
+    """Typed per-column schema in the ``col_stats`` shape used by preview_until,
+    extended with the semantic type and a few sample values. Null and distinct counts
+    come from ``profile``, so they cover the whole file when ``df`` is a sample."""
+    schema = []
+    for col, col_profile in zip(df.columns, profile["column_profiles"]):
+        series = df[col]
+        kind = col_profile["kind"]
+        non_null = profile["rows_count"] - col_profile["nulls"]
+        stats = {"min": col_profile.get("min"), "max": col_profile.get("max"), "mean": col_profile.get("mean")}
+        if kind == 'boolean' and non_null:
+            values = series.dropna().astype(float)
+            stats = {"min": _native(values.min()), "max": _native(values.max()), "mean": _native(values.mean())}
+        schema.append({
+            "name": col_profile["name"],
+            "type": {'numeric': 'numeric', 'boolean': 'numeric', 'datetime': 'datetime'}.get(kind, 'text'),
+            "semantic_type": _semantic_type(kind, series, col_profile["distinct"], non_null,
+                                            profile.get("approximate", False)),
+            "dtype": col_profile["dtype"],
+            "nulls": col_profile["nulls"],
+            "unique": col_profile["distinct"],
+            **stats,
+            "samples": [_native(v) for v in series.dropna().head(50).unique()[:SCHEMA_SAMPLE_VALUES]],
+        })
+    return schema
+
+
+def format_column(values, text_chars: int = 200) -> list:
+    """One column (Series or 1-D array) as JSON-ready values: missing values as None,
+    numbers as int or float (rounded, non-finite as None), booleans as bool and
+    anything else as text cut to ``text_chars``."""
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    kind = values.dtype.kind if isinstance(values.dtype, np.dtype) else None
+    if kind in ('i', 'u', 'b'):
+        return values.tolist()
+    if kind == 'f':
+        return [val if math.isfinite(val) else None for val in values.round(4).tolist()]
+    column = []
+    for val in values.tolist():
+        try:
+            is_nan = bool(pd.isna(val))
+        except (TypeError, ValueError):
+            is_nan = False
+        if is_nan:
+            column.append(None)
+        elif isinstance(val, (bool, np.bool_)):
+            column.append(bool(val))
+        elif isinstance(val, (int, np.integer)):
+            column.append(int(val))
+        elif isinstance(val, (float, np.floating)):
+            column.append(round(float(val), 4) if math.isfinite(val) else None)
+        else:
+            column.append(str(val)[:text_chars])
+    return column
+
+
+def format_rows(df: pd.DataFrame, max_rows: int) -> list:
+    """First ``max_rows`` rows as JSON-ready dicts (floats rounded, long text truncated),
+    converted column by column."""
+    sample_df = df.head(max_rows)
+    names = [str(col) for col in sample_df.columns]
+    columns = [format_column(sample_df.iloc[:, i]) for i in range(sample_df.shape[1])]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def dataset_metadata(df: pd.DataFrame, head: pd.DataFrame = None, total_rows: int = None,
+                     null_counts: pd.Series = None, distinct_counts: dict = None) -> dict:
+    """Everything stored on a dataset document at upload: profile, schema and head rows.
+
+    ``df`` may be a row sample of the file, with ``head`` its first rows and
+    ``total_rows`` / ``null_counts`` / ``distinct_counts`` counted over the whole file."""
+    profile = profile_dataframe(df, total_rows=total_rows, null_counts=null_counts,
+                                distinct_counts=distinct_counts)
+    head = df if head is None else head
+    head_rows = min(PREVIEW_ROWS_STORED, max(10, PREVIEW_CELLS_STORED // max(1, head.shape[1])))
+    return {
+        "profile": profile,
+        "schema": build_schema(df, profile),
+        "preview_rows": format_rows(head, head_rows),
+    }
+
+
+# ==================== Per-dataset cache ====================
+
+_profile_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def get_cached_profile(dataset_id: str):
+    """Return the cached profile for a dataset id, refreshing its LRU position."""
+    profile = _profile_cache.get(dataset_id)
+    if profile is not None:
+        _profile_cache.move_to_end(dataset_id)
+    return profile
+
+
+def cache_profile(dataset_id: str, profile: dict):
+    """Store a profile, evicting the least recently used entries past PROFILE_CACHE_SIZE."""
+    _profile_cache[dataset_id] = profile
+    _profile_cache.move_to_end(dataset_id)
+    while len(_profile_cache) > PROFILE_CACHE_SIZE:
+        _profile_cache.popitem(last=False)
+
+
+def invalidate_profile(dataset_id: str):
+    _profile_cache.pop(dataset_id, None)
@@ -0,0 +1,159 @@
+"""
+Response encoding for the API.
+FastJSONResponse (the app's default response class) serializes with orjson when it is
+installed, NumPy arrays and scalars included, and otherwise with the stdlib encoder and a
+``default`` hook that converts NumPy values as it meets them; either way there is no
+separate conversion walk over the payload (the fallback walks it only when it holds
+NaN or infinity, to write them as null as orjson does). Endpoints with large payloads (pipeline
+results, dataset previews, profiles) return it directly, which also skips FastAPI's
+jsonable_encoder pass. CompressionMiddleware compresses bodies of at least
+RESPONSE_COMPRESS_MIN_BYTES with brotli (when installed and accepted) or gzip.
+"""
+import os
+import json
+import datetime
+
+import anyio.to_thread
+import numpy as np
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, IdentityResponder
+
+try:
+    import orjson
+except ImportError:  # stdlib json with a NumPy-aware default hook
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+load_dotenv()
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+# Bodies this large are compressed in a worker thread instead of on the event loop
+RESPONSE_COMPRESS_THREAD_BYTES = 128 * 1024
+
+# Already compressed, or streamed in small chunks that must reach the client at once
+_UNCOMPRESSED_TYPES = (
+    "application/gzip", "application/x-gzip", "application/zip", "application/x-ndjson",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "text/event-stream", "image/*", "audio/*", "video/*", "font/woff", "font/woff2",
+)
+
+
+# ==================== JSON ====================
+
+def _default(obj):
+    """Values neither encoder handles natively."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return _finite_or_null(jsonable_encoder(obj))
+
+
+def _finite_or_null(obj):
+    """``obj`` with NaN and infinity replaced by None (the stdlib fallback's retry)."""
+    if isinstance(obj, dict):
+        return {k: _finite_or_null(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite_or_null(item) for item in obj]
+    if isinstance(obj, np.ndarray):
+        return _finite_or_null(obj.tolist())
+    if isinstance(obj, (float, np.floating)):
+        return float(obj) if np.isfinite(obj) else None
+    return obj
+
+
+def dump_json(content) -> bytes:
+    """``content`` as compact UTF-8 JSON, with NaN and infinity written as null.
+    orjson does that itself; the stdlib fallback retries on a copy with them replaced."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    try:
+        return _stdlib_dumps(content)
+    except ValueError:  # out-of-range float somewhere
+        return _stdlib_dumps(_finite_or_null(content))
+
+
+def _stdlib_dumps(content) -> bytes:
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with ``dump_json``."""
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+
+# ==================== Compression ====================
+
+class _BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int, exclude_content_types: tuple):
+        super().__init__(app, minimum_size, exclude_content_types=exclude_content_types)
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if len(body) >= RESPONSE_COMPRESS_THREAD_BYTES:
+            return await anyio.to_thread.run_sync(self._compress_body, body, more_body)
+        return self._compress_body(body, more_body)
+
+    def _compress_body(self, body: bytes, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        out = self._compressor.process(body)
+        return out + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware that prefers brotli when the client accepts it and the
+    ``brotli`` package is installed."""
+
+    def __init__(self, app, minimum_size: int = RESPONSE_COMPRESS_MIN_BYTES,
+                 compresslevel: int = RESPONSE_GZIP_LEVEL, brotli_quality: int = RESPONSE_BROTLI_QUALITY):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel,
+                         thread_minimum_size=RESPONSE_COMPRESS_THREAD_BYTES,
+                         exclude_content_types=_UNCOMPRESSED_TYPES)
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and brotli is not None and _accepts_brotli(Headers(scope=scope)):
+            responder = _BrotliResponder(
+                self.app, self.minimum_size, self.brotli_quality, self.exclude_content_types
+            )
+            await responder(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def _accepts_brotli(headers: Headers) -> bool:
+    for coding in headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() == "br":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def encoding_info() -> dict:
+    """Encoders in use, for the metrics endpoint."""
+    return {
+        "json": "orjson" if orjson is not None else "json",
+        "compression": ["br", "gzip"] if brotli is not None else ["gzip"],
+        "min_bytes": RESPONSE_COMPRESS_MIN_BYTES,
+    }
@@ -0,0 +1,143 @@
+"""
+Pipeline result cache.
+A pipeline run is keyed by a canonical hash of its PipelineRequest plus the dataset's
+``content_hash``, so re-running an unchanged workflow on unchanged data returns the
+stored result instead of retraining. Results live in an in-process LRU in front of the
+``pipeline_results`` collection; both expire after RESULT_CACHE_TTL_SECONDS.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import bson
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import results_collection
+from models import PipelineResultInDB
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "128"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Larger results are kept in memory only (MongoDB documents are capped at 16 MB)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Request fields that do not change the computed result
+KEY_EXCLUDED_FIELDS = {"file_id", "workflow_id", "workflow_snapshot", "bypass_cache"}
+
+_lock = threading.Lock()
+_results: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, results)
+_stats = {"hits": 0, "store_hits": 0, "misses": 0, "evictions": 0, "stored": 0, "too_large": 0}
+
+
+def result_key(request, content_hash: str):
+    """Cache key for a run, or None when the run cannot be cached
+    (dataset stored without a content hash, or an unseeded split)."""
+    if not content_hash or getattr(request, 'random_state', None) is None:
+        return None
+    fields = request.model_dump(exclude=KEY_EXCLUDED_FIELDS)
+    canonical = json.dumps(fields, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{content_hash}:{canonical}".encode()).hexdigest()
+
+
+def _remember(key: str, results: dict, expires_at: float):
+    with _lock:
+        _results[key] = (expires_at, results)
+        _results.move_to_end(key)
+        while len(_results) > RESULT_CACHE_SIZE:
+            _results.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def get_cached_result(key: str):
+    """Stored result for ``key`` (memory first, then MongoDB), or None."""
+    with _lock:
+        entry = _results.get(key)
+        if entry is not None and entry[0] > time.time():
+            _results.move_to_end(key)
+            _stats["hits"] += 1
+            return {**entry[1], "cached": True}
+        _results.pop(key, None)
+
+    try:
+        doc = results_collection.find_one({"cache_key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+    except Exception as e:
+        logger.warning(f"Result cache lookup failed: {e}")
+        doc = None
+    if doc is None:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    expires_at = doc["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    _remember(key, doc["results_json"], expires_at.timestamp())
+    with _lock:
+        _stats["store_hits"] += 1
+    return {**doc["results_json"], "cached": True}
+
+
+def to_native(obj):
+    """``obj`` with NumPy values converted to the Python types BSON can store."""
+    if isinstance(obj, dict):
+        return {k: to_native(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [to_native(item) for item in obj]
+    elif isinstance(obj, (np.integer,)):
+        return int(obj)
+    elif isinstance(obj, (np.floating,)):
+        return float(obj)
+    elif isinstance(obj, (np.bool_,)):
+        return bool(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return obj
+
+
+def store_result(key: str, user_id: str, request, content_hash: str, results: dict):
+    """Keep a fresh result in memory and persist it when it fits in a document.
+    Only the persisted copy is converted to native types (see ``to_native``)."""
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=RESULT_CACHE_TTL_SECONDS)
+    _remember(key, results, expires_at.timestamp())
+
+    record = PipelineResultInDB(
+        user_id=user_id,
+        workflow_id=getattr(request, 'workflow_id', None),
+        results_json=to_native(results),
+        cache_key=key,
+        content_hash=content_hash,
+        created_at=now,
+        expires_at=expires_at,
+    ).model_dump(exclude={"id"})
+    try:
+        if len(bson.encode(record)) > RESULT_CACHE_MAX_BYTES:
+            with _lock:
+                _stats["too_large"] += 1
+            return
+        results_collection.replace_one({"cache_key": key}, record, upsert=True)
+        with _lock:
+            _stats["stored"] += 1
+    except Exception as e:
+        logger.warning(f"Result cache write failed: {e}")
+
+
+def result_cache_metrics() -> dict:
+    with _lock:
+        lookups = _stats["hits"] + _stats["store_hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "size": len(_results),
+            "max_size": RESULT_CACHE_SIZE,
+            "ttl_seconds": RESULT_CACHE_TTL_SECONDS,
+            "hit_rate": round((_stats["hits"] + _stats["store_hits"]) / lookups, 4) if lookups else None,
+        }
@@ -1,23 +1,17 @@
-import os
-import requests
 import pandas as pd
 import io
+import hashlib
+from bson import ObjectId
 from dotenv import load_dotenv
-import cloudinary
-import cloudinary.uploader
 from datetime import datetime, timezone
 from database import datasets_collection
+from profiling import dataset_metadata
+from storage import storage_key, save_dataset_bytes
+from downloads import fetch
 
 # Load environment variables
 load_dotenv()
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
-
 # Sample Datasets to Download
 DATASETS = {
     "Titanic_Survival.csv": "https://raw.githubusercontent.com/datasciencedojo/datasets/master/titanic.csv",
@@ -48,40 +42,37 @@ def seed_datasets():
 
         print(f"⬇️  Downloading {name}...")
         try:
-            response = requests.get(url)
-            response.raise_for_status()
+            content = fetch(url)
             
             # Process CSV
             if name == "Wine_Quality.csv":
-                df = pd.read_csv(io.BytesIO(response.content), sep=";")
+                df = pd.read_csv(io.BytesIO(content), sep=";")
             elif name in HEADERS:
-                df = pd.read_csv(io.BytesIO(response.content), header=None, names=HEADERS[name])
+                df = pd.read_csv(io.BytesIO(content), header=None, names=HEADERS[name])
             else:
-                df = pd.read_csv(io.BytesIO(response.content))
+                df = pd.read_csv(io.BytesIO(content))
             
             # Convert back to CSV for upload
             csv_buffer = io.StringIO()
             df.to_csv(csv_buffer, index=False)
             csv_content = csv_buffer.getvalue().encode('utf-8')
 
-            print(f"☁️  Uploading {name} to Cloudinary...")
-            upload_result = cloudinary.uploader.upload(
-                csv_content,
-                resource_type="raw",
-                folder="neuroflow/samples",
-                public_id=name.rsplit('.', 1)[0],
-                overwrite=True
-            )
+            print(f"☁️  Uploading {name} to storage...")
+            dataset_id = ObjectId()
+            stored = save_dataset_bytes(csv_content, storage_key("samples", dataset_id, name))
 
             # Metadata
             dataset_meta = {
+                "_id": dataset_id,
                 "user_id": "system",
                 "is_sample": True,
                 "filename": name,
-                "cloudinary_url": upload_result["secure_url"],
-                "cloudinary_public_id": upload_result["public_id"],
+                **stored,  # storage_backend, storage_key and backend-specific fields
                 "columns": list(df.columns),
                 "shape": {"rows": df.shape[0], "cols": df.shape[1]},
+                "content_hash": hashlib.sha256(csv_content).hexdigest(),
+                "size_bytes": len(csv_content),
+                **dataset_metadata(df),  # profile, schema and head rows
                 "created_at": datetime.now(timezone.utc)
             }
 
@@ -0,0 +1,324 @@
+"""
+Dataset file storage.
+Backends for Cloudinary, a local filesystem/volume and an S3-compatible object store,
+selected with STORAGE_BACKEND. Each backend writes the fields it needs onto the
+dataset document, and reads/deletes are dispatched on the document's
+``storage_backend`` (documents without one predate this module and are Cloudinary).
+"""
+import os
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import downloads
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary").lower()
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", os.path.join(os.path.dirname(__file__), "data"))
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. MinIO / R2; unset for AWS
+S3_REGION = os.getenv("S3_REGION")
+# Files above this size go to Cloudinary in chunks of this size
+CLOUDINARY_CHUNK_BYTES = 20 * 1024 * 1024
+
+
+def storage_key(folder: str, dataset_id, filename: str) -> str:
+    """Object key for a dataset file: ``neuroflow/<folder>/<dataset id>/<filename>``.
+    The id keeps re-uploads of a filename from overwriting (or deleting) each other's file."""
+    return f"neuroflow/{folder}/{dataset_id}/{os.path.basename(filename)}"
+
+
+class CloudinaryStorage:
+    """Raw uploads to Cloudinary; reads go over HTTPS to the stored ``cloudinary_url``
+    through the shared download client (full reads are checked against ``content_hash``)."""
+    name = "cloudinary"
+
+    def __init__(self):
+        import cloudinary  # imported with the backend, not at API startup
+        import cloudinary.uploader
+        self.uploader = cloudinary.uploader
+        cloudinary.config(
+            cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key=os.getenv("CLOUDINARY_API_KEY"),
+            api_secret=os.getenv("CLOUDINARY_API_SECRET")
+        )
+
+    def _fields(self, upload_result: dict) -> dict:
+        return {
+            "storage_backend": self.name,
+            "storage_key": upload_result["public_id"],
+            "cloudinary_url": upload_result["secure_url"],
+            "cloudinary_public_id": upload_result["public_id"],
+        }
+
+    def put_file(self, path: str, key: str) -> dict:
+        folder, filename = key.rsplit('/', 1)
+        upload_result = self.uploader.upload_large(
+            path,
+            resource_type="raw",
+            folder=folder,
+            public_id=filename.rsplit('.', 1)[0],  # filename without extension
+            overwrite=True,
+            chunk_size=CLOUDINARY_CHUNK_BYTES,
+        )
+        return self._fields(upload_result)
+
+    def put_bytes(self, data: bytes, key: str) -> dict:
+        folder, filename = key.rsplit('/', 1)
+        upload_result = self.uploader.upload(
+            data,
+            resource_type="raw",
+            folder=folder,
+            public_id=filename.rsplit('.', 1)[0],
+            overwrite=True
+        )
+        return self._fields(upload_result)
+
+    def read(self, dataset: dict, start: int = None, end: int = None) -> bytes:
+        headers = _range_header(start, end)
+        expected = dataset.get("content_hash") if headers is None else None
+        return downloads.fetch(dataset["cloudinary_url"], headers=headers, expected_sha256=expected)
+
+    def open(self, dataset: dict):
+        return downloads.open_stream(dataset["cloudinary_url"])
+
+    def download(self, dataset: dict, path: str):
+        downloads.download_to_file(dataset["cloudinary_url"], path, expected_sha256=dataset.get("content_hash"))
+
+    def delete(self, dataset: dict):
+        self.uploader.destroy(dataset["cloudinary_public_id"], resource_type="raw")
+
+
+class LocalStorage:
+    """Files under LOCAL_STORAGE_DIR (a local disk or a volume shared with the workers)."""
+    name = "local"
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIR):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def put_file(self, path: str, key: str) -> dict:
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target)
+        return {"storage_backend": self.name, "storage_key": key}
+
+    def put_bytes(self, data: bytes, key: str) -> dict:
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        return {"storage_backend": self.name, "storage_key": key}
+
+    def read(self, dataset: dict, start: int = None, end: int = None) -> bytes:
+        with open(self._path(dataset["storage_key"]), 'rb') as f:
+            if start is None and end is None:
+                return f.read()
+            f.seek(start or 0)
+            return f.read(-1 if end is None else end - (start or 0) + 1)
+
+    def open(self, dataset: dict):
+        return open(self._path(dataset["storage_key"]), 'rb')
+
+    def download(self, dataset: dict, path: str):
+        shutil.copyfile(self._path(dataset["storage_key"]), path)
+
+    def delete(self, dataset: dict):
+        path = self._path(dataset["storage_key"])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class S3Storage:
+    """S3-compatible object store (AWS S3, MinIO, R2, ...). Requires ``boto3``;
+    credentials come from the standard AWS environment variables."""
+    name = "s3"
+
+    def __init__(self, bucket: str = S3_BUCKET):
+        try:
+            import boto3
+        except ImportError:
+            raise ValueError("boto3 is required for STORAGE_BACKEND=s3 (pip install boto3)")
+        if not bucket:
+            raise ValueError("S3_BUCKET must be set for STORAGE_BACKEND=s3")
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL, region_name=S3_REGION)
+
+    def put_file(self, path: str, key: str) -> dict:
+        # Managed transfer: multipart for large files, streamed from disk
+        self.client.upload_file(path, self.bucket, key)
+        return {"storage_backend": self.name, "storage_key": key, "storage_bucket": self.bucket}
+
+    def put_bytes(self, data: bytes, key: str) -> dict:
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+        return {"storage_backend": self.name, "storage_key": key, "storage_bucket": self.bucket}
+
+    def _get_object(self, dataset: dict, start: int = None, end: int = None) -> dict:
+        kwargs = {"Bucket": dataset.get("storage_bucket", self.bucket), "Key": dataset["storage_key"]}
+        headers = _range_header(start, end)
+        if headers:
+            kwargs["Range"] = headers["Range"]
+        return self.client.get_object(**kwargs)
+
+    def read(self, dataset: dict, start: int = None, end: int = None) -> bytes:
+        return self._get_object(dataset, start, end)["Body"].read()
+
+    def open(self, dataset: dict):
+        return self._get_object(dataset)["Body"]
+
+    def download(self, dataset: dict, path: str):
+        self.client.download_file(dataset.get("storage_bucket", self.bucket), dataset["storage_key"], path)
+
+    def delete(self, dataset: dict):
+        self.client.delete_object(Bucket=dataset.get("storage_bucket", self.bucket), Key=dataset["storage_key"])
+
+
+def _range_header(start: int = None, end: int = None) -> dict:
+    """HTTP ``Range`` header for an inclusive byte range, or None for the whole object."""
+    if start is None and end is None:
+        return None
+    return {"Range": f"bytes={start or 0}-{'' if end is None else end}"}
+
+
+# ==================== Backend selection ====================
+
+BACKENDS = {
+    CloudinaryStorage.name: CloudinaryStorage,
+    LocalStorage.name: LocalStorage,
+    S3Storage.name: S3Storage,
+}
+_instances = {}
+
+
+def get_storage(name: str = None):
+    """Backend instance by name (default: STORAGE_BACKEND), created on first use."""
+    name = (name or STORAGE_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}. Choose from {', '.join(BACKENDS)}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def storage_for(dataset: dict):
+    """Backend holding a dataset document's file."""
+    return get_storage(dataset.get("storage_backend") or CloudinaryStorage.name)
+
+
+def dataset_location(dataset: dict) -> dict:
+    """Where a dataset document's file lives, as recorded on the document at upload."""
+    return {
+        "backend": dataset.get("storage_backend") or CloudinaryStorage.name,
+        "key": dataset.get("storage_key") or dataset.get("cloudinary_public_id"),
+        "url": dataset.get("cloudinary_url"),
+        "content_hash": dataset.get("content_hash"),
+        "size_bytes": dataset.get("size_bytes"),
+    }
+
+
+def save_dataset_file(path: str, key: str) -> dict:
+    """Store a file from disk with the configured backend; returns dataset document fields."""
+    return get_storage().put_file(path, key)
+
+
+def save_dataset_bytes(data: bytes, key: str) -> dict:
+    """Store in-memory bytes with the configured backend; returns dataset document fields."""
+    return get_storage().put_bytes(data, key)
+
+
+# ==================== Local dataset cache ====================
+
+class DatasetCache:
+    """LRU of whole dataset files keyed by ``content_hash`` and bounded in bytes.
+    Enabled per process (pipeline workers), so repeated runs on a dataset skip the download."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()  # content_hash -> bytes
+        self._lock = threading.Lock()
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, content_hash: str):
+        with self._lock:
+            data = self._files.get(content_hash)
+            if data is None:
+                self.stats["misses"] += 1
+                return None
+            self._files.move_to_end(content_hash)
+            self.stats["hits"] += 1
+            return data
+
+    def put(self, content_hash: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if content_hash in self._files:
+                return
+            self._files[content_hash] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._files.popitem(last=False)
+                self.size -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {**self.stats, "files": len(self._files), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+_dataset_cache = None
+
+
+def enable_dataset_cache(max_bytes: int):
+    """Cache whole-file reads in this process (no-op for a zero size)."""
+    global _dataset_cache
+    _dataset_cache = DatasetCache(max_bytes) if max_bytes > 0 else None
+
+
+def dataset_cache_metrics():
+    return _dataset_cache.metrics() if _dataset_cache else None
+
+
+def read_dataset(dataset: dict, start: int = None, end: int = None) -> bytes:
+    """Whole file (or an inclusive byte range) of a dataset document."""
+    content_hash = dataset.get("content_hash")
+    cacheable = _dataset_cache is not None and content_hash and start is None and end is None
+    if cacheable:
+        data = _dataset_cache.get(content_hash)
+        if data is not None:
+            return data
+    try:
+        data = storage_for(dataset).read(dataset, start, end)
+        if cacheable:
+            _dataset_cache.put(content_hash, data)
+        return data
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Storage read error for {dataset.get('filename')}: {e}")
+        raise ValueError(f"File not found in storage: {dataset.get('filename')}")
+
+
+def open_dataset(dataset: dict):
+    """Binary file-like stream over a dataset document's file; the caller closes it."""
+    return storage_for(dataset).open(dataset)
+
+
+def download_dataset(dataset: dict, path: str):
+    """Stream a dataset document's file to ``path`` without holding it in memory."""
+    storage_for(dataset).download(dataset, path)
+
+
+def delete_dataset_file(dataset: dict):
+    storage_for(dataset).delete(dataset)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from fingerprint import RowFingerprintIndex
+
+
+def test_groups_match_drop_duplicates():
+    df = pd.DataFrame({"a": [1, 2, 1, 3, 2, 1], "b": ["x", "y", "x", "x", "y", None]})
+    index = RowFingerprintIndex(df)
+    for keep in ("first", "last", False):
+        assert index.duplicated(keep=keep).tolist() == df.duplicated(keep=keep).tolist()
+
+
+def test_target_splits_groups_but_not_feature_hashes():
+    X = pd.DataFrame({"a": [1, 1, 2]})
+    index = RowFingerprintIndex(X, target=[0, 1, 0])
+    assert index.duplicated(keep=False).tolist() == [False, False, False]
+    assert index.feature_hashes[0] == index.feature_hashes[1]
+
+
+def test_overlap_checks_every_row_with_the_hash():
+    train = RowFingerprintIndex(pd.DataFrame({"a": [5, 7]}))
+    test = RowFingerprintIndex(pd.DataFrame({"a": [7]}))
+    # Force a collision: the first train row shares the hash but not the value
+    train.hashes = train.feature_hashes = np.array([9, 9], dtype=np.uint64)
+    test.hashes = test.feature_hashes = np.array([9], dtype=np.uint64)
+    assert test.overlap(train).tolist() == [True]
+    assert test.overlap(train, other_rows=np.array([True, False])).tolist() == [False]
+
+
+def test_leakage_ignores_the_target():
+    train = RowFingerprintIndex(pd.DataFrame({"a": [1, 2]}), target=[0, 0])
+    test = RowFingerprintIndex(pd.DataFrame({"a": [1, 3]}), target=[1, 0])
+    assert test.overlap(train).tolist() == [False, False]
+    assert test.overlap(train, features_only=True).tolist() == [True, False]
@@ -0,0 +1,50 @@
+from pipeline_steps import plan_steps
+
+
+def _names(planned):
+    return [step.node_type for step in planned]
+
+
+def test_keeps_valid_order():
+    planned, notes = plan_steps(['duplicate', 'outlier', 'imputation', 'encoding', 'pca'], {})
+    assert _names(planned) == ['duplicate', 'outlier', 'imputation', 'encoding', 'pca']
+    assert notes == []
+
+
+def test_moves_frame_steps_before_encoding():
+    planned, notes = plan_steps(['encoding', 'outlier', 'preprocessing'], {}, implicit=False)
+    assert _names(planned) == ['outlier', 'encoding', 'preprocessing']
+    assert notes == ["Ran outlier before encoding: it needs the raw columns."]
+
+
+def test_moves_block_steps_after_encoding():
+    planned, notes = plan_steps(['classBalancing', 'outlier', 'duplicate', 'encoding', 'imputation'], {})
+    assert _names(planned) == ['outlier', 'duplicate', 'imputation', 'encoding', 'classBalancing']
+    assert not any(step.implicit for step in planned)
+    assert notes == [
+        "Ran classBalancing after encoding: it needs the encoded features.",
+        "Ran imputation before encoding: it needs the raw columns.",
+    ]
+
+
+def test_moves_several_block_steps_in_order():
+    planned, notes = plan_steps(['pca', 'featureEngineering', 'imputation', 'encoding'], {})
+    assert _names(planned) == ['imputation', 'encoding', 'pca', 'featureEngineering']
+    assert notes == ["Ran pca, featureEngineering after encoding: they need the encoded features."]
+
+
+def test_adds_missing_imputation_and_encoding_before_block_steps():
+    planned, _ = plan_steps(['preprocessing', 'pca', 'outlier'], {})
+    assert _names(planned) == ['preprocessing', 'outlier', 'imputation', 'encoding', 'pca']
+    assert [step.implicit for step in planned] == [False, False, True, True, False]
+
+
+def test_previews_add_nothing():
+    planned, notes = plan_steps(['imputation', 'preprocessing'], {}, implicit=False)
+    assert _names(planned) == ['imputation', 'preprocessing']
+    assert notes == []
+
+
+def test_ignores_config_and_unknown_steps():
+    planned, _ = plan_steps(['dataset', 'split', 'viewDataset', 'encoding', 'model'], {})
+    assert _names(planned) == ['imputation', 'encoding']
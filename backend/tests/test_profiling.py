@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from profiling import DistinctSketch, KMV_SKETCH_SIZE, approx_distinct, dataset_metadata
+
+
+def test_sketch_is_exact_below_its_size():
+    sketch = DistinctSketch()
+    sketch.update(pd.Series([1, 2, 2, None]))
+    sketch.update(pd.Series([2.0, 3.0]))
+    assert sketch.estimate() == 3
+
+
+def test_sketch_merges_chunks_like_one_pass():
+    values = pd.Series(np.arange(200_000))
+    sketch = DistinctSketch()
+    for start in range(0, len(values), 30_000):
+        sketch.update(values[start:start + 30_000])
+    assert sketch.estimate() == approx_distinct(values)
+    assert abs(sketch.estimate() - len(values)) < 0.1 * len(values)
+
+
+def test_sampled_profile_uses_file_wide_counts():
+    n = 50_000
+    sample = pd.DataFrame({"id": np.arange(5_000), "code": [f"C{i}" for i in range(5_000)]})
+    metadata = dataset_metadata(
+        sample, total_rows=n, null_counts=pd.Series({"id": 0, "code": 0}),
+        distinct_counts={"id": n, "code": n},
+    )
+    schema = {col["name"]: col for col in metadata["schema"]}
+    assert schema["id"]["unique"] == n
+    assert schema["id"]["semantic_type"] == "identifier"
+    assert schema["code"]["semantic_type"] == "identifier"
+
+
+def test_exact_profile_needs_every_value_distinct():
+    df = pd.DataFrame({"id": list(range(KMV_SKETCH_SIZE)) + [0]})
+    assert dataset_metadata(df)["schema"][0]["semantic_type"] != "identifier"
+
+
+def test_sketched_key_allows_the_sketch_error():
+    n = 50_000
+    sample = pd.DataFrame({"id": np.arange(5_000), "half": np.arange(5_000)})
+    metadata = dataset_metadata(
+        sample, total_rows=n, null_counts=pd.Series({"id": 0, "half": 0}),
+        distinct_counts={"id": int(n * 0.95), "half": n // 2},
+    )
+    types = {col["name"]: col["semantic_type"] for col in metadata["schema"]}
+    assert types == {"id": "identifier", "half": "continuous"}
@@ -0,0 +1,94 @@
+"""
+CPU budget for pipeline runs.
+Concurrent runs (parallel requests, batch runs) split TRAIN_CPU_CORES between them:
+each run reserves a share when it starts and passes it to estimators as ``n_jobs``,
+and the process-wide BLAS/OpenMP thread pools are capped at the per-run share so
+numpy/scipy kernels and OpenMP estimators do not oversubscribe the machine.
+"""
+import os
+import threading
+import logging
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from threadpoolctl import threadpool_limits
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS / Windows
+        return os.cpu_count() or 1
+
+
+TRAIN_CPU_CORES = int(os.getenv("TRAIN_CPU_CORES", "0")) or _available_cores()
+
+
+class ThreadBudget:
+    """Hands out core shares to concurrent runs. A run gets an equal share of all
+    cores among itself and the other active runs (or the ``peers`` it expects to run
+    alongside, e.g. the rest of a batch), bounded by what is still free, and at least one."""
+
+    def __init__(self, cores: int = TRAIN_CPU_CORES):
+        self.cores = max(1, cores)
+        self._lock = threading.Lock()
+        self._shares = {}  # run token -> cores
+        self._native_limit = None
+        self.stats = {"runs": 0, "peak_concurrent_runs": 0}
+
+    def _apply_native_limit(self):
+        """Cap BLAS/OpenMP pools (process-wide) at the fair share for the active runs,
+        and at no more than the largest share handed out."""
+        if self._shares:
+            limit = max(1, min(self.cores // len(self._shares), max(self._shares.values())))
+        else:
+            limit = self.cores
+        if limit == self._native_limit:
+            return
+        try:
+            threadpool_limits(limits=limit)
+            self._native_limit = limit
+        except Exception as e:
+            logger.warning(f"Could not limit native thread pools: {e}")
+
+    @contextmanager
+    def reserve(self, peers: int = 0):
+        """Reserve cores for one run; yields a report dict whose ``cores`` is the run's n_jobs."""
+        token = object()
+        with self._lock:
+            free = self.cores - sum(self._shares.values())
+            fair = self.cores // (max(len(self._shares), peers) + 1)
+            share = max(1, min(fair, free))
+            self._shares[token] = share
+            self.stats["runs"] += 1
+            self.stats["peak_concurrent_runs"] = max(self.stats["peak_concurrent_runs"], len(self._shares))
+            self._apply_native_limit()
+            report = {
+                "cores": share,
+                "concurrent_runs": len(self._shares),
+                "native_threads": self._native_limit,
+                "cpu_cores": self.cores,
+            }
+        try:
+            yield report
+        finally:
+            with self._lock:
+                del self._shares[token]
+                self._apply_native_limit()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "cpu_cores": self.cores,
+                "active_runs": len(self._shares),
+                "reserved_cores": sum(self._shares.values()),
+                "native_threads": self._native_limit,
+            }
+
+
+thread_budget = ThreadBudget()
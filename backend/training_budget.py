@@ -0,0 +1,293 @@
+"""
+Time and iteration budgets for model training.
+Every fit runs against a Budget: the request's ``time_budget_seconds`` (capped at
+TRAIN_TIME_BUDGET_SECONDS) and optional ``max_iterations``. Iterative models stop when
+the budget runs out, when their validation score stops improving, or at the iteration
+cap — gradient boosting through ``fit(monitor=...)``, XGBoost through a training
+callback, MLP / histogram boosting / SGD / random forests through warm-started chunks.
+Other models, and cross-validation, run in a child process that is terminated if the
+budget expires, unless the run asked for no budget of its own and the data is smaller
+than TRAIN_CANCEL_MIN_BYTES (a child costs a few tenths of a second and a copy of the
+data; small fits finish well within the server ceiling). Forking the threaded API
+process can deadlock, so children are forked only inside pipeline pool workers and
+otherwise started with TRAIN_CANCEL_START_METHOD (a forkserver, warmed at startup by
+``start_cancel_server``). The fitted model is then pinned to the iterations it
+reached, so cross-validation clones train the same amount.
+"""
+import os
+import time
+import signal
+import multiprocessing
+
+import numpy as np
+from dotenv import load_dotenv
+
+import estimators as sk
+
+load_dotenv()
+
+# Server-wide ceiling; a request can only ask for less
+TRAIN_TIME_BUDGET_SECONDS = float(os.getenv("TRAIN_TIME_BUDGET_SECONDS", "600"))
+# How cancellable children start outside pool workers: 'forkserver', 'spawn' or 'none'
+# (train in-process, not cancellable). Both copy the data to the child through a pipe.
+TRAIN_CANCEL_START_METHOD = os.getenv("TRAIN_CANCEL_START_METHOD", "forkserver")
+# Training data below this size trains in-process unless the run set its own budget
+TRAIN_CANCEL_MIN_BYTES = int(os.getenv("TRAIN_CANCEL_MIN_BYTES", str(2 * 1024 * 1024)))
+# Boosting rounds without validation improvement before stopping
+EARLY_STOPPING_ROUNDS = 10
+VALIDATION_FRACTION = 0.1
+
+# Warm-start chunking per model family: the parameter that sizes training, whether it
+# counts iterations per fit() call or in total, and iterations per chunk. SGD restarts
+# its early-stopping patience on every fit(), so its chunks must outlast the patience.
+_CHUNKED = [
+    (("MLPClassifier", "MLPRegressor"), "max_iter", "per_fit", 20),
+    (("SGDClassifier", "SGDRegressor"), "max_iter", "per_fit", 20),
+    (("HistGradientBoostingClassifier", "HistGradientBoostingRegressor"), "max_iter", "total", 25),
+    (("RandomForestClassifier", "RandomForestRegressor"), "n_estimators", "total", 10),
+]
+
+
+class TrainingTimeout(ValueError):
+    """A non-iterative model did not finish within its time budget and was cancelled."""
+
+
+class Budget:
+    """Deadline plus optional iteration cap for one training run."""
+
+    def __init__(self, seconds: float = None, max_iterations: int = None):
+        self.seconds = min(seconds, TRAIN_TIME_BUDGET_SECONDS) if seconds else TRAIN_TIME_BUDGET_SECONDS
+        self.requested = bool(seconds)  # the run asked for a budget below the server ceiling
+        self.max_iterations = max_iterations
+        self.started = time.monotonic()
+        self.deadline = self.started + self.seconds
+        self.hit = False  # set once the deadline has been observed
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        if time.monotonic() >= self.deadline:
+            self.hit = True
+        return self.hit
+
+    def cap(self, iterations: int) -> int:
+        return min(iterations, self.max_iterations) if self.max_iterations else iterations
+
+    def report(self, stop_reason: str, iterations: int = None) -> dict:
+        return {
+            "stop_reason": stop_reason,
+            "iterations": iterations,
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+            "time_budget_seconds": self.seconds,
+            "max_iterations": self.max_iterations,
+        }
+
+    def finish(self, done: int, target: int, configured: int, stopped_early: str = "early_stopping") -> dict:
+        """Report for an iterative fit that ran ``done`` of ``target`` iterations
+        (``configured`` before the iteration cap was applied)."""
+        if self.hit:
+            return self.report("time_budget", done)
+        if done < target:
+            return self.report(stopped_early, done)
+        return self.report("max_iterations" if target < configured else "completed", done)
+
+
+# ==================== Iterative models ====================
+
+def _fit_gradient_boosting(model, X, y, fit_params, budget: Budget) -> dict:
+    configured = model.n_estimators
+    target = budget.cap(configured)
+    model.set_params(n_estimators=target, n_iter_no_change=EARLY_STOPPING_ROUNDS,
+                     validation_fraction=VALIDATION_FRACTION)
+    model.fit(X, y, monitor=lambda i, est, env: budget.expired(), **fit_params)
+    done = model.n_estimators_
+    model.set_params(n_estimators=done, n_iter_no_change=None)
+    return budget.finish(done, target, configured)
+
+
+def _fit_xgboost(model, X, y, fit_params, budget: Budget) -> dict:
+    from xgboost.callback import TrainingCallback
+
+    class BudgetCallback(TrainingCallback):
+        def after_iteration(self, booster, epoch, evals_log):
+            return budget.expired()
+
+    configured = model.n_estimators or 100
+    target = budget.cap(configured)
+    fit_idx, val_idx = sk.train_test_split(np.arange(len(y)), test_size=VALIDATION_FRACTION, random_state=0)
+    weights = fit_params.get('sample_weight')
+    model.set_params(n_estimators=target, early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                     callbacks=[BudgetCallback()])
+    model.fit(
+        X[fit_idx], y[fit_idx],
+        sample_weight=None if weights is None else np.asarray(weights)[fit_idx],
+        eval_set=[(X[val_idx], y[val_idx])], verbose=False,
+    )
+    rounds = model.get_booster().num_boosted_rounds()
+    best = getattr(model, 'best_iteration', None)
+    done = best + 1 if best is not None else rounds
+    model.set_params(n_estimators=done, early_stopping_rounds=None, callbacks=None)
+    return budget.finish(rounds, target, configured)
+
+
+def _fit_in_chunks(model, X, y, fit_params, budget: Budget, size_param: str, counting: str, chunk: int) -> dict:
+    """Warm-started fits of ``chunk`` iterations until the model stops on its own
+    (early stopping / convergence), reaches its iteration target, or runs out of time."""
+    configured = getattr(model, size_param)
+    target = budget.cap(configured)
+    params = {"warm_start": True}
+    if getattr(model, 'early_stopping', False) is True and model.random_state is None:
+        params["random_state"] = 0  # same validation split in every chunk
+    model.set_params(**params)
+
+    done = 0
+    stopped = False
+    while done < target:
+        step = min(chunk, target - done)
+        model.set_params(**{size_param: step if counting == "per_fit" else done + step})
+        model.fit(X, y, **fit_params)
+        if counting == "per_fit":
+            reached = done + int(model.n_iter_)
+        elif size_param == "n_estimators":
+            reached = len(model.estimators_)
+        else:
+            reached = int(model.n_iter_)
+        stopped = reached - done < step
+        done = reached
+        if stopped or (done < target and budget.expired()):
+            break
+
+    # Clones (cross-validation) train the reached iterations in one fit
+    model.set_params(warm_start=False, **{size_param: max(done, 1)})
+    stop_reason = "early_stopping" if getattr(model, 'early_stopping', False) is True else "converged"
+    return budget.finish(done, target, configured, stopped_early=stop_reason)
+
+
+# ==================== Cancellable children ====================
+
+_fork_children = False  # set in pipeline pool workers, which run nothing but pipelines
+
+
+def fork_children():
+    """Start cancellable children with fork (no copy of the data) in this process."""
+    global _fork_children
+    _fork_children = True
+
+
+def _cancel_context():
+    method = "fork" if _fork_children else TRAIN_CANCEL_START_METHOD
+    if method not in multiprocessing.get_all_start_methods():
+        return None
+    ctx = multiprocessing.get_context(method)
+    if method == "forkserver":
+        # Children fork from a server that has sklearn imported once
+        ctx.set_forkserver_preload(["training_budget", *sorted(set(sk.REGISTRY.values()))])
+    return ctx
+
+
+def _nbytes(X) -> int:
+    if hasattr(X, "memory_usage"):  # DataFrame
+        return int(X.memory_usage(index=False).sum())
+    if hasattr(X, "nbytes"):
+        return int(X.nbytes)
+    data = getattr(X, "data", None)  # scipy sparse
+    return int(getattr(data, "nbytes", 0))
+
+
+def needs_child(X, budget: Budget) -> bool:
+    """Whether training on ``X`` must be cancellable (see the module docstring)."""
+    return budget.requested or _nbytes(X) >= TRAIN_CANCEL_MIN_BYTES
+
+
+def _noop():
+    return None
+
+
+def start_cancel_server():
+    """Start the forkserver (it imports sklearn once) ahead of the first cancellable
+    fit, so its startup does not count against that fit's budget."""
+    if not _fork_children and _cancel_context() is not None:
+        run_cancellable(_noop, (), Budget(), "Forkserver warm-up")
+
+
+def _child_run(func, args, conn):
+    os.setpgrp()  # its own group, so cancelling also stops any joblib workers it starts
+    try:
+        conn.send(("ok", func(*args)))
+    except Exception as e:
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+
+def run_cancellable(func, args: tuple, budget: Budget, what: str):
+    """``func(*args)`` in a child process; raises TrainingTimeout (and terminates the
+    child) if ``budget`` runs out first. Runs in-process when cancelling is off."""
+    ctx = _cancel_context()
+    if ctx is None:
+        return func(*args)
+    receiver, sender = ctx.Pipe(duplex=False)
+    # Not daemonic: cross-validation may start joblib workers of its own
+    child = ctx.Process(target=_child_run, args=(func, args, sender), name="cancellable-fit")
+    child.start()
+    sender.close()
+    try:
+        if not receiver.poll(budget.remaining()):
+            budget.hit = True
+            raise TrainingTimeout(
+                f"{what} was cancelled after exceeding the {budget.seconds:g}s training time budget"
+            )
+        status, payload = receiver.recv()
+    except EOFError:
+        raise ValueError(f"Training process exited unexpectedly (exit code {child.exitcode})")
+    finally:
+        receiver.close()
+        if child.is_alive():
+            try:
+                os.killpg(child.pid, signal.SIGTERM)
+            except ProcessLookupError:  # not in its own group yet
+                pass
+            child.terminate()
+        child.join()
+    if status == "error":
+        raise ValueError(payload)
+    return payload
+
+
+def _fit(model, X, y, fit_params):
+    model.fit(X, y, **fit_params)
+    return model
+
+
+def _cross_val_score(model, X, y, kwargs):
+    return sk.cross_val_score(model, X, y, **kwargs)
+
+
+def cross_val_score_with_budget(model, X, y, budget: Budget, **kwargs):
+    """``cross_val_score`` on what is left of ``budget``; raises TrainingTimeout if it runs out."""
+    if not needs_child(X, budget):
+        return _cross_val_score(model, X, y, kwargs)
+    return run_cancellable(_cross_val_score, (model, X, y, kwargs), budget, "Cross-validation")
+
+
+# ==================== Entry point ====================
+
+def fit_with_budget(model, X, y, fit_params: dict, budget: Budget):
+    """Train ``model`` within ``budget``. Returns ``(fitted model, training report)``;
+    raises TrainingTimeout when a non-iterative model is cancelled."""
+    from neighbors import is_knn  # imports sklearn; kept off the API import path
+
+    if isinstance(model, (sk.GradientBoostingClassifier, sk.GradientBoostingRegressor)):
+        return model, _fit_gradient_boosting(model, X, y, fit_params, budget)
+    if type(model).__name__ in ("XGBClassifier", "XGBRegressor"):
+        return model, _fit_xgboost(model, X, y, fit_params, budget)
+    for names, size_param, counting, chunk in _CHUNKED:
+        if isinstance(model, tuple(sk.resolve(name) for name in names)):
+            return model, _fit_in_chunks(model, X, y, fit_params, budget, size_param, counting, chunk)
+    if is_knn(model) or not needs_child(X, budget):
+        # Fitting a KNN model only builds the neighbor index
+        model.fit(X, y, **fit_params)
+    else:
+        model = run_cancellable(_fit, (model, X, y, fit_params), budget, type(model).__name__)
+    return model, budget.report("completed")
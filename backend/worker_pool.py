@@ -0,0 +1,297 @@
+"""
+Persistent pool of pipeline worker processes.
+With PIPELINE_WORKERS > 0, pipeline runs execute in long-lived worker processes instead
+of API threads. Each worker is started once (spawned, so it opens its own MongoDB
+clients), imports ml_service and preloads the sklearn estimator modules before taking
+jobs, gets an equal share of TRAIN_CPU_CORES, and keeps a local cache of dataset files
+(WORKER_DATASET_CACHE_MB). A worker is replaced after WORKER_MAX_JOBS jobs or once its
+resident memory passes WORKER_MAX_RSS_MB, so leaks and fragmentation stay bounded.
+"""
+import os
+import sys
+import time
+import queue
+import signal
+import logging
+import threading
+import multiprocessing
+
+from dotenv import load_dotenv
+
+from thread_budget import TRAIN_CPU_CORES
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "0"))  # 0 = run pipelines in API threads
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "50"))
+WORKER_MAX_RSS_MB = float(os.getenv("WORKER_MAX_RSS_MB", "1024"))
+WORKER_DATASET_CACHE_MB = float(os.getenv("WORKER_DATASET_CACHE_MB", "256"))
+WORKER_START_METHOD = os.getenv("WORKER_START_METHOD", "spawn")
+# How long a job waits for a free (or still starting) worker
+WORKER_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("WORKER_ACQUIRE_TIMEOUT_SECONDS", "300"))
+
+
+def _rss_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+# ==================== Worker process ====================
+
+def _run_pipeline_job(payload: dict) -> dict:
+    from ml_service import MLService
+    from models import PipelineRequest
+    return MLService().run_pipeline(PipelineRequest(**payload["request"]), payload["user_id"])
+
+
+def _run_requests_job(payload: dict) -> dict:
+    from pipeline_graph import run_requests
+    from models import PipelineRequest
+    requests = {run_id: PipelineRequest(**r) for run_id, r in payload["requests"].items()}
+    return run_requests(requests, payload["user_id"])
+
+
+JOBS = {"run_pipeline": _run_pipeline_job, "run_requests": _run_requests_job}
+
+
+def _worker_main(conn, settings: dict):
+    """Worker loop: warm up, then answer ``(job, payload)`` messages until told to stop."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the API process decides when workers stop
+    import estimators
+    import storage
+    import ml_service  # noqa: F401  (pandas, numpy and the service's own modules)
+    import training_budget
+    from thread_budget import thread_budget
+
+    thread_budget.cores = settings["cores"]
+    training_budget.fork_children()  # single-threaded between jobs, so forking is safe
+    storage.enable_dataset_cache(settings["dataset_cache_bytes"])
+    estimators.preload()
+
+    def health() -> dict:
+        return {"rss_bytes": _rss_bytes(), "dataset_cache": storage.dataset_cache_metrics()}
+
+    conn.send(("ready", None, health()))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        job, payload = message
+        try:
+            reply = ("ok", JOBS[job](payload))
+        except ValueError as e:
+            reply = ("value_error", str(e))
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        conn.send((*reply, health()))
+    conn.close()
+
+
+# ==================== Pool ====================
+
+class _Worker:
+    def __init__(self, ctx, settings: dict, generation: int):
+        self.conn, child_conn = ctx.Pipe()
+        # Not daemonic: training_budget forks children to cancel slow fits
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, settings), name="pipeline-worker")
+        self.process.start()
+        child_conn.close()
+        self.generation = generation
+        self.started_at = time.time()
+        self.ready_seconds = None
+        self.jobs = 0
+        self.busy = False
+        self.health = {}
+
+    def wait_ready(self, timeout: float):
+        start = time.perf_counter()
+        if not self.conn.poll(timeout):
+            raise RuntimeError("Pipeline worker did not start in time")
+        status, _, self.health = self.conn.recv()
+        self.ready_seconds = round(time.perf_counter() - start, 3)
+
+    def call(self, job: str, payload: dict):
+        self.conn.send((job, payload))
+        status, value, self.health = self.conn.recv()
+        self.jobs += 1
+        return status, value
+
+    def stop(self, timeout: float = 5):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+    def status(self) -> dict:
+        rss = self.health.get("rss_bytes")
+        return {
+            "pid": self.process.pid,
+            "alive": self.process.is_alive(),
+            "busy": self.busy,
+            "jobs": self.jobs,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "startup_seconds": self.ready_seconds,
+            "rss_mb": round(rss / 2 ** 20, 1) if rss else None,
+            "dataset_cache": self.health.get("dataset_cache"),
+        }
+
+
+class WorkerPool:
+    """Fixed-size pool of warm pipeline workers. ``run`` blocks the calling thread
+    (run it in a threadpool) until a worker is free and has finished the job."""
+
+    def __init__(self, size: int = PIPELINE_WORKERS, max_jobs: int = WORKER_MAX_JOBS,
+                 max_rss_mb: float = WORKER_MAX_RSS_MB, dataset_cache_mb: float = WORKER_DATASET_CACHE_MB,
+                 start_method: str = WORKER_START_METHOD):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_mb * 2 ** 20
+        self.dataset_cache_mb = dataset_cache_mb
+        self.start_method = start_method
+        self._ctx = multiprocessing.get_context(start_method)
+        self._settings = {
+            "cores": max(1, TRAIN_CPU_CORES // max(1, size)),
+            "dataset_cache_bytes": int(dataset_cache_mb * 2 ** 20),
+        }
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stopped = False
+        self.stats = {"jobs": 0, "failed_jobs": 0, "recycled": 0, "crashed": 0, "start_failures": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def start(self):
+        """Start all workers in the background; jobs wait for the first one to be ready."""
+        for _ in range(self.size):
+            self._spawn_async()
+
+    def _spawn_async(self):
+        threading.Thread(target=self._spawn, name="spawn-pipeline-worker", daemon=True).start()
+
+    def _spawn(self):
+        if self._stopped:
+            return
+        with self._lock:
+            generation = self._generation
+        try:
+            worker = _Worker(self._ctx, self._settings, generation)
+            worker.wait_ready(WORKER_ACQUIRE_TIMEOUT_SECONDS)
+        except Exception as e:
+            with self._lock:
+                self.stats["start_failures"] += 1
+            logger.error(f"Could not start pipeline worker: {e}")
+            return
+        with self._lock:
+            if self._stopped:
+                worker.stop()
+                return
+            self._workers.add(worker)
+        logger.info(f"Pipeline worker {worker.process.pid} ready in {worker.ready_seconds}s")
+        self._idle.put(worker)
+
+    def _retire(self, worker: _Worker, reason: str):
+        """Stop a worker and start its replacement."""
+        with self._lock:
+            self._workers.discard(worker)
+            self.stats[reason] += 1
+        logger.info(f"Retiring pipeline worker {worker.process.pid} ({reason}) after {worker.jobs} jobs")
+        threading.Thread(target=worker.stop, daemon=True).start()
+        self._spawn_async()
+
+    def _needs_recycle(self, worker: _Worker) -> bool:
+        rss = worker.health.get("rss_bytes") or 0
+        return (worker.jobs >= self.max_jobs or rss >= self.max_rss_bytes
+                or worker.generation < self._generation)
+
+    def run(self, job: str, payload: dict):
+        """Run ``job`` on a worker; ValueErrors raised in the worker are re-raised here."""
+        try:
+            worker = self._idle.get(timeout=WORKER_ACQUIRE_TIMEOUT_SECONDS)
+        except queue.Empty:
+            raise RuntimeError("No pipeline worker available")
+        worker.busy = True
+        try:
+            status, value = worker.call(job, payload)
+        except (EOFError, OSError):
+            # The worker died mid-job (e.g. killed for memory); replace it
+            self._retire(worker, "crashed")
+            with self._lock:
+                self.stats["failed_jobs"] += 1
+            raise RuntimeError("Pipeline worker exited unexpectedly")
+        worker.busy = False
+        with self._lock:
+            self.stats["jobs"] += 1
+            self.stats["failed_jobs"] += status != "ok"
+        if self._needs_recycle(worker):
+            self._retire(worker, "recycled")
+        else:
+            self._idle.put(worker)
+
+        if status == "value_error":
+            raise ValueError(value)
+        if status == "error":
+            raise RuntimeError(value)
+        return value
+
+    def recycle(self) -> int:
+        """Replace every worker: idle ones now, busy ones when their job finishes."""
+        with self._lock:
+            self._generation += 1
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for worker in idle:
+            self._retire(worker, "recycled")
+        return len(idle)
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+    def status(self) -> dict:
+        with self._lock:
+            workers = [w.status() for w in self._workers]
+            stats = dict(self.stats)
+        return {
+            "config": {
+                "workers": self.size,
+                "max_jobs": self.max_jobs,
+                "max_rss_mb": self.max_rss_bytes / 2 ** 20,
+                "dataset_cache_mb": self.dataset_cache_mb,
+                "cores_per_worker": self._settings["cores"],
+                "start_method": self.start_method,
+            },
+            "ready": self._idle.qsize(),
+            "stats": stats,
+            "workers": sorted(workers, key=lambda w: w["pid"] or 0),
+        }
+
+
+pipeline_pool = WorkerPool()
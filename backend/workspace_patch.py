@@ -0,0 +1,87 @@
+"""
+Patch-based workspace autosave.
+A batch of add/update/remove operations on nodes and edges (by id) is compiled into
+one MongoDB pipeline update, so a canvas edit rewrites only what changed and keeps
+``node_count`` / ``edge_count`` / ``version`` in sync atomically.
+"""
+from datetime import datetime
+
+# Array field and count field per operation target
+TARGETS = {
+    "node": ("nodes_json", "node_count"),
+    "edge": ("edges_json", "edge_count"),
+}
+
+
+def collapse_ops(ops: list) -> dict:
+    """Reduce ops in order to ``{target: (upserts by id, removed ids)}``.
+    add and update are both upserts (full replacement); a later op on the same id wins."""
+    collapsed = {target: ({}, set()) for target in TARGETS}
+    for op in ops:
+        action, target = op.op.split('_', 1)
+        upserts, removed = collapsed[target]
+        if action == 'remove':
+            upserts.pop(op.id, None)
+            removed.add(op.id)
+        else:
+            upserts[op.id] = {**op.value, "id": op.id}
+            removed.discard(op.id)
+    return collapsed
+
+
+def _patched_array(field: str, upserts: dict, removed: set) -> dict:
+    """Aggregation expression for ``field`` with removals, in-place replacements and
+    appended new items. All expressions read the pre-update document."""
+    current = {"$ifNull": [f"${field}", []]}
+    kept = {"$filter": {"input": current, "cond": {"$not": {"$in": ["$$this.id", {"$literal": list(removed)}]}}}}
+    if not upserts:
+        return kept
+    # Replace existing items where they are, so canvas order is preserved
+    replaced = {
+        "$map": {
+            "input": kept,
+            "in": {
+                "$switch": {
+                    "branches": [
+                        {"case": {"$eq": ["$$this.id", {"$literal": item_id}]}, "then": {"$literal": item}}
+                        for item_id, item in upserts.items()
+                    ],
+                    "default": "$$this",
+                }
+            },
+        }
+    }
+    appended = {
+        "$filter": {
+            "input": {"$literal": list(upserts.values())},
+            "cond": {"$not": {"$in": ["$$this.id", {"$map": {"input": current, "in": "$$this.id"}}]}},
+        }
+    }
+    return {"$concatArrays": [replaced, appended]}
+
+
+def patch_pipeline(ops: list, name: str = None, now: datetime = None) -> list:
+    """Pipeline update applying ``ops``, bumping ``version`` and refreshing counts."""
+    changes = {}
+    for target, (upserts, removed) in collapse_ops(ops).items():
+        if upserts or removed:
+            field, _ = TARGETS[target]
+            changes[field] = _patched_array(field, upserts, removed)
+    if name is not None:
+        changes["name"] = {"$literal": name}
+
+    bookkeeping = {
+        count_field: {"$size": {"$ifNull": [f"${field}", []]}}
+        for field, count_field in TARGETS.values()
+    }
+    bookkeeping["version"] = {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+    bookkeeping["updated_at"] = now
+    stages = [{"$set": changes}] if changes else []
+    return stages + [{"$set": bookkeeping}]
+
+
+def version_filter(base_version: int) -> dict:
+    """Optimistic-concurrency clause; documents saved before versioning count as 0."""
+    if base_version == 0:
+        return {"$or": [{"version": 0}, {"version": {"$exists": False}}]}
+    return {"version": base_version}
@@ -30,6 +30,8 @@ import WorkspaceDashboard from './components/WorkspaceDashboard';
 import { AuthProvider, useAuth, getAuthHeaders } from './components/AuthContext';
 
 import { downloadNotebook } from './utils/notebookGenerator';
+import { snapshotById, diffById, changedIds, applyOps, takeRemote } from './utils/workspacePatch';
+import { fetchPage } from './utils/pagedList';
 
 import DatasetNode from './components/nodes/DatasetNode';
 import PreprocessingNode from './components/nodes/PreprocessingNode';
@@ -193,6 +195,11 @@ function Workspace() {
   useEffect(() => { edgesRef.current = edges; }, [edges]);
   useEffect(() => { nodesRef.current = nodes; }, [nodes]);
 
+  // Last state acknowledged by the backend, for patch-based autosave
+  const savedVersionRef = useRef(0);
+  const savedNodesRef = useRef<Map<string, string>>(new Map());
+  const savedEdgesRef = useRef<Map<string, string>>(new Map());
+
   const onNodeDataChange = useCallback((id: string, newData: any) => {
     setNodes((nds) => {
       const activeNode = nds.find(n => n.id === id);
@@ -313,22 +320,36 @@ function Workspace() {
   const [workspaceName, setWorkspaceName] = useState('Untitled Workspace');
 
   // ── Navbar Datasets Dropdown ─────────────────────────────────────────────
-  type NavDataset = { id: string; filename: string; is_sample: boolean; columns: string[]; shape: { rows: number; cols: number } };
+  type NavDataset = { id: string; filename: string; is_sample: boolean; shape: { rows: number; cols: number } };
   const [isDatasetPanelOpen, setIsDatasetPanelOpen] = useState(false);
   const [navDatasets, setNavDatasets] = useState<NavDataset[]>([]);
   const [navDatasetsLoading, setNavDatasetsLoading] = useState(false);
   const [navDatasetsFetched, setNavDatasetsFetched] = useState(false);
+  const [navDatasetsCursor, setNavDatasetsCursor] = useState<string | null>(null);
+  const [navDatasetsLoadingMore, setNavDatasetsLoadingMore] = useState(false);
   const datasetPanelRef = useRef<HTMLDivElement>(null);
 
   const fetchNavDatasets = useCallback(async () => {
     setNavDatasetsLoading(true);
     try {
-      const res = await axios.get(`${API_URL}/datasets`, { headers: getAuthHeaders() });
-      setNavDatasets(res.data);
+      const page = await fetchPage<NavDataset>(`${API_URL}/datasets`, getAuthHeaders(), { view: 'summary' });
+      setNavDatasets(page.items);
+      setNavDatasetsCursor(page.nextCursor);
     } catch { /* ignore */ }
     finally { setNavDatasetsLoading(false); setNavDatasetsFetched(true); }
   }, []);
 
+  const loadMoreNavDatasets = useCallback(async () => {
+    if (!navDatasetsCursor) return;
+    setNavDatasetsLoadingMore(true);
+    try {
+      const page = await fetchPage<NavDataset>(`${API_URL}/datasets`, getAuthHeaders(), { view: 'summary' }, navDatasetsCursor);
+      setNavDatasets(ds => [...ds, ...page.items]);
+      setNavDatasetsCursor(page.nextCursor);
+    } catch { /* ignore */ }
+    finally { setNavDatasetsLoadingMore(false); }
+  }, [navDatasetsCursor]);
+
   const handleDatasetPanelToggle = useCallback(() => {
     setIsDatasetPanelOpen(v => {
       if (!v && !navDatasetsFetched) fetchNavDatasets();
@@ -388,10 +409,11 @@ function Workspace() {
   // Bug 8 fix: use nodesRef instead of stale `nodes` closure
   const restoreWorkflow = useCallback(async (workflowId: string) => {
     try {
-      const response = await axios.get(`${API_URL}/workflows`, {
-        headers: getAuthHeaders()
+      const response = await axios.get(`${API_URL}/workflows/${workflowId}`, {
+        headers: getAuthHeaders(),
+        validateStatus: (status) => status === 200 || status === 404,
       });
-      const workflow = response.data.find((w: any) => w.id === workflowId);
+      const workflow = response.status === 200 ? response.data : null;
 
       if (workflow) {
         // Check if canvas has content (more than just default) using ref for fresh value
@@ -490,8 +512,11 @@ function Workspace() {
         const res = await axios.get(`${API_URL}/workspaces/${workspaceId}`, {
           headers: getAuthHeaders(),
         });
-        const { nodes_json, edges_json, name } = res.data;
+        const { nodes_json, edges_json, name, version } = res.data;
         setWorkspaceName(name || 'Untitled Workspace');
+        savedVersionRef.current = version || 0;
+        savedNodesRef.current = snapshotById(nodes_json || []);
+        savedEdgesRef.current = snapshotById(edges_json || []);
 
         let loadedNodes: Node[] = nodes_json && nodes_json.length > 0
           ? sanitizeNodes(nodes_json)
@@ -555,16 +580,59 @@ function Workspace() {
         return { ...n, data: rest };
       });
 
+      // Send only the nodes/edges that changed since the last acknowledged save
+      const nodeOps = diffById('node', savedNodesRef.current, sanitizedNodes);
+      const edgeOps = diffById('edge', savedEdgesRef.current, edges);
+      const ops = [...nodeOps, ...edgeOps];
+      if (ops.length === 0) return;
+
+      const markSaved = (version: number, savedNodes: { id: string }[], savedEdges: { id: string }[]) => {
+        savedVersionRef.current = version;
+        savedNodesRef.current = snapshotById(savedNodes);
+        savedEdgesRef.current = snapshotById(savedEdges);
+        setSaveStatus('saved');
+        setTimeout(() => setSaveStatus('idle'), 2000);
+      };
+
+      // Saved elsewhere in the meantime: re-apply these ops on top of the stored
+      // workspace unless both sessions changed the same node or edge
+      const rebase = async () => {
+        const res = await axios.get(`${API_URL}/workspaces/${workspaceId}`, { headers: getAuthHeaders() });
+        const remoteNodes: Node[] = res.data.nodes_json || [];
+        const remoteEdges: Edge[] = res.data.edges_json || [];
+        const remoteNodeIds = changedIds(savedNodesRef.current, snapshotById(remoteNodes));
+        const remoteEdgeIds = changedIds(savedEdgesRef.current, snapshotById(remoteEdges));
+        if (nodeOps.some(op => remoteNodeIds.has(op.id)) || edgeOps.some(op => remoteEdgeIds.has(op.id))) {
+          setSaveStatus('error');
+          toast.error('This workspace was changed in another tab. Reload it to get the latest version; your recent edits were not saved.');
+          return;
+        }
+        const patched = await axios.patch(
+          `${API_URL}/workspaces/${workspaceId}`,
+          { base_version: res.data.version, ops },
+          { headers: getAuthHeaders() }
+        );
+        // Show the other session's changes here too
+        const hydrate = (list: Node[]) => sanitizeNodes(list).map(n => ({
+          ...n,
+          data: { ...n.data, onChange: onNodeDataChange, onDelete: onNodeDelete, onPeek: handlePeek }
+        }));
+        setNodes(current => takeRemote(current, hydrate(remoteNodes), remoteNodeIds));
+        setEdges(current => takeRemote(current, remoteEdges, remoteEdgeIds));
+        markSaved(patched.data.version, applyOps('node', remoteNodes, nodeOps), applyOps('edge', remoteEdges, edgeOps));
+      };
+
       setSaveStatus('saving');
-      axios.put(
+      axios.patch(
         `${API_URL}/workspaces/${workspaceId}`,
-        { nodes_json: sanitizedNodes, edges_json: edges },
+        { base_version: savedVersionRef.current, ops },
         { headers: getAuthHeaders() }
-      ).then(() => {
-        setSaveStatus('saved');
-        setTimeout(() => setSaveStatus('idle'), 2000);
-      }).catch(() => {
-        setSaveStatus('error');
+      ).then((res) => markSaved(res.data.version, sanitizedNodes, edges)).catch((err) => {
+        if (err.response?.status !== 409) {
+          setSaveStatus('error');
+          return;
+        }
+        rebase().catch(() => setSaveStatus('error'));
       });
     }, 10000);
 
@@ -693,7 +761,7 @@ function Workspace() {
     return names[type] || type.charAt(0).toUpperCase() + type.slice(1);
   }, []);
 
-  const onDrop = useCallback((event: React.DragEvent) => {
+  const onDrop = useCallback(async (event: React.DragEvent) => {
     event.preventDefault();
     const type = event.dataTransfer.getData('application/reactflow');
     if (!type) return;
@@ -706,9 +774,19 @@ function Workspace() {
         y: event.clientY - reactFlowWrapper.current!.getBoundingClientRect().top,
       });
 
-    // Dataset cards in the sidebar carry pre-filled data (file, file_id, columns, shape)
+    // Dataset cards in the navbar carry pre-filled data (file, file_id, shape)
     const prefillRaw = event.dataTransfer.getData('application/reactflow/dataset-prefill');
     const prefill = prefillRaw ? JSON.parse(prefillRaw) : {};
+    // The card list is fetched without columns; load them for the node
+    if (type === 'dataset' && prefill.file_id && !prefill.columns) {
+      try {
+        const res = await axios.get(`${API_URL}/datasets/${prefill.file_id}`, { headers: getAuthHeaders() });
+        prefill.columns = res.data.columns;
+      } catch {
+        toast.error('Failed to load the dataset');
+        return;
+      }
+    }
 
     // If dragging a dataset card, try to fill an existing empty dataset node first
     if (type === 'dataset' && prefill.file) {
@@ -831,11 +909,15 @@ function Workspace() {
             onChange={(e) => setWorkspaceName(e.target.value)}
             onBlur={() => {
               if (workspaceId && workspaceName.trim()) {
-                axios.put(
+                axios.patch(
                   `${API_URL}/workspaces/${workspaceId}`,
-                  { name: workspaceName.trim(), nodes_json: nodes.map(n => { const { onChange, onDelete, onPeek, ...rest } = n.data; return { ...n, data: rest }; }), edges_json: edges },
+                  { name: workspaceName.trim() },
                   { headers: getAuthHeaders() }
-                ).then(() => toast.success('Renamed')).catch(() => toast.error('Rename failed'));
+                ).then((res) => {
+                  // Only a rename on top of our last save; otherwise autosave must still see the conflict
+                  if (res.data.version === savedVersionRef.current + 1) savedVersionRef.current = res.data.version;
+                  toast.success('Renamed');
+                }).catch(() => toast.error('Rename failed'));
               }
             }}
             onKeyDown={(e) => { if (e.key === 'Enter') (e.target as HTMLInputElement).blur(); }}
@@ -918,7 +1000,7 @@ function Workspace() {
                           onDragStart={(e) => {
                             e.dataTransfer.setData('application/reactflow', 'dataset');
                             e.dataTransfer.setData('application/reactflow/dataset-prefill', JSON.stringify({
-                              file: ds.filename, file_id: ds.id, columns: ds.columns,
+                              file: ds.filename, file_id: ds.id,
                               shape: [ds.shape.rows, ds.shape.cols], preview: [],
                             }));
                             e.dataTransfer.effectAllowed = 'move';
@@ -954,7 +1036,7 @@ function Workspace() {
                               onDragStart={(e) => {
                                 e.dataTransfer.setData('application/reactflow', 'dataset');
                                 e.dataTransfer.setData('application/reactflow/dataset-prefill', JSON.stringify({
-                                  file: ds.filename, file_id: ds.id, columns: ds.columns,
+                                  file: ds.filename, file_id: ds.id,
                                   shape: [ds.shape.rows, ds.shape.cols], preview: [],
                                 }));
                                 e.dataTransfer.effectAllowed = 'move';
@@ -972,6 +1054,17 @@ function Workspace() {
                             </div>
                           ));
                       })()}
+
+                      {navDatasetsCursor && (
+                        <button
+                          onClick={loadMoreNavDatasets}
+                          disabled={navDatasetsLoadingMore}
+                          className="w-full mt-1 py-2 flex items-center justify-center gap-2 text-[11px] font-medium text-gray-500 hover:text-gray-700 hover:bg-gray-50 rounded-xl transition-colors disabled:opacity-60"
+                        >
+                          {navDatasetsLoadingMore && <Loader2 size={12} className="animate-spin" />}
+                          Load more
+                        </button>
+                      )}
                     </>
                   )}
                 </div>
@@ -198,10 +198,11 @@ export default function HistoryPage() {
                                                                         );
                                                                     } else if (item.workflow_id) {
                                                                         // Load from saved workflow and copy into new workspace
-                                                                        const wfRes = await axios.get(`${API_URL}/workflows`, {
-                                                                            headers: { Authorization: `Bearer ${token}` }
+                                                                        const wfRes = await axios.get(`${API_URL}/workflows/${item.workflow_id}`, {
+                                                                            headers: { Authorization: `Bearer ${token}` },
+                                                                            validateStatus: (status) => status === 200 || status === 404,
                                                                         });
-                                                                        const wf = wfRes.data.find((w: any) => w.id === String(item.workflow_id));
+                                                                        const wf = wfRes.status === 200 ? wfRes.data : null;
                                                                         if (wf) {
                                                                             await axios.put(
                                                                                 `${API_URL}/workspaces/${newId}`,
@@ -6,6 +6,7 @@ import { toast, Toaster } from 'sonner';
 import axios from 'axios';
 import logo from '../assets/image.png';
 import { API_URL } from '../config';
+import { fetchPage } from '../utils/pagedList';
 
 interface WorkspaceSummary {
     id: string;
@@ -20,6 +21,8 @@ export default function WorkspaceDashboard() {
     const navigate = useNavigate();
     const [workspaces, setWorkspaces] = useState<WorkspaceSummary[]>([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [creating, setCreating] = useState(false);
     const [deletingId, setDeletingId] = useState<string | null>(null);
     const [renamingId, setRenamingId] = useState<string | null>(null);
@@ -35,10 +38,11 @@ export default function WorkspaceDashboard() {
 
     const fetchWorkspaces = async () => {
         try {
-            const res = await axios.get(`${API_URL}/workspaces`, {
-                headers: { Authorization: `Bearer ${token}` },
+            const page = await fetchPage<WorkspaceSummary>(`${API_URL}/workspaces`, {
+                Authorization: `Bearer ${token}`,
             });
-            setWorkspaces(res.data);
+            setWorkspaces(page.items);
+            setNextCursor(page.nextCursor);
         } catch {
             toast.error('Failed to load workspaces');
         } finally {
@@ -46,6 +50,22 @@ export default function WorkspaceDashboard() {
         }
     };
 
+    const loadMoreWorkspaces = async () => {
+        if (!nextCursor) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchPage<WorkspaceSummary>(`${API_URL}/workspaces`, {
+                Authorization: `Bearer ${token}`,
+            }, {}, nextCursor);
+            setWorkspaces((ws) => [...ws, ...page.items.filter((w) => !ws.some((x) => x.id === w.id))]);
+            setNextCursor(page.nextCursor);
+        } catch {
+            toast.error('Failed to load workspaces');
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const createWorkspace = async (name?: string, nodesJson?: any[], edgesJson?: any[]) => {
         setCreating(true);
         try {
@@ -271,6 +291,18 @@ export default function WorkspaceDashboard() {
                     </div>
                 )}
 
+                {!loading && nextCursor && (
+                    <div className="flex justify-center mt-8">
+                        <button
+                            onClick={loadMoreWorkspaces}
+                            disabled={loadingMore}
+                            className="px-5 py-2 text-sm font-medium text-gray-600 bg-white border border-gray-200 rounded-xl hover:border-gray-300 hover:shadow-sm transition-all disabled:opacity-60"
+                        >
+                            {loadingMore ? 'Loading...' : 'Load more'}
+                        </button>
+                    </div>
+                )}
+
                 {!loading && workspaces.length === 0 && (
                     <div className="text-center py-10">
                         <p className="text-gray-400 text-sm">No workspaces yet. Create your first one above!</p>
@@ -10,9 +10,10 @@ interface ClassBalancingNodeProps {
 
 function ClassBalancingNode({ id, data }: ClassBalancingNodeProps) {
     const method = data.classBalancing || 'oversample';
+    const balanceRatio = data.balanceRatio ?? 1.0;
 
-    const onChange = (value: string) => {
-        data.onChange?.(id, { ...data, classBalancing: value });
+    const onChange = (field: string, value: any) => {
+        data.onChange?.(id, { ...data, [field]: value });
     };
 
     return (
@@ -37,22 +38,47 @@ function ClassBalancingNode({ id, data }: ClassBalancingNodeProps) {
                     </label>
                     <select
                         value={method}
-                        onChange={(e) => onChange(e.target.value)}
+                        onChange={(e) => onChange('classBalancing', e.target.value)}
                         onPointerDownCapture={(e) => e.stopPropagation()}
                         className="nodrag nopan w-full px-3 py-2 bg-slate-50 border border-slate-200 rounded-lg text-sm font-medium text-slate-700 focus:ring-2 focus:ring-fuchsia-400 focus:border-transparent transition-all"
                     >
                         <option value="oversample">Random Oversampling</option>
                         <option value="undersample">Random Undersampling</option>
                         <option value="smote">SMOTE</option>
+                        <option value="borderline_smote">Borderline SMOTE</option>
+                        <option value="sample_weight">Sample Weights</option>
                         <option value="class_weight">Class Weights</option>
                         <option value="none">None (Skip)</option>
                     </select>
                 </div>
 
+                {['oversample', 'undersample', 'smote', 'borderline_smote', 'sample_weight'].includes(method) && (
+                    <div>
+                        <label className="text-xs font-semibold text-slate-500 uppercase tracking-wider mb-1 block">
+                            Target Ratio: {balanceRatio}
+                        </label>
+                        <input
+                            type="range"
+                            min="0.1"
+                            max="1.0"
+                            step="0.05"
+                            value={balanceRatio}
+                            onChange={(e) => onChange('balanceRatio', parseFloat(e.target.value))}
+                            className="nodrag w-full accent-fuchsia-500"
+                        />
+                        <div className="flex justify-between text-xs text-slate-400 mt-0.5">
+                            <span>0.1 (partial)</span>
+                            <span>1.0 (equal)</span>
+                        </div>
+                    </div>
+                )}
+
                 <div className="text-xs text-slate-400 italic pt-1">
                     {method === 'oversample' && 'Duplicates minority class samples to match majority'}
                     {method === 'undersample' && 'Reduces majority class samples to match minority'}
-                    {method === 'smote' && 'Generates synthetic minority samples (requires imbalanced-learn)'}
+                    {method === 'smote' && 'Generates synthetic minority samples between nearest neighbours'}
+                    {method === 'borderline_smote' && 'SMOTE seeded only from minority samples near the class boundary'}
+                    {method === 'sample_weight' && 'Weights minority samples during training — no data is duplicated'}
                     {method === 'class_weight' && 'Adjusts model weights to penalize majority class errors'}
                     {method === 'none' && 'No balancing applied — may bias toward majority class'}
                 </div>
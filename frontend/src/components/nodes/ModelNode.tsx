@@ -3,6 +3,22 @@ import { Handle, Position } from 'reactflow';
 import { BrainCircuit, X, Lock } from 'lucide-react';
 
 
+// When to reach for the scalable alternatives (shown under the dropdown)
+const MODEL_HINTS: Record<string, string> = {
+    'SVM': 'Kernel SVM: training grows quadratically with rows. Over ~20k rows use Linear SVM or Approx. Kernel SVM.',
+    'SVR': 'Kernel SVR: training grows quadratically with rows. Over ~20k rows use Linear SVR or Approx. Kernel Ridge.',
+    'Gradient Boosting': 'Exact boosting: slow on large data. Over ~20k rows use Hist Gradient Boosting.',
+    'Gradient Boosting Regressor': 'Exact boosting: slow on large data. Over ~20k rows use Hist GB Regressor.',
+    'Hist Gradient Boosting': 'Fast boosting on binned features with early stopping. Best default for large tabular data; use Label encoding for native categorical splits.',
+    'Hist Gradient Boosting Regressor': 'Fast boosting on binned features with early stopping. Best default for large tabular data; use Label encoding for native categorical splits.',
+    'Linear SVM': 'Linear-kernel SVM, linear in rows. Good for wide or sparse data (e.g. many one-hot columns); scale features first.',
+    'Linear SVR': 'Linear-kernel SVR, linear in rows. Use when the target is roughly linear in the features; scale features first.',
+    'SGD Classifier': 'Linear model trained by stochastic gradient descent with early stopping. Handles millions of rows; scale features first.',
+    'SGD Regressor': 'Linear regression trained by stochastic gradient descent with early stopping. Handles millions of rows; scale features first.',
+    'Approximate Kernel SVM': 'RBF-kernel approximation + linear SVM. Non-linear boundaries at near-linear cost; for large data where SVM is too slow.',
+    'Approximate Kernel Ridge': 'RBF-kernel approximation + ridge regression. Non-linear fits at near-linear cost; for large data where SVR is too slow.',
+};
+
 interface ModelNodeProps {
     id: string;
     data: any;
@@ -79,6 +95,10 @@ function ModelNode({ id, data }: ModelNodeProps) {
                             <option value="Gradient Boosting">Gradient Boosting</option>
                             <option value="XGBoost">XGBoost</option>
                             <option value="MLP Classifier">MLP Classifier</option>
+                            <option value="Hist Gradient Boosting">Hist Gradient Boosting</option>
+                            <option value="Linear SVM">Linear SVM</option>
+                            <option value="SGD Classifier">SGD Classifier</option>
+                            <option value="Approximate Kernel SVM">Approx. Kernel SVM</option>
                         </optgroup>
                         <optgroup label="Regression">
                             <option value="Linear Regression">Linear Regression</option>
@@ -92,8 +112,17 @@ function ModelNode({ id, data }: ModelNodeProps) {
                             <option value="Gradient Boosting Regressor">GB Regressor</option>
                             <option value="XGBoost Regressor">XGBoost Regressor</option>
                             <option value="MLP Regressor">MLP Regressor</option>
+                            <option value="Hist Gradient Boosting Regressor">Hist GB Regressor</option>
+                            <option value="Linear SVR">Linear SVR</option>
+                            <option value="SGD Regressor">SGD Regressor</option>
+                            <option value="Approximate Kernel Ridge">Approx. Kernel Ridge</option>
                         </optgroup>
                     </select>
+                    {MODEL_HINTS[modelType] && (
+                        <p className="text-[11px] leading-snug text-slate-400 mt-1.5">
+                            {MODEL_HINTS[modelType]}
+                        </p>
+                    )}
                 </div>
 
                 {targetColumn && (
@@ -7,8 +7,8 @@ interface StepPreviewProps {
         step: string;
         rows: number;
         cols: number;
-        columns: string[];
-        sample: Record<string, any>[];
+        columns?: string[];
+        sample?: Record<string, any>[];
         delta?: {
             rows: number;
             cols: number;
@@ -148,6 +148,7 @@ function StepPreview({ stepPreview, accentColor = '#4285F4' }: StepPreviewProps)
                         </div>
 
                         {/* Column Chips */}
+                        {columns && (
                         <div className="px-6 py-3 shrink-0">
                             <p className="text-xs font-semibold text-slate-500 uppercase tracking-wider mb-2">Column Names</p>
                             <div className="flex flex-wrap gap-1.5">
@@ -171,6 +172,7 @@ function StepPreview({ stepPreview, accentColor = '#4285F4' }: StepPreviewProps)
                                 )}
                             </div>
                         </div>
+                        )}
 
                         {/* Data Table */}
                         <div className="flex-1 overflow-auto px-6 pb-6">
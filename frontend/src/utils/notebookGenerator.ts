@@ -40,6 +40,7 @@ const REGRESSION_MODELS = new Set([
     'Linear Regression', 'Decision Tree Regressor', 'Random Forest Regressor',
     'Ridge Regression', 'Lasso Regression', 'ElasticNet', 'SVR',
     'KNN Regressor', 'Gradient Boosting Regressor', 'XGBoost Regressor', 'MLP Regressor',
+    'Hist Gradient Boosting Regressor', 'Linear SVR', 'SGD Regressor', 'Approximate Kernel Ridge',
 ]);
 
 // ─── Model → sklearn mapping (keyed by exact ModelNode option values) ─────────
@@ -146,6 +147,46 @@ const MODEL_INFO: Record<string, ModelInfo> = {
         instantiation: (_) => `MLPRegressor(max_iter=500, random_state=42)`,
         hasFeatureImportance: 'none',
     },
+    'Hist Gradient Boosting': {
+        importLine: 'from sklearn.ensemble import HistGradientBoostingClassifier',
+        instantiation: (cw) => `HistGradientBoostingClassifier(max_iter=500, early_stopping=True, random_state=42${cw})`,
+        hasFeatureImportance: 'none',
+    },
+    'Linear SVM': {
+        importLine: 'from sklearn.svm import LinearSVC',
+        instantiation: (cw) => `LinearSVC(max_iter=5000${cw})`,
+        hasFeatureImportance: 'linear',
+    },
+    'SGD Classifier': {
+        importLine: 'from sklearn.linear_model import SGDClassifier',
+        instantiation: (cw) => `SGDClassifier(loss='modified_huber', early_stopping=True, random_state=42${cw})`,
+        hasFeatureImportance: 'linear',
+    },
+    'Approximate Kernel SVM': {
+        importLine: 'from sklearn.kernel_approximation import Nystroem\nfrom sklearn.pipeline import make_pipeline\nfrom sklearn.svm import LinearSVC',
+        instantiation: (cw) => `make_pipeline(Nystroem(n_components=300, random_state=42), LinearSVC(max_iter=5000${cw}))`,
+        hasFeatureImportance: 'none',
+    },
+    'Hist Gradient Boosting Regressor': {
+        importLine: 'from sklearn.ensemble import HistGradientBoostingRegressor',
+        instantiation: (_) => `HistGradientBoostingRegressor(max_iter=500, early_stopping=True, random_state=42)`,
+        hasFeatureImportance: 'none',
+    },
+    'Linear SVR': {
+        importLine: 'from sklearn.svm import LinearSVR',
+        instantiation: (_) => `LinearSVR(max_iter=5000)`,
+        hasFeatureImportance: 'linear',
+    },
+    'SGD Regressor': {
+        importLine: 'from sklearn.linear_model import SGDRegressor',
+        instantiation: (_) => `SGDRegressor(early_stopping=True, random_state=42)`,
+        hasFeatureImportance: 'linear',
+    },
+    'Approximate Kernel Ridge': {
+        importLine: 'from sklearn.kernel_approximation import Nystroem\nfrom sklearn.pipeline import make_pipeline\nfrom sklearn.linear_model import Ridge',
+        instantiation: (_) => `make_pipeline(Nystroem(n_components=300, random_state=42), Ridge())`,
+        hasFeatureImportance: 'none',
+    },
 };
 
 // ─── Fallback empty notebook ──────────────────────────────────────────────────
@@ -238,7 +279,9 @@ export function generateNotebook(nodes: Node[], edges: Edge[]): JupyterNotebook
     const pcaComponents = (pcaNode?.data.pcaComponents as number) ?? 2;
 
     // ClassBalancingNode
-    const classBalMethod = (classBalNode?.data.classBalancing as string) || 'none';
+    // 'sample_weight' rebalances through the loss, which class_weight='balanced' reproduces in sklearn
+    const rawClassBalMethod = (classBalNode?.data.classBalancing as string) || 'none';
+    const classBalMethod = rawClassBalMethod === 'sample_weight' ? 'class_weight' : rawClassBalMethod;
     const cwArg = classBalMethod === 'class_weight' ? ", class_weight='balanced'" : '';
 
     // DuplicateNode
@@ -320,6 +363,8 @@ export function generateNotebook(nodes: Node[], edges: Edge[]): JupyterNotebook
     }
     if (!isRegression && classBalMethod === 'smote')
         importLines.push('from imblearn.over_sampling import SMOTE');
+    else if (!isRegression && classBalMethod === 'borderline_smote')
+        importLines.push('from imblearn.over_sampling import BorderlineSMOTE');
     else if (!isRegression && classBalMethod === 'oversample')
         importLines.push('from imblearn.over_sampling import RandomOverSampler');
     else if (!isRegression && classBalMethod === 'undersample')
@@ -732,12 +777,14 @@ export function generateNotebook(nodes: Node[], edges: Edge[]): JupyterNotebook
             `Address class imbalance so the model does not favour the majority class.  \n` +
             `**Method:** ` +
             (classBalMethod === 'smote'       ? '**SMOTE** — synthesises new minority-class samples using k-nearest neighbours.' :
+             classBalMethod === 'borderline_smote' ? '**Borderline SMOTE** — synthesises minority samples near the class boundary.' :
              classBalMethod === 'oversample'  ? '**Random Oversampling** — duplicates random minority-class samples.' :
                                                '**Random Undersampling** — removes random majority-class samples.') +
             `  \n> ✅ Applied to **training data only**.`
         ));
         const sampler =
             classBalMethod === 'smote'      ? `SMOTE(random_state=${randomState})` :
+            classBalMethod === 'borderline_smote' ? `BorderlineSMOTE(random_state=${randomState})` :
             classBalMethod === 'oversample' ? `RandomOverSampler(random_state=${randomState})` :
                                               `RandomUnderSampler(random_state=${randomState})`;
         cells.push(codeCell([
@@ -0,0 +1,16 @@
+// Helper for the paged list endpoints (/datasets, /workspaces, /workflows).
+// Each page carries the cursor of the next one in X-Next-Cursor; the last page has none.
+// Lists render the first page and fetch the next one only when the user asks for more.
+import axios from 'axios';
+
+export type Page<T> = { items: T[]; nextCursor: string | null };
+
+export const fetchPage = async <T>(
+    url: string,
+    headers: Record<string, string>,
+    params: Record<string, string> = {},
+    cursor: string | null = null
+): Promise<Page<T>> => {
+    const res = await axios.get<T[]>(url, { headers, params: cursor ? { ...params, cursor } : params });
+    return { items: res.data, nextCursor: res.headers['x-next-cursor'] || null };
+};
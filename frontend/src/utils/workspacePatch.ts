@@ -0,0 +1,68 @@
+// Helpers for patch-based workspace autosave (PATCH /workspaces/{id}).
+// The last saved state is kept as id -> JSON so each save only sends what changed.
+
+export type WorkspaceOp = {
+    op: string;
+    id: string;
+    value?: Record<string, any>;
+};
+
+export const snapshotById = (items: { id: string }[]): Map<string, string> =>
+    new Map(items.map(item => [item.id, JSON.stringify(item)]));
+
+export const diffById = (
+    kind: 'node' | 'edge',
+    saved: Map<string, string>,
+    items: { id: string }[]
+): WorkspaceOp[] => {
+    const ops: WorkspaceOp[] = [];
+    const seen = new Set<string>();
+    for (const item of items) {
+        seen.add(item.id);
+        const previous = saved.get(item.id);
+        if (previous === undefined) {
+            ops.push({ op: `add_${kind}`, id: item.id, value: item });
+        } else if (previous !== JSON.stringify(item)) {
+            ops.push({ op: `update_${kind}`, id: item.id, value: item });
+        }
+    }
+    saved.forEach((_, id) => {
+        if (!seen.has(id)) ops.push({ op: `remove_${kind}`, id });
+    });
+    return ops;
+};
+
+// Ids whose stored JSON differs between two snapshots (changed, added or removed)
+export const changedIds = (before: Map<string, string>, after: Map<string, string>): Set<string> => {
+    const ids = new Set<string>();
+    after.forEach((json, id) => {
+        if (before.get(id) !== json) ids.add(id);
+    });
+    before.forEach((_, id) => {
+        if (!after.has(id)) ids.add(id);
+    });
+    return ids;
+};
+
+// `items` with this kind's ops applied on top (what the server stores after the patch)
+export const applyOps = <T extends { id: string }>(kind: 'node' | 'edge', items: T[], ops: WorkspaceOp[]): T[] => {
+    const byId = new Map(items.map(item => [item.id, item]));
+    for (const op of ops) {
+        if (op.op === `remove_${kind}`) byId.delete(op.id);
+        else if (op.op === `add_${kind}` || op.op === `update_${kind}`) byId.set(op.id, op.value as T);
+    }
+    return [...byId.values()];
+};
+
+// The local canvas with the items in `ids` taken from `remote` (updated, added or removed)
+export const takeRemote = <T extends { id: string }>(local: T[], remote: T[], ids: Set<string>): T[] => {
+    const remoteById = new Map(remote.map(item => [item.id, item]));
+    const merged = local
+        .filter(item => !ids.has(item.id) || remoteById.has(item.id))
+        .map(item => (ids.has(item.id) ? remoteById.get(item.id)! : item));
+    const present = new Set(merged.map(item => item.id));
+    remote.forEach(item => {
+        if (ids.has(item.id) && !present.has(item.id)) merged.push(item);
+    });
+    return merged;
+};